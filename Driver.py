@@ -1,16 +1,47 @@
-from db.Database import Database
-from GUI.MainPages.Login import LoginPage
-from PyQt6.QtWidgets import QApplication, QWidget
+import importlib
 import sys
-from GUI.AccountPages.MainPage import HomePage
-from GUI.AccountPages.Trade import TradePage
-from GUI.AccountPages.Positions import PositionsPage
-from GUI.AccountPages.History import HistoryPage
-from GUI.AccountPages.Summary import SummaryPage
-from GUI.AccountPages.Deposit import DepositPage
-from GUI.MainPages.CreateUser import CreateUserPage
+import threading
+from db.Instrumentation import profiler
+from GUI.MainPages.Login import LoginPage
+from GUI.Workers.Worker import Worker
+from PyQt6.QtCore import QThreadPool
+from PyQt6.QtWidgets import QApplication, QWidget, QProgressDialog, QMessageBox
+
+#pages (and the pandas/matplotlib they pull in) are imported the first time they open,
+#so only PyQt and the login page are loaded before the login window shows
+PAGES = {
+    "HomePage": "GUI.AccountPages.MainPage",
+    "TradePage": "GUI.AccountPages.Trade",
+    "PositionsPage": "GUI.AccountPages.Positions",
+    "HistoryPage": "GUI.AccountPages.History",
+    "SummaryPage": "GUI.AccountPages.Summary",
+    "DepositPage": "GUI.AccountPages.Deposit",
+    "CreateUserPage": "GUI.MainPages.CreateUser",
+}
+
+
+def load_page(name):
+    
+    '''
+    Import a page class on first use
+    
+    Args:
+        name (str): class name, a key of PAGES
+        
+    Returns:
+        type: the page class (instrumented when profiling)
+    '''
+    page = getattr(importlib.import_module(PAGES[name]), name)
+    profiler.instrument_class(page)
+    return page
 
 
+def open_database(**kwargs):
+    
+    '''Runs on a worker thread: import (pandas and all) and open the Database'''
+    from db.Database import Database
+    return Database(**kwargs)
+
 
 '''
     Main entry point for the GUI application:
@@ -28,16 +59,81 @@ class MainApplication(QWidget):
     
     
     '''
-    def __init__(self, db:Database):
+    def __init__(self):
         super().__init__()
         self.setWindowTitle("Main Application")
-        self.db = db
+        self.db = None
+        self.price_scheduler = None
         
         #Initilize the login page and setup signals for login/account create
-        self.login_page = LoginPage(db)
+        #it stays disabled until open_database has run
+        self.login_page = LoginPage()
         self.login_page.login_successful.connect(self.switch_to_home)
         self.login_page.make_user.connect(self.create_user)
         
+    def open_database(self):
+        
+        '''
+        Open the database on a worker thread once the login window is on screen
+        -schema checks, migrations and (on first run) seeding happen there, the
+         login window stays responsive and is enabled by database_opened
+        -a setup dialog shows the seed progress once seeding reports it, a launch that
+         does not seed never shows it, cancelling keeps the chunks downloaded so far
+         and the next launch resumes
+        '''
+        self.seed_cancel = threading.Event()
+        self.seed_dialog = None
+        
+        self.database_worker = Worker(open_database, seed_cancelled=self.seed_cancel.is_set)
+        #seed progress crosses to the GUI thread through the workers signal
+        self.database_worker.kwargs["seed_progress"] = self.database_worker.signals.progress.emit
+        self.database_worker.signals.progress.connect(self.show_seed_progress)
+        self.database_worker.signals.result.connect(self.database_opened)
+        self.database_worker.signals.error.connect(self.database_failed)
+        QThreadPool.globalInstance().start(self.database_worker)
+        
+    def show_seed_progress(self, done:int, total:int):
+        
+        '''Create the setup dialog on the first seed progress, then keep it current'''
+        if self.seed_dialog is None:
+            self.seed_dialog = QProgressDialog("Downloading ticker prices...", "Cancel", 0, total)
+            self.seed_dialog.setWindowTitle("CashNinja setup")
+            self.seed_dialog.canceled.connect(self.seed_cancel.set)
+        if not self.seed_dialog.wasCanceled():
+            self.seed_dialog.setMaximum(total)
+            self.seed_dialog.setValue(done)
+            
+    def close_seed_dialog(self):
+        if self.seed_dialog is not None:
+            self.seed_dialog.close()
+            self.seed_dialog = None
+        
+    def database_opened(self, db):
+        
+        '''Runs on the GUI thread once the database is open: start the scheduler and enable logging in'''
+        from GUI.Workers.PriceRefreshScheduler import PriceRefreshScheduler
+        
+        self.close_seed_dialog()
+        self.db = db
+        
+        #refreshes quotes on worker threads for every page
+        self.price_scheduler = PriceRefreshScheduler(self.db)
+        self.login_page.set_database(self.db)
+        
+    def database_failed(self, error:str):
+        
+        '''Runs on the GUI thread if the database could not be opened: retry or quit'''
+        self.close_seed_dialog()
+        print(f"Could not open the database: {error}")
+        #error is a traceback, its last line says what went wrong
+        reason = error.strip().splitlines()[-1] if error.strip() else "unknown error"
+        answer = QMessageBox.critical(self.login_page, "CashNinja setup",
+                                      f"Could not open the database:\n{reason}\n\nTry again?",
+                                      QMessageBox.StandardButton.Retry | QMessageBox.StandardButton.Close)
+        if answer == QMessageBox.StandardButton.Retry:
+            self.open_database()
+        else:
+            QApplication.quit()
         
     def show_login(self):
         '''Start the login page'''
@@ -50,43 +146,53 @@ class MainApplication(QWidget):
         -Wires signal connections for all child views for the user
         
         '''
-        self.home_page = HomePage(self.db, username)
+        with profiler.timed("page", "HomePage"):
+            self.home_page = load_page("HomePage")(self.db, username)
+            self.home_page.show()
         self.home_page.trade_click.connect(self.switch_to_trade)
         self.home_page.positions_click.connect(self.switch_to_positions)
         self.home_page.history_click.connect(self.switch_to_history)
         self.home_page.summary_click.connect(self.switch_to_summary)
         self.home_page.deposit_click.connect(self.switch_to_deposit)
-        self.home_page.show()
         self.login_page.close()
         
+        #start refreshing the users held tickers in the background
+        held_tickers = self.db.get_held_tickers(self.home_page.user_id)
+        self.price_scheduler.request(held_tickers, self.price_scheduler.HELD)
+        
     def switch_to_trade(self, username:str, portfolio_id:int):
         '''Switch to the trading view for the given user and selected portfolio'''
-        self.trade_page = TradePage(db, username, portfolio_id, self.home_page)
-        self.trade_page.show()
+        with profiler.timed("page", "TradePage"):
+            self.trade_page = load_page("TradePage")(self.db, username, portfolio_id, self.home_page, self.price_scheduler)
+            self.trade_page.show()
         self.home_page.hide()
         
     def switch_to_positions(self, username: str, portfolio_id: int):
         '''Switch to the positions view for the given user and selected portfolio'''
-        self.positions_page = PositionsPage(self.db, username, portfolio_id, self.home_page)
-        self.positions_page.show()
+        with profiler.timed("page", "PositionsPage"):
+            self.positions_page = load_page("PositionsPage")(self.db, username, portfolio_id, self.home_page, self.price_scheduler)
+            self.positions_page.show()
         self.home_page.hide()
 
     def switch_to_history(self, portfolio_id: int):
         '''Switch to the portfolio history view for the given user and selected portfolio'''
-        self.history_page = HistoryPage(self.db, portfolio_id, self.home_page)
-        self.history_page.show()
+        with profiler.timed("page", "HistoryPage"):
+            self.history_page = load_page("HistoryPage")(self.db, portfolio_id, self.home_page)
+            self.history_page.show()
         self.home_page.hide()
 
     def switch_to_summary(self, username: str, portfolio_id: int):
         '''Switch to the summary page for the given user and selected portfolio'''
-        self.summary_page = SummaryPage(self.db, username, portfolio_id, self.home_page)
-        self.summary_page.show()
+        with profiler.timed("page", "SummaryPage"):
+            self.summary_page = load_page("SummaryPage")(self.db, username, portfolio_id, self.home_page)
+            self.summary_page.show()
         self.home_page.hide()
 
     def switch_to_deposit(self, username: str):
         '''Switch to the deposit page for the given user'''
-        self.deposit_page = DepositPage(self.db, username, self.home_page)
-        self.deposit_page.show()
+        with profiler.timed("page", "DepositPage"):
+            self.deposit_page = load_page("DepositPage")(self.db, username, self.home_page)
+            self.deposit_page.show()
         self.home_page.hide()
         
     def create_user(self, action:bool):
@@ -95,17 +201,25 @@ class MainApplication(QWidget):
         Handle account creation
         '''
         if action:
-            self.user_creation_page = CreateUserPage(self.db)
+            self.user_creation_page = load_page("CreateUserPage")(self.db)
             self.user_creation_page.show()
              
 if __name__ == "__main__":
 
-    #initilize the database (create schema if needed)
-    db = Database()
+    #python Driver.py --profile [output prefix], same as setting CASHNINJA_PROFILE
+    if "--profile" in sys.argv:
+        index = sys.argv.index("--profile")
+        sys.argv.pop(index)
+        output = sys.argv.pop(index) if index < len(sys.argv) and not sys.argv[index].startswith("-") else "profile"
+        profiler.enable(output)
+    profiler.instrument_class(LoginPage)
     
-    #start the application event loop
     app = QApplication(sys.argv)
-    main_app = MainApplication(db)
+    
+    #show the login window first, then open the database behind it
+    main_app = MainApplication()
     main_app.show_login()
-
-    sys.exit(app.exec())
\ No newline at end of file
+    main_app.open_database()
+    
+    #start the application event loop
+    sys.exit(app.exec())
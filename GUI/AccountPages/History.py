@@ -1,6 +1,8 @@
-from PyQt6.QtWidgets import (QWidget, QLabel, QVBoxLayout, 
-                             QLineEdit, QTableWidget, QTableWidgetItem, QPushButton)
+from PyQt6.QtWidgets import (QWidget, QLabel, QVBoxLayout, QHBoxLayout,
+                             QLineEdit, QTableView, QPushButton, QComboBox)
+from PyQt6.QtCore import QTimer
 from ..DialogBoxes.DateSelectorDialog import DateRangeDialog
+from ..Models.TransactionTableModel import TransactionTableModel
 class HistoryPage(QWidget):
     def __init__(self, db, portfolio_id:int, home_page):
         super().__init__()
@@ -9,58 +11,80 @@ class HistoryPage(QWidget):
         self.home_page = home_page
         self.resize(800, 400)
         self.setWindowTitle("Trading History")
+        self.start_date = None
+        self.end_date = None
         self.make_ui()
-      
+
     def make_ui(self):
-        
-        self.all_transactions = self.db.get_all_transactions(self.portfolio_id)
+
+        #only the first page is loaded, the rest comes in as the user scrolls
+        self.transactions_model = TransactionTableModel(self.db, self.portfolio_id, parent=self)
         main_layout = QVBoxLayout()
-        
+
         #If no position dont generate the table
-        if not self.all_transactions:
+        if not self.transactions_model.rowCount():
             label = QLabel("This portfolio does not have any transactions yet.")
             main_layout.addWidget(label)
             self.setLayout(main_layout)
             return
 
-        #search bar
+        #filters
         self.date_selector_button = QPushButton("Select dates")
         self.date_selector_button.clicked.connect(self.select_date_range)
-        
-        
+        self.clear_dates_button = QPushButton("All dates")
+        self.clear_dates_button.clicked.connect(self.clear_date_range)
+
+        self.ticker_filter = QLineEdit(self)
+        self.ticker_filter.setPlaceholderText("Ticker")
+        self.action_filter = QComboBox(self)
+        self.action_filter.addItems(["All", "buy", "sell"])
+        self.action_filter.currentIndexChanged.connect(self.apply_filters)
+
+        #only query once typing pauses
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self.apply_filters)
+        self.ticker_filter.textChanged.connect(self.filter_timer.start)
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.date_selector_button)
+        filter_layout.addWidget(self.clear_dates_button)
+        filter_layout.addWidget(self.ticker_filter)
+        filter_layout.addWidget(self.action_filter)
+
         #table
-        self.transactions_table = QTableWidget(self)
-        self.transactions_table.setColumnCount(5)
-        self.transactions_table.setHorizontalHeaderLabels(["Date", "Action", "Ticker", "Quantity", "Price"])
-        
-        self.load_table(self.all_transactions)
+        self.transactions_table = QTableView(self)
+        self.transactions_table.setModel(self.transactions_model)
+        self.transactions_table.verticalHeader().setVisible(False)
 
-        main_layout = QVBoxLayout()
         title = QLabel("Transaction History: ")
         main_layout.addWidget(title)
-        main_layout.addWidget(self.date_selector_button)
+        main_layout.addLayout(filter_layout)
         main_layout.addWidget(self.transactions_table)
-        
+
         self.setLayout(main_layout)
-        
-    
-        
-    def load_table(self, transactions):
-        self.transactions_table.setRowCount(len(transactions))
-        for row, (action, quantity, ticker, price, timestamp) in enumerate(transactions):
-            self.transactions_table.setItem(row, 0, QTableWidgetItem(timestamp))
-            self.transactions_table.setItem(row, 1, QTableWidgetItem(action))
-            self.transactions_table.setItem(row, 2, QTableWidgetItem(ticker))
-            self.transactions_table.setItem(row, 3, QTableWidgetItem(str(quantity)))
-            self.transactions_table.setItem(row, 4, QTableWidgetItem(f"${price:,.2f}"))
-    
+
+    def apply_filters(self):
+
+        '''Reload the table from the first page with the current filters'''
+        action = self.action_filter.currentText()
+        self.transactions_model.set_filters(start_date=self.start_date,
+                                            end_date=self.end_date,
+                                            tic=self.ticker_filter.text().strip().upper() or None,
+                                            action=None if action == "All" else action)
+
     def select_date_range(self):
         dialog = DateRangeDialog()
         if dialog.exec():
-            start_date, end_date = dialog.get_dates()
-            filtered = [transaction for transaction in self.all_transactions
-                        if start_date <= transaction[4] <= end_date]
-            self.load_table(filtered)
+            self.start_date, self.end_date = dialog.get_dates()
+            self.apply_filters()
+
+    def clear_date_range(self):
+        self.start_date = None
+        self.end_date = None
+        self.apply_filters()
+
     def closeEvent(self, event):
         self.home_page.show()
-        self.close()
\ No newline at end of file
+        self.close()
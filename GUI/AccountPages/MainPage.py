@@ -18,7 +18,10 @@ class HomePage(QWidget):
         super().__init__()
         self.db = db
         self.username = username
-        self.user_id = db.get_user_id(username)
+        
+        #account, balance and portfolios are loaded once and kept current by the db writes
+        self.session = db.open_session(username)
+        self.user_id = self.session.user_id
         self.setWindowTitle("Home page")
         self.setGeometry(300, 300, 300, 150)
         
@@ -28,8 +31,7 @@ class HomePage(QWidget):
     def setup_ui(self):
         
         self.username_label = QLabel(f"Welcome {self.username}", self)
-        balance = self.db.get_balance(self.username)
-        self.balance_label = QLabel(f"Balance: ${balance:,.2f}", self)
+        self.balance_label = QLabel(f"Balance: ${self.session.balance:,.2f}", self)
         
         self.buttons_widget = self.get_buttons_widget()
         self.user_info_widget = self.get_user_info_widget()
@@ -93,7 +95,7 @@ class HomePage(QWidget):
     def create_portfolio(self):
         
         portfolio_name = self.portfolio_name_edit.text()
-        if portfolio_name in self.db.get_portfolio_names(self.user_id):
+        if portfolio_name in self.session.portfolios:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Icon.Critical)
             msg.setWindowTitle("Portfolio Creation Failed")
@@ -128,7 +130,7 @@ class HomePage(QWidget):
         #select from existing portfolios section
         portfolio_selector_layout = QHBoxLayout()
         self.portfolio_selector = QComboBox()
-        for portfolio_name in self.db.get_portfolio_names(self.user_id):
+        for portfolio_name in self.session.portfolio_names:
             self.portfolio_selector.addItem(portfolio_name)
         portfolio_selector_layout.addWidget(QLabel("Current Portfolio: "))
         portfolio_selector_layout.addWidget(self.portfolio_selector)
@@ -146,8 +148,7 @@ class HomePage(QWidget):
 
       
     def showEvent(self, event):
-        balance = self.db.get_balance(self.username)
-        self.balance_label.setText(f"Balance: ${balance:.2f}")  
+        self.balance_label.setText(f"Balance: ${self.session.balance:.2f}")  
         
     def open_trade_page(self):
         self.trade_click.emit(self.username, self.get_cur_portfolio_id())
@@ -163,7 +164,7 @@ class HomePage(QWidget):
 
     def get_cur_portfolio_id(self):
         cur_portfolio_name = self.portfolio_selector.currentText()
-        cur_portfolio_id = self.db.get_portfolio_id(cur_portfolio_name, self.user_id)
+        cur_portfolio_id = self.session.get_portfolio_id(cur_portfolio_name)
         return cur_portfolio_id
         
     def open_deposit_page(self):
@@ -1,25 +1,30 @@
 from PyQt6.QtWidgets import (QWidget, QLabel, 
                              QVBoxLayout, QLineEdit, 
                              QTableWidget, QTableWidgetItem)
+from PyQt6.QtCore import QTimer
+import pandas as pd
 
 class PositionsPage(QWidget):
-    def __init__(self, db, username, portfolio_id, home_page):
+    def __init__(self, db, username, portfolio_id, home_page, scheduler=None):
         super().__init__()
         self.setWindowTitle("Positions")
         self.home_page = home_page
         self.username = username
         self.portfolio_id = portfolio_id
         self.db = db
+        self.scheduler = scheduler
         self.resize(800, 400)
         self.make_ui()
 
     
     def make_ui(self):      
 
-        all_positions = self.db.get_all_positions(self.portfolio_id)
+        #value every position in one pass, with the last known prices when the
+        #scheduler will deliver fresh ones
+        self.valuation = self.db.value_portfolios([self.portfolio_id], fetch=self.scheduler is None)
     
         #If no position dont generate the table
-        if not all_positions:
+        if self.valuation.empty:
             label = QLabel("This portfolio does not have any positions.  You can buy stocks from the trade page")
             main_layout = QVBoxLayout()
             main_layout.addWidget(label)
@@ -27,38 +32,38 @@ class PositionsPage(QWidget):
         else:
             #search bar
             self.search_bar = QLineEdit(self)
-            self.search_bar.setPlaceholderText("Search by ticker...")
-            self.search_bar.textChanged.connect(self.filter_table)
+            self.search_bar.setPlaceholderText("Search by ticker or company...")
             
-            #get all position (so we know how many)
-            self.position_data = []
-            for (tic, position) in all_positions.items():
-                quantity = position["quantity"]
-                cost_basis = position["cost_basis"]
-                self.position_data.append((tic, quantity, cost_basis))
+            #only search once typing pauses
+            self.search_timer = QTimer(self)
+            self.search_timer.setSingleShot(True)
+            self.search_timer.setInterval(150)
+            self.search_timer.timeout.connect(lambda: self.filter_table(self.search_bar.text()))
+            self.search_bar.textChanged.connect(self.search_timer.start)
             
+            symbols = self.valuation["ticker"].tolist()
             
             #make and populate the positions table          
             self.positions_table = QTableWidget(self)
-            self.positions_table.setRowCount(len(self.position_data))
+            self.positions_table.setRowCount(len(self.valuation))
             self.positions_table.setColumnCount(7)
             self.positions_table.setHorizontalHeaderLabels(["Ticker symbol", 
                                                             "Qt.", "Buy Price", 
                                                             "Cost Basis", "Current Price", 
                                                             "Current Value", "Profit/Loss"])
-            self.populate_positions_table(self.position_data)
+            self.populate_positions_table(self.valuation)
             
             #totals table
             self.total_table = QTableWidget(self)
             self.total_table.setRowCount(1)
             self.total_table.setColumnCount(3)
             self.total_table.setHorizontalHeaderLabels(["Total Cost Basis", "Total value", "Total profit/loss"])
-            total_cost_basis = sum(position[2] for position in self.position_data)
-            total_value = sum(position[1]*self.db.get_ticker_price(position[0]) for position in self.position_data)
-            total_profit = total_value - total_cost_basis
-            self.total_table.setItem(0, 0, QTableWidgetItem(f"${total_cost_basis:,.2f}"))
-            self.total_table.setItem(0, 1, QTableWidgetItem(f"${total_value:,.2f}"))
-            self.total_table.setItem(0, 2, QTableWidgetItem(f"${total_profit:,.2f}"))
+            self.populate_totals_table()
+            
+            #refresh held prices in the background
+            if self.scheduler is not None:
+                self.scheduler.prices_ready.connect(self.update_prices)
+                self.scheduler.request(symbols, self.scheduler.HELD)
             
             
             #main page
@@ -72,27 +77,53 @@ class PositionsPage(QWidget):
         
 
     def populate_positions_table(self, data):
-                    
-            self.positions_table.setRowCount(len(data))
-            for row, (tic, quantity, cost_basis) in enumerate(data):
-                avg_price = cost_basis / quantity
-                cur_price = self.db.get_ticker_price(tic)
-                cur_value = quantity*cur_price
-                cur_profit = cur_value - cost_basis
-                
-                self.positions_table.setItem(row, 0, QTableWidgetItem(tic))
-                self.positions_table.setItem(row, 1, QTableWidgetItem(f"{quantity:,.2f}"))
-                self.positions_table.setItem(row, 2, QTableWidgetItem(f"${avg_price:,.2f}"))
-                self.positions_table.setItem(row, 3, QTableWidgetItem(f"${cost_basis:,.2f}"))
-                self.positions_table.setItem(row, 4, QTableWidgetItem(f"${cur_price:,.2f}"))
-                self.positions_table.setItem(row, 5, QTableWidgetItem(f"${cur_value:,.2f}"))
-                self.positions_table.setItem(row, 6, QTableWidgetItem(f"${cur_profit:,.2f}"))
+        
+        '''
+        Render positions from a valuation frame
+        
+        Args:
+            data (pd.DataFrame): rows of the valuation to show, in display order
+        '''
+        self.positions_table.setRowCount(len(data))
+        columns = zip(data["ticker"], data["quantity"], data["avg_price"], data["cost_basis"],
+                      data["price"], data["market_value"], data["unrealized_pnl"])
+        for row, values in enumerate(columns):
+            tic, quantity = values[0], values[1]
+            self.positions_table.setItem(row, 0, QTableWidgetItem(tic))
+            self.positions_table.setItem(row, 1, QTableWidgetItem(f"{quantity:,.2f}"))
+            for col, value in enumerate(values[2:], start=2):
+                text = "-" if pd.isna(value) else f"${value:,.2f}"
+                self.positions_table.setItem(row, col, QTableWidgetItem(text))
+    
+    
+    def populate_totals_table(self):
+        totals = self.db.totals(self.valuation).loc[self.portfolio_id]
+        self.total_table.setItem(0, 0, QTableWidgetItem(f"${totals['cost_basis']:,.2f}"))
+        self.total_table.setItem(0, 1, QTableWidgetItem(f"${totals['market_value']:,.2f}"))
+        self.total_table.setItem(0, 2, QTableWidgetItem(f"${totals['unrealized_pnl']:,.2f}"))
     
+    def update_prices(self, prices):
+        '''Revalue and redraw the tables when the scheduler delivers prices for held tickers'''
+        held = set(self.valuation["ticker"])
+        updated = {tic: price for tic, price in prices.items() if tic in held}
+        if not updated:
+            return
+        self.valuation = self.db.reprice(self.valuation, updated)
+        self.filter_table(self.search_bar.text())
+        self.populate_totals_table()
     
     def filter_table(self, text):
-        filtered = [row for row in self.position_data if text.lower() in row[0].lower()]
-        self.populate_positions_table(filtered)
+        '''Show the positions matching the search, ranked by the ticker search index'''
+        text = text.strip()
+        if not text:
+            self.populate_positions_table(self.valuation)
+            return
+        positions = self.valuation.set_index("ticker", drop=False)
+        matches = [tic for tic in self.db.search_tickers(text) if tic in positions.index]
+        self.populate_positions_table(positions.loc[matches])
              
     def closeEvent(self, event):
+        if self.scheduler is not None and not self.valuation.empty:
+            self.scheduler.prices_ready.disconnect(self.update_prices)
         self.home_page.show()
         self.close()
\ No newline at end of file
@@ -1,9 +1,12 @@
 
-from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout
+from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout, QComboBox
+from PyQt6.QtCore import QThreadPool
 import matplotlib
 matplotlib.use("QtAgg")
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+import pandas as pd
+from ..Workers.Worker import Worker
 
 class SummaryPage(QWidget):
     '''
@@ -11,7 +14,7 @@ class SummaryPage(QWidget):
     A QWidget for the portoflio summary page
 
     Displays portfolio statistics including:
-    -value history (planned)
+    -value history from the daily portfolio snapshots
     -ticker specific price history (planned)
     -a pie chart showing cost basis allocation by ticker
     
@@ -33,7 +36,7 @@ class SummaryPage(QWidget):
         
         '''
         Sets up the layout and UI components for the summary page
-        Currently only includes the pie chart
+        Includes the value history chart and the pie chart
         '''
         
         #layout placeholders for future graphs
@@ -43,6 +46,7 @@ class SummaryPage(QWidget):
         
         #Main layout with pie chart widget
         main_layout = QVBoxLayout()
+        main_layout.addWidget(ValueHistoryWidget(self.portfolio_id, self.db, self))
         main_layout.addWidget(PieChartWidget(self.portfolio_id, self.db, self))
         self.setLayout(main_layout)
             
@@ -52,6 +56,83 @@ class SummaryPage(QWidget):
         self.close()
         
 
+class ValueHistoryWidget(QWidget):
+    
+    '''
+    A QWidget that plots the portfolios market value and cost basis over time
+    -snapshots are brought up to date on a worker thread when the widget opens
+    -changing the range is a single query on the snapshot table
+    '''
+    
+    #range label -> days back, None shows everything
+    RANGES = {"1 month": 30, "3 months": 91, "1 year": 365, "All": None}
+    
+    def __init__(self, portfolio_id, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.portfolio_id = portfolio_id
+        
+        self.range_selector = QComboBox(self)
+        self.range_selector.addItems(list(self.RANGES))
+        self.range_selector.setCurrentText("1 year")
+        self.range_selector.currentTextChanged.connect(self.range_changed)
+        
+        self.figure = plt.figure()
+        self.canvas = FigureCanvas(self.figure)
+        
+        layout = QVBoxLayout()
+        layout.addWidget(self.range_selector)
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+        
+        self.show_message("Loading value history...")
+        self.update_worker = Worker(self.db.update_snapshots, [self.portfolio_id])
+        #bound methods are disconnected by Qt once the widget is gone, a lambda would outlive it
+        self.update_worker.signals.result.connect(self.snapshots_updated)
+        self.update_worker.signals.error.connect(self.snapshots_failed)
+        QThreadPool.globalInstance().start(self.update_worker)
+    
+    def range_changed(self, _):
+        self.plot_value_history()
+    
+    def snapshots_updated(self, _):
+        
+        '''Runs on the GUI thread once the snapshots are up to date'''
+        self.plot_value_history()
+        
+    def snapshots_failed(self, error:str):
+        print(f"Could not update snapshots: {error}")
+    
+    def show_message(self, text):
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+        ax.text(0.5, 0.5, text, ha='center', va='center')
+        ax.axis('off')
+        self.canvas.draw()
+    
+    def plot_value_history(self):
+        
+        '''Plot market value and cost basis for the selected range'''
+        days_back = self.RANGES[self.range_selector.currentText()]
+        start_date = None
+        if days_back is not None:
+            start_date = (pd.Timestamp.now() - pd.Timedelta(days=days_back)).strftime("%Y-%m-%d")
+        history = self.db.get_value_history(self.portfolio_id, start_date=start_date)
+        
+        if history.empty:
+            self.show_message("No value history yet")
+            return
+        
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+        ax.plot(history.index, history["market_value"], label="Market value")
+        ax.plot(history.index, history["cost_basis"], label="Cost basis", linestyle="--")
+        ax.set_title("Portfolio Value")
+        ax.legend()
+        self.figure.autofmt_xdate()
+        self.canvas.draw()
+
+
 class PieChartWidget(QWidget):
     
     '''
@@ -77,18 +158,14 @@ class PieChartWidget(QWidget):
     def get_data(self):
         
         '''
-        Retrieve portfolio position data from db
+        Retrieve portfolio position data from the valuation engine
+        -only the cost basis is needed, so no prices are looked up
         
         Returns:
             tuple: A list of ticker symbols and their cost basis
         '''
-        all_positions = self.db.get_all_positions(self.portfolio_id)
-        tics = []
-        cost_bases = []
-        for (tic, position) in all_positions.items():
-            tics.append(tic)
-            cost_bases.append(position["cost_basis"])
-        return tics, cost_bases
+        valuation = self.db.value_portfolios([self.portfolio_id], prices={})
+        return valuation["ticker"].tolist(), valuation["cost_basis"].tolist()
     
     def format_slice(self, pct, allvals):
         
@@ -109,12 +186,14 @@ class PieChartWidget(QWidget):
         
         #handle empty dataset
         if not cost_bases:
+            self.figure.clear()
+            ax = self.figure.add_subplot(111)
             ax.text(0.5, 0.5, "No data available", ha='center', va='center')
             self.canvas.draw()
             return
         
-        #sort positions by cost basis (decending)
-        sorted_data = sorted(zip(cost_bases, tics, colors), reverse=True, key=lambda x: x[0])
+        #sort positions by cost basis (decending), colors go to the biggest slices
+        sorted_data = sorted(zip(cost_bases, tics), reverse=True, key=lambda x: x[0])
         
         #show top 5 tickers and agregate the rest into "other"
         if len(sorted_data) > 5:
@@ -124,11 +203,11 @@ class PieChartWidget(QWidget):
 
             final_sizes = [data[0] for data in top_5_positions] + [other_size]
             final_labels = [data[1] for data in top_5_positions] + ["Other"]
-            final_colors = [data[2] for data in top_5_positions] + ["#d3d3d3"]
+            final_colors = colors + ["#d3d3d3"]
         else:
             final_sizes = [data[0] for data in sorted_data]
             final_labels = [data[1] for data in sorted_data]
-            final_colors = [data[2] for data in sorted_data]
+            final_colors = colors[:len(sorted_data)]
           
         #plot pie chart  
         self.figure.clear()
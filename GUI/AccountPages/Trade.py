@@ -1,18 +1,20 @@
-
-from PyQt6.QtWidgets import (QWidget, QLabel, QVBoxLayout, 
-                             QHBoxLayout,QPushButton,
-                             QFrame, QScrollArea, QLineEdit, QTableWidget, QTableWidgetItem)
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLineEdit, 
+                             QTableView, QAbstractItemView, QHeaderView, QMessageBox)
+from PyQt6.QtCore import QTimer
 from ..DialogBoxes.TradeDialog import TradeDialog
-from ..DialogBoxes.PriceHistoryDialog import PriceHistoryDialog
+from ..Models.TickerTableModel import TickerTableModel
+from ..Models.TickerFilterProxyModel import TickerFilterProxyModel
+from ..Models.ButtonDelegate import ButtonDelegate
 
 
 class TradePage(QWidget):
     
     '''
     UI page for viewing all available stocks, trading and viewing price history
-    -Allows searching/filtering of stocks by ticker
+    -Allows searching/filtering of stocks by ticker or company name
+    -Backed by a model/view table so only the rows on screen are drawn
     '''
-    def __init__(self, db, username, portfolio_id, home_page):
+    def __init__(self, db, username, portfolio_id, home_page, scheduler=None):
         
         '''
         Initilize the view
@@ -22,6 +24,7 @@ class TradePage(QWidget):
             username(str): current users username
             portfolio_id(int): identifier for current portfolio
             home_page(QWidget): reference back to the home page
+            scheduler(PriceRefreshScheduler): background price refresher, optional
         '''
         super().__init__()
         self.setWindowTitle("Trade")
@@ -29,6 +32,7 @@ class TradePage(QWidget):
         self.db = db
         self.username = username
         self.portfolio_id = portfolio_id
+        self.scheduler = scheduler
         self.resize(600, 400)
         self.make_ui()
       
@@ -39,15 +43,46 @@ class TradePage(QWidget):
         
         #search bar
         self.search_bar = QLineEdit()
-        self.search_bar.setPlaceholderText("Search by ticker...")
-        self.search_bar.textChanged.connect(self.filter_table)
+        self.search_bar.setPlaceholderText("Search by ticker or company...")
+        
+        #only search once typing pauses
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(lambda: self.filter_table(self.search_bar.text()))
+        self.search_bar.textChanged.connect(self.search_timer.start)
+        
+        #model over every ticker and a proxy that filters it by symbol
+        self.model = TickerTableModel(self.all_stocks, self)
+        self.proxy = TickerFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
         
         #table for displaying stock tickers, trade buttons and price history button
-        self.table = QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["Ticker", "Trade", "Price History"])
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(30)
+        self.table.verticalHeader().hide()
         self.table.setColumnWidth(0, 150)
-        self.populate_table(self.all_stocks)
+        
+        #buttons are painted by a delegate instead of one widget per row
+        self.button_delegate = ButtonDelegate(self.table)
+        self.button_delegate.clicked.connect(self.handle_button)
+        self.table.setItemDelegateForColumn(1, self.button_delegate)
+        self.table.setItemDelegateForColumn(2, self.button_delegate)
+        self.table.activated.connect(lambda index: self.trade_stock(self.symbol_at(index)))
+        
+        #refresh prices of the rows on screen once scrolling settles
+        if self.scheduler is not None:
+            self.refresh_timer = QTimer(self)
+            self.refresh_timer.setSingleShot(True)
+            self.refresh_timer.setInterval(200)
+            self.refresh_timer.timeout.connect(self.request_visible_prices)
+            self.table.verticalScrollBar().valueChanged.connect(self.refresh_timer.start)
+            self.scheduler.prices_ready.connect(self.update_prices)
+            self.refresh_timer.start()
 
         
         #combine layouts
@@ -65,40 +100,57 @@ class TradePage(QWidget):
             stocks (list of tuples): (ticker, price)
         
         '''
-        self.table.setRowCount(len(stocks))
-        
-        for row, (tic, price) in enumerate(stocks):
-            
-            #ticker and price label
-            label = QTableWidgetItem(f"{tic} : ${price:.2f}")
-            
-            #trade button
-            trade_button = QPushButton("Trade")
-            trade_button.clicked.connect(lambda _, tic=tic: self.trade_stock(tic))
-            
-            #price history button
-            history_button = QPushButton("Price History")
-            history_button.clicked.connect(lambda _, tic=tic: self.show_price_history(tic))
-            
-            #add widgets to the table
-            self.table.setItem(row, 0, label)
-            self.table.setCellWidget(row, 1, trade_button)
-            self.table.setCellWidget(row, 2, history_button)
+        self.model.set_tickers(stocks)
+        self.filter_table(self.search_bar.text())
 
     def filter_table(self, text):
         
         '''
         Filter the stock table based on search bar input
+        -matches are ranked by the ticker search index
         
         Args:
             text(str) : the search query
         '''
-        text = text.lower().strip()
+        text = text.strip()
+        self.proxy.set_matches(self.db.search_tickers(text) if text else None)
+        if self.scheduler is not None:
+            self.refresh_timer.start()
+    
+    def symbol_at(self, index):
+        '''Ticker symbol for a (proxy) index of the table'''
+        return index.data(TickerTableModel.SymbolRole)
+    
+    def handle_button(self, index):
+        
+        '''Dispatch a click on one of the painted action buttons'''
+        tic = self.symbol_at(index)
+        if index.column() == 1:
+            self.trade_stock(tic)
+        elif index.column() == 2:
+            self.show_price_history(tic)
+    
+    def request_visible_prices(self):
+        
+        '''Ask the scheduler to refresh the tickers currently on screen'''
+        first = self.table.rowAt(0)
+        if first < 0:
+            return
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last < 0:
+            last = self.proxy.rowCount() - 1
+        symbols = [self.symbol_at(self.proxy.index(row, 0)) for row in range(first, last + 1)]
+        self.scheduler.request(symbols, self.scheduler.VISIBLE)
+    
+    def update_prices(self, prices):
         
-        #filter tickers based on query
-        filtered = [(tic, price) for (tic, price) in self.all_stocks
-                    if text in tic.lower()]
-        self.populate_table(filtered)
+        '''
+        Update the labels of rows whose ticker got a fresh price
+        
+        Args:
+            prices (dict): {ticker : price} from the scheduler
+        '''
+        self.model.update_prices(prices)
         
     def show_price_history(self, tic):
         
@@ -109,6 +161,8 @@ class TradePage(QWidget):
             tic(str): The ticker symbol to view
         
         '''
+        #imported here so matplotlib only loads once a chart is opened
+        from ..DialogBoxes.PriceHistoryDialog import PriceHistoryDialog
         dialog = PriceHistoryDialog(self.db, tic)
         dialog.exec()
         
@@ -139,7 +193,13 @@ class TradePage(QWidget):
         
         #handle currency conversion to get number of shares
         if currency != "Shares":
-            amount /= self.db.get_ticker_price(tic)
+            price = self.db.get_ticker_prices([tic]).get(tic)
+            #provider down and no stored price, the dollars cannot be turned into shares
+            if not price:
+                QMessageBox.warning(self, "Trade Failed", f"There is no price for {tic} right now, try again later",
+                                    QMessageBox.StandardButton.Ok)
+                return
+            amount /= price
             
         #handle buy/sell operation for this trade
         if buy_or_sell == "Buy":
@@ -150,6 +210,8 @@ class TradePage(QWidget):
         
     def closeEvent(self, event):
         '''Return to home page when closed'''
+        if self.scheduler is not None:
+            self.scheduler.prices_ready.disconnect(self.update_prices)
         self.home_page.show()
         self.close()
         
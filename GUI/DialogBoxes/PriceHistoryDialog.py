@@ -1,4 +1,5 @@
 from PyQt6.QtWidgets import QDialog, QVBoxLayout
+from PyQt6.QtCore import QThreadPool
 import matplotlib
 matplotlib.use("QtAgg")
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT
@@ -6,6 +7,7 @@ from matplotlib.figure import Figure
 import pandas as pd
 import numpy as np
 import matplotlib.dates as mdates
+from ..Workers.Worker import Worker
 
 class MatplotCanvas(FigureCanvasQTAgg):
     
@@ -46,12 +48,45 @@ class PriceHistoryDialog(QDialog):
         
     def plot_price_history(self, days_back:int):
         
-        '''Fetch and draw the tickers price history on canvas'''
+        '''Fetch the tickers price history on a worker thread and draw it when it arrives'''
         cur_time = pd.Timestamp.now()
         start_date = cur_time - pd.DateOffset(days=days_back)
         
-        #get price history from the database
+        self.plot_canvas.axes.clear()
+        self.plot_canvas.axes.set_title(f"Loading {self.ticker} Price History...")
+        self.plot_canvas.draw()
+        
+        #get price history from the database without blocking the event loop
+        self.history_worker = Worker(self.load_price_history, start_date)
+        #bound methods are disconnected by Qt once the dialog is gone, a lambda would outlive it
+        self.history_worker.signals.result.connect(self.history_loaded)
+        self.history_worker.signals.error.connect(self.history_failed)
+        QThreadPool.globalInstance().start(self.history_worker)
+        
+    def history_loaded(self, result):
+        
+        '''Runs on the GUI thread with what load_price_history returned'''
+        self.draw_price_history(*result)
+        
+    def history_failed(self, error:str):
+        print(f"Could not load price history: {error}")
+        
+    def load_price_history(self, start_date):
+        
+        '''
+        Runs on the worker thread: sync the price history and read the indicators
+        the engine computed after the sync
+        
+        Returns:
+            tuple: (price history, indicators) 
+        '''
         price_history = self.db.get_ticker_history(self.ticker, start_date)
+        indicators = self.db.get_indicators(self.ticker, start_date.strftime("%Y-%m-%d"))
+        return price_history, indicators
+        
+    def draw_price_history(self, price_history, indicators=None):
+        
+        '''Draw the tickers price history and its bollinger bands on canvas'''
         
         #handle wrong dtype
         if isinstance(price_history, np.ndarray):
@@ -62,7 +97,14 @@ class PriceHistoryDialog(QDialog):
         self.plot_canvas.axes.clear()
         
         #draw date vs. price plot
-        self.plot_canvas.axes.plot(price_history.index, price_history.values)
+        self.plot_canvas.axes.plot(price_history.index, price_history.values, label="Close")
+        
+        #overlay the 20 day average and bollinger bands once they are warmed up
+        if indicators is not None and indicators["sma_20"].notna().any():
+            self.plot_canvas.axes.plot(indicators.index, indicators["sma_20"], label="SMA 20", linewidth=1)
+            self.plot_canvas.axes.fill_between(indicators.index, indicators["bb_lower"], indicators["bb_upper"],
+                                               alpha=0.15, label="Bollinger bands")
+            self.plot_canvas.axes.legend()
         
         #format x axis (dates)
         self.plot_canvas.axes.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
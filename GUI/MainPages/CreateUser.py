@@ -1,8 +1,9 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox
-from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtCore import pyqtSignal, QThreadPool
 import sqlite3
 import re  # for validating the email format
 from db.Database import Database
+from ..Workers.Worker import Worker
 
 class CreateUserPage(QWidget):
     
@@ -74,18 +75,29 @@ class CreateUserPage(QWidget):
             QMessageBox.warning(self, "Input Error", "Invalid email address", QMessageBox.StandardButton.Ok)
             return
         
-        #check for duplicate username
-        if self.db.contains_user(un):
-            QMessageBox.warning(self, "DB Error", "Username taken", QMessageBox.StandardButton.Ok)
-            return
-
-        #attempt to create the user
-        if self.db.create_user(un, pw, email):
+        #hash and insert on a worker thread, bcrypt is slow on purpose
+        #a taken username comes back as False from the UNIQUE constraint
+        self.create_button.setEnabled(False)
+        self.create_worker = Worker(self.db.create_user, un, pw, email)
+        self.create_worker.signals.result.connect(self.account_created)
+        self.create_worker.signals.error.connect(self.account_failed)
+        QThreadPool.globalInstance().start(self.create_worker)
+        
+    def account_created(self, created):
+        
+        '''Report the result of create_user back to the user'''
+        self.create_button.setEnabled(True)
+        if created:
             QMessageBox.information(self, "Account Created", "Your account was succesfully created!")
             self.success.emit(True)
             self.close()
         else:
-            QMessageBox.warning(self, "Account Creation Failed", "There was an error creating your account, try again later", QMessageBox.StandardButton.Ok)
+            QMessageBox.warning(self, "DB Error", "Username taken", QMessageBox.StandardButton.Ok)
+            
+    def account_failed(self, error):
+        self.create_button.setEnabled(True)
+        print(f"Could not create user: {error}")
+        QMessageBox.warning(self, "Account Creation Failed", "There was an error creating your account, try again later", QMessageBox.StandardButton.Ok)
         
            
     def is_email(self, email):
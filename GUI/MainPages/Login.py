@@ -2,9 +2,14 @@ import sys
 import sqlite3
 from PyQt6.QtWidgets import (QHBoxLayout, QWidget, QVBoxLayout,
                              QLabel, QLineEdit, QPushButton, QMessageBox,)
-from db.Database import Database
-from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtCore import pyqtSignal, QThreadPool
 from PyQt6.QtGui import QPixmap
+from typing import TYPE_CHECKING
+from ..Workers.Worker import Worker
+
+#only for the type hints, importing the db layer pulls in pandas
+if TYPE_CHECKING:
+    from db.Database import Database
 
 
 class LoginPage(QWidget):
@@ -22,9 +27,10 @@ class LoginPage(QWidget):
     make_user = pyqtSignal(bool)
     
     
-    def __init__(self, db:Database):
+    def __init__(self, db:"Database"=None):
         
         '''Initilize a login page and connect to db
+        -without a db the buttons stay disabled until set_database is called
         '''
         super().__init__()
         self.db = db
@@ -34,6 +40,14 @@ class LoginPage(QWidget):
         self.setGeometry(300,300,300,150)
         
         self.setup_ui()
+        self.set_database(db)
+        
+    def set_database(self, db:"Database"):
+        
+        '''Attach the db once it is open and enable logging in'''
+        self.db = db
+        self.login_button.setEnabled(db is not None)
+        self.make_user_button.setEnabled(db is not None)
         
     def setup_ui(self):
         '''
@@ -99,11 +113,26 @@ class LoginPage(QWidget):
             QMessageBox.warning(self, "Input Error", "Please enter a username and password to login", QMessageBox.StandardButton.Ok)
             return
         
-        #validate credentials
-        if self.db.verify_user(username, password):
+        #check the password hash on a worker thread so the window keeps painting
+        self.login_button.setEnabled(False)
+        self.login_worker = Worker(self.db.verify_user, username, password)
+        self.login_worker.signals.result.connect(lambda valid: self.login_checked(username, valid))
+        self.login_worker.signals.error.connect(self.login_failed)
+        QThreadPool.globalInstance().start(self.login_worker)
+        
+    def login_checked(self, username, valid):
+        
+        '''Switch to the home page or show an error once the credentials are checked'''
+        self.login_button.setEnabled(True)
+        if valid:
             self.login_successful.emit(username)
         else:
             QMessageBox.warning(self, "Login Failed", "Username or password is not correct", QMessageBox.StandardButton.Ok)
+            
+    def login_failed(self, error):
+        self.login_button.setEnabled(True)
+        print(f"Could not check login: {error}")
+        QMessageBox.warning(self, "Login Failed", "Could not reach the database, try again", QMessageBox.StandardButton.Ok)
 
 
 
@@ -0,0 +1,28 @@
+from PyQt6.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+from PyQt6.QtCore import Qt, QEvent, QModelIndex, pyqtSignal
+
+
+class ButtonDelegate(QStyledItemDelegate):
+
+    '''
+    Draws a push button in a table cell without creating a widget per row
+    -the button text is the cells display data
+    -emits clicked with the cells index when the button is released
+    '''
+    clicked = pyqtSignal(QModelIndex)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(Qt.ItemDataRole.DisplayRole) or ""
+        button.state = QStyle.StateFlag.State_Enabled | QStyle.StateFlag.State_Raised
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        style.drawControl(QStyle.ControlElement.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.Type.MouseButtonRelease
+                and event.button() == Qt.MouseButton.LeftButton
+                and option.rect.contains(event.position().toPoint())):
+            self.clicked.emit(index)
+            return True
+        return super().editorEvent(event, model, option, index)
@@ -0,0 +1,52 @@
+from PyQt6.QtCore import QSortFilterProxyModel
+
+
+class TickerFilterProxyModel(QSortFilterProxyModel):
+
+    '''
+    Filters and ranks a TickerTableModel by search results
+    -the matching rows are computed once per query into a flag array so
+     filterAcceptsRow is a single lookup instead of a data() round trip
+    -matching rows are ordered by their search rank, very broad queries
+     (more than rank_limit matches) keep the source order since sorting
+     them through lessThan would cost more than the search itself
+    '''
+    def __init__(self, parent=None, rank_limit=500):
+        super().__init__(parent)
+        self.rank_limit = rank_limit
+        self._accepted = None
+        self._rank = None
+
+    def set_matches(self, symbols):
+
+        '''
+        Show only the given tickers, in the given order
+
+        Args:
+            symbols (list of str or None): ranked search results, None shows every ticker
+        '''
+        #go back to the source order first so clearing never sorts every row
+        self.sort(-1)
+        if symbols is None:
+            self._accepted = None
+            self._rank = None
+        else:
+            rows = self.sourceModel().rows
+            self._accepted = bytearray(len(rows))
+            self._rank = [0] * len(rows)
+            for rank, symbol in enumerate(symbols):
+                row = rows.get(symbol)
+                if row is not None:
+                    self._accepted[row] = 1
+                    self._rank[row] = rank
+        self.invalidateFilter()
+        if symbols is not None and len(symbols) <= self.rank_limit:
+            self.sort(0)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self._accepted is None or self._accepted[source_row] == 1
+
+    def lessThan(self, left, right):
+        if self._rank is None:
+            return left.row() < right.row()
+        return self._rank[left.row()] < self._rank[right.row()]
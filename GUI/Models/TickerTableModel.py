@@ -0,0 +1,84 @@
+import math
+from array import array
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class TickerTableModel(QAbstractTableModel):
+
+    '''
+    Table model over a compact ticker array for the trade page
+    -Only the rows on screen are ever asked for their data, so the
+     universe size does not change how long opening or filtering takes
+    -Column 0 shows "ticker : $price", columns 1 and 2 are action buttons
+     drawn by a delegate
+    '''
+
+    #role that exposes the bare ticker symbol (used for filtering and actions)
+    SymbolRole = Qt.ItemDataRole.UserRole
+
+    HEADERS = ("Ticker", "Trade", "Price History")
+    ACTIONS = (None, "Trade", "Price History")
+
+    def __init__(self, stocks=(), parent=None):
+
+        '''
+        Args:
+            stocks (list of tuples): (ticker, price)
+        '''
+        super().__init__(parent)
+        self.set_tickers(stocks)
+
+    def set_tickers(self, stocks):
+
+        '''Replace the whole ticker list'''
+        self.beginResetModel()
+        self.symbols = [tic for tic, _ in stocks]
+        self.prices = array("d", (math.nan if price is None else price for _, price in stocks))
+        self.rows = {tic: row for row, tic in enumerate(self.symbols)}
+        self.endResetModel()
+
+    def update_prices(self, prices):
+
+        '''
+        Update prices in place and repaint only the changed span
+
+        Args:
+            prices (dict): {ticker : price}
+        '''
+        changed = [self.rows[tic] for tic in prices if tic in self.rows]
+        if not changed:
+            return
+        for tic, price in prices.items():
+            row = self.rows.get(tic)
+            if row is not None:
+                self.prices[row] = price
+        self.dataChanged.emit(self.index(min(changed), 0), self.index(max(changed), 0))
+
+    def symbol(self, row):
+        return self.symbols[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.symbols)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if col == 0:
+                price = self.prices[row]
+                if math.isnan(price):
+                    return f"{self.symbols[row]} : -"
+                return f"{self.symbols[row]} : ${price:.2f}"
+            return self.ACTIONS[col]
+        if role == self.SymbolRole:
+            return self.symbols[row]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
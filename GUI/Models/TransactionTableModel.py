@@ -0,0 +1,94 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class TransactionTableModel(QAbstractTableModel):
+
+    '''
+    Lazy table model over a portfolios transaction history
+    -rows are loaded a page at a time through canFetchMore/fetchMore,
+     so the view only pulls pages as the user scrolls down
+    -filters are applied by the database, changing them starts over at page one
+    '''
+
+    HEADERS = ("Date", "Action", "Ticker", "Quantity", "Price")
+
+    def __init__(self, db, portfolio_id, page_size=200, parent=None):
+
+        '''
+        Args:
+            db (Database): database to page transactions from
+            portfolio_id (int): portfolio to show
+            page_size (int): number of transactions fetched at a time
+        '''
+        super().__init__(parent)
+        self.db = db
+        self.portfolio_id = portfolio_id
+        self.page_size = page_size
+        self.filters = {}
+        self.transactions = []
+        self._cursor = None
+        self._exhausted = False
+        self._load_first_page()
+
+    def _load_first_page(self):
+        self.transactions, self._cursor = self.db.get_transactions_page(
+            self.portfolio_id, limit=self.page_size, **self.filters)
+        self._exhausted = self._cursor is None
+
+    def set_filters(self, start_date=None, end_date=None, tic=None, action=None):
+
+        '''
+        Show only matching transactions, None clears a filter
+
+        Args:
+            start_date (str or None): 'yyyy-MM-dd', first day to include
+            end_date (str or None): 'yyyy-MM-dd', last day to include
+            tic (str or None): ticker symbol
+            action (str or None): "buy" or "sell"
+        '''
+        self.beginResetModel()
+        self.filters = {"start_date": start_date, "end_date": end_date, "tic": tic, "action": action}
+        self._load_first_page()
+        self.endResetModel()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        page, self._cursor = self.db.get_transactions_page(
+            self.portfolio_id, after=self._cursor, limit=self.page_size, **self.filters)
+        self._exhausted = self._cursor is None
+        if not page:
+            return
+        first = len(self.transactions)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self.transactions.extend(page)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.transactions)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        action, quantity, ticker, price, timestamp = self.transactions[index.row()]
+        col = index.column()
+        if col == 0:
+            return timestamp
+        if col == 1:
+            return action
+        if col == 2:
+            return ticker
+        if col == 3:
+            return str(quantity)
+        return f"${price:,.2f}"
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
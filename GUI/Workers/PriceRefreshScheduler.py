@@ -0,0 +1,109 @@
+import heapq
+import itertools
+from PyQt6.QtCore import QObject, QThreadPool, pyqtSignal
+from .Worker import Worker
+
+
+class PriceRefreshScheduler(QObject):
+
+    '''
+    Refreshes stock quotes on worker threads so the GUI never blocks on the network
+
+    -Held positions are refreshed before symbols that are only on screen
+    -Duplicate requests for a symbol that is queued or in flight are coalesced
+    -Fresh prices are delivered to pages through the prices_ready signal
+    '''
+
+    #emitted on the GUI thread with {ticker : price}
+    prices_ready = pyqtSignal(dict)
+
+    #request priorities, lower runs first
+    HELD = 0
+    VISIBLE = 1
+
+    def __init__(self, db, batch_size=200, max_threads=2, parent=None):
+
+        '''
+        Args:
+            db: database api, get_ticker_prices is called on the workers
+            batch_size (int): maximum number of symbols fetched per job
+            max_threads (int): maximum number of jobs running at once
+        '''
+        super().__init__(parent)
+        self.db = db
+        self.batch_size = batch_size
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(max_threads)
+
+        self._heap = []
+        self._queued = {}
+        self._in_flight = set()
+        self._workers = set()
+        self._counter = itertools.count()
+
+    def request(self, symbols, priority=VISIBLE):
+
+        '''
+        Queue symbols for a background refresh
+
+        Args:
+            symbols (iterable of str): Ticker symbols
+            priority (int): HELD or VISIBLE
+        '''
+        for symbol in symbols:
+            if symbol in self._in_flight:
+                continue
+            queued_priority = self._queued.get(symbol)
+            if queued_priority is not None and queued_priority <= priority:
+                continue
+            self._queued[symbol] = priority
+            heapq.heappush(self._heap, (priority, next(self._counter), symbol))
+        self._dispatch()
+
+    def _take_batch(self):
+
+        '''Pop up to batch_size of the highest priority queued symbols'''
+        batch = []
+        while self._heap and len(batch) < self.batch_size:
+            priority, _, symbol = heapq.heappop(self._heap)
+
+            #skip heap entries superseded by a higher priority request
+            if self._queued.get(symbol) != priority:
+                continue
+            del self._queued[symbol]
+            self._in_flight.add(symbol)
+            batch.append(symbol)
+        return batch
+
+    def _dispatch(self):
+
+        '''Start a job for every free worker thread while work is queued'''
+        while self._queued and len(self._workers) < self.thread_pool.maxThreadCount():
+            batch = self._take_batch()
+            if not batch:
+                return
+            worker = Worker(self.db.get_ticker_prices, batch)
+            worker.signals.result.connect(lambda prices, worker=worker, batch=batch: self._finish(worker, batch, prices))
+            worker.signals.error.connect(lambda error, worker=worker, batch=batch: self._fail(worker, batch, error))
+            self._workers.add(worker)
+            self.thread_pool.start(worker)
+
+    def _finish(self, worker, batch, prices):
+        self._workers.discard(worker)
+        self._in_flight.difference_update(batch)
+        if prices:
+            self.prices_ready.emit(prices)
+        self._dispatch()
+
+    def _fail(self, worker, batch, error):
+        print(f"Price refresh failed: {error}")
+        self._workers.discard(worker)
+        self._in_flight.difference_update(batch)
+        self._dispatch()
+
+    def shutdown(self):
+
+        '''Drop queued work and wait for running jobs to finish'''
+        self._heap.clear()
+        self._queued.clear()
+        self.thread_pool.waitForDone()
@@ -0,0 +1,45 @@
+import traceback
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class WorkerSignals(QObject):
+
+    '''
+    Signals a Worker uses to report back to the GUI thread
+    -result carries the return value of the job
+    -error carries a formatted traceback if the job raised
+    -progress carries (done, total) for jobs that report it
+    '''
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+
+
+class Worker(QRunnable):
+
+    '''
+    Runs a blocking function (network or db work) on a QThreadPool thread
+    so the Qt event loop never waits on it
+    '''
+    def __init__(self, fn, *args, **kwargs):
+
+        '''
+        Args:
+            fn (callable): the blocking job
+            *args, **kwargs: arguments passed to fn
+        '''
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+    def run(self):
+
+        '''Run the job and emit its result or error'''
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception:
+            self.signals.error.emit(traceback.format_exc())
+        else:
+            self.signals.result.emit(result)
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+import numpy as np
+from bench.SyntheticData import PASSWORD, build_database, provider_for
+from db.Database import Database
+
+'''
+Benchmark suite for the Database API and the GUI pages
+
+Responsibilities:
+-Build (or reuse) a synthetic db with bench.SyntheticData
+-Time the hot Database calls one operation at a time and report throughput
+ and p50/p99 latency for each
+-Time page construction on the Qt offscreen platform
+-Write the results as JSON and compare them against an earlier run, failing
+ when something got slower than the allowed tolerance
+
+Run with:  python -m bench.Benchmark [--users 50 --transactions 500 ...]
+Gate a change on a saved run:  python -m bench.Benchmark --baseline bench_baseline.json
+'''
+
+
+def summarize(latencies, elapsed):
+
+    '''
+    Args:
+        latencies (list of float): seconds per operation
+        elapsed (float): wall time of the whole run in seconds
+
+    Returns:
+        dict: ops, throughput and latency percentiles in milliseconds
+    '''
+    ms = np.asarray(latencies) * 1000
+    return {
+        "ops": len(ms),
+        "elapsed_s": round(elapsed, 4),
+        "throughput_per_s": round(len(ms) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def measure(fn, calls):
+
+    '''
+    Run fn once per argument tuple and time every call
+
+    Returns:
+        dict: see summarize
+    '''
+    latencies = []
+    started = time.perf_counter()
+    for args in calls:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def bench_database(db, ops, refreshes, seed=0):
+
+    '''
+    Time the Database calls the pages use the most
+
+    Args:
+        db (Database): database opened on the synthetic file
+        ops (int): calls per benchmark
+        refreshes (int): update_all_tickers runs (each one touches every ticker)
+        seed (int): picks which users, portfolios and tickers are used
+
+    Returns:
+        dict: {benchmark name : summary}
+    '''
+    rng = np.random.default_rng(seed)
+    with db._connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""SELECT u.username, p.id FROM portfolios p
+                       JOIN users u ON u.id = p.user_id ORDER BY p.id""")
+        accounts = cursor.fetchall()
+        cursor.execute("SELECT DISTINCT ticker_symbol FROM transactions ORDER BY ticker_symbol")
+        symbols = [row[0] for row in cursor.fetchall()]
+
+    picks = [accounts[i] for i in rng.integers(0, len(accounts), ops)]
+    trades = [(username, portfolio_id, symbols[i], 1)
+              for (username, portfolio_id), i in zip(picks, rng.integers(0, len(symbols), ops))]
+    results = {}
+    results["buy_stock"] = measure(db.buy_stock, trades)
+    #sell back exactly what was bought, so every sell goes through
+    results["sell_stock"] = measure(db.sell_stock, trades)
+    results["get_all_positions"] = measure(db.get_all_positions, [(pid,) for _, pid in picks])
+    results["get_all_transactions"] = measure(db.get_all_transactions, [(pid,) for _, pid in picks])
+    results["verify_user"] = measure(db.verify_user, [(username, PASSWORD) for username, _ in picks])
+    #one untimed refresh first, the replay provider builds its price walks on first use
+    db.update_all_tickers()
+    results["update_all_tickers"] = measure(db.update_all_tickers, [()] * refreshes)
+    return results
+
+
+def bench_pages(db, ops, seed=0):
+
+    '''
+    Time constructing (and showing) every account page under the offscreen platform
+    -background workers a page starts are finished before the next one is built
+
+    Returns:
+        dict: {page_<name> : summary}
+    '''
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QThreadPool
+    from PyQt6.QtWidgets import QApplication
+    from GUI.AccountPages.MainPage import HomePage
+    from GUI.AccountPages.Trade import TradePage
+    from GUI.AccountPages.Positions import PositionsPage
+    from GUI.AccountPages.History import HistoryPage
+    from GUI.AccountPages.Summary import SummaryPage
+    from GUI.AccountPages.Deposit import DepositPage
+    #after the pages, they pick the Qt backend
+    import matplotlib.pyplot as plt
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    rng = np.random.default_rng(seed)
+    with db._connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT u.username, p.id FROM portfolios p JOIN users u ON u.id = p.user_id ORDER BY p.id")
+        accounts = cursor.fetchall()
+    username, portfolio_id = accounts[0]
+    home_page = HomePage(db, username)
+
+    pages = {
+        "HomePage": lambda username, pid: HomePage(db, username),
+        "TradePage": lambda username, pid: TradePage(db, username, pid, home_page),
+        "PositionsPage": lambda username, pid: PositionsPage(db, username, pid, home_page),
+        "HistoryPage": lambda username, pid: HistoryPage(db, pid, home_page),
+        "SummaryPage": lambda username, pid: SummaryPage(db, username, pid, home_page),
+        "DepositPage": lambda username, pid: DepositPage(db, username, home_page),
+    }
+    results = {}
+    for name, build in pages.items():
+        latencies = []
+        started = time.perf_counter()
+        for i in rng.integers(0, len(accounts), ops):
+            start = time.perf_counter()
+            page = build(*accounts[i])
+            page.show()
+            app.processEvents()
+            latencies.append(time.perf_counter() - start)
+            #clean up outside the timing, closeEvent would show the home page
+            QThreadPool.globalInstance().waitForDone()
+            app.processEvents()
+            page.hide()
+            page.deleteLater()
+            plt.close("all")
+        results[f"page_{name}"] = summarize(latencies, time.perf_counter() - started)
+    home_page.deleteLater()
+    app.processEvents()
+    return results
+
+
+def compare(results, baseline, tolerance):
+
+    '''
+    Find the benchmarks that got slower than the baseline allows
+    -a benchmark regresses when its p50 grows or its throughput drops by more than tolerance
+
+    Args:
+        results (dict): {benchmark name : summary} of this run
+        baseline (dict): same shape, from an earlier run
+        tolerance (float): allowed slowdown, 0.25 means 25%
+
+    Returns:
+        list of str: one line per regression
+    '''
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms")
+        if current["throughput_per_s"] * (1 + tolerance) < previous["throughput_per_s"]:
+            regressions.append(f"{name}: throughput {previous['throughput_per_s']}/s -> {current['throughput_per_s']}/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CashNinja Database API and GUI pages")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "cashninja_bench.db"),
+                        help="synthetic database file (rebuilt unless --reuse)")
+    parser.add_argument("--reuse", action="store_true", help="use the existing --db instead of rebuilding it")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--portfolios", type=int, default=2, help="portfolios per user")
+    parser.add_argument("--positions", type=int, default=10, help="positions per portfolio")
+    parser.add_argument("--transactions", type=int, default=100, help="transactions per portfolio")
+    parser.add_argument("--days", type=int, default=250, help="business days of price history")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="work factor of the synthetic password hashes")
+    parser.add_argument("--ops", type=int, default=200, help="calls per Database benchmark")
+    parser.add_argument("--refreshes", type=int, default=3, help="update_all_tickers runs")
+    parser.add_argument("--page-ops", type=int, default=10, help="constructions per page, 0 skips the GUI")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "tolerance")}
+    if not (args.reuse and os.path.exists(args.db)):
+        started = time.perf_counter()
+        counts = build_database(args.db, args.users, args.portfolios, args.positions, args.transactions,
+                                args.days, args.seed, args.bcrypt_rounds)
+        print(f"Built {args.db} in {time.perf_counter() - started:.1f}s: {counts}")
+
+    db = Database(args.db, provider=provider_for(args.days, args.seed))
+    try:
+        results = bench_database(db, args.ops, args.refreshes, args.seed)
+        if args.page_ops > 0:
+            results.update(bench_pages(db, args.page_ops, args.seed))
+    finally:
+        db.close()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                        "platform": platform.platform()},
+        "config": config,
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print(f"{'benchmark':<28}{'ops/s':>12}{'p50 ms':>12}{'p99 ms':>12}")
+    for name, result in results.items():
+        print(f"{name:<28}{result['throughput_per_s']:>12}{result['p50_ms']:>12}{result['p99_ms']:>12}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bench.Benchmark import compare, summarize
+from db.ConnectionPool import ConnectionPool
+from db.Database import SCHEMA
+from db.UserManager import UserManager
+
+'''
+Headless login throughput benchmark
+
+Responsibilities:
+-Create users at a chosen bcrypt work factor in a scratch db
+-Run verify_user from a thread pool the way the login worker pool does
+ (bcrypt releases the GIL, so threads use every core)
+-Report logins per second in total and per core for each thread count,
+ to size hardware for bursts of concurrent logins
+
+Run with:  python -m bench.LoginThroughput [--rounds 12 --threads 1,2,4 --logins 40]
+'''
+
+
+def run(user_manager, usernames, password, threads, logins):
+
+    '''
+    Time `logins` verify_user calls spread over `threads` threads
+
+    Returns:
+        dict: see bench.Benchmark.summarize, plus logins per second per core
+    '''
+    def login(username):
+        start = time.perf_counter()
+        if not user_manager.verify_user(username, password):
+            raise RuntimeError(f"login failed for {username}")
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(login, [usernames[i % len(usernames)] for i in range(logins)]))
+    result = summarize(latencies, time.perf_counter() - started)
+    cores = min(threads, os.cpu_count() or 1)
+    result["threads"] = threads
+    result["throughput_per_core"] = round(result["throughput_per_s"] / cores, 2)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure bcrypt logins per second")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt work factor, the app default is 12")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--threads", default="1,2,4", help="comma separated thread counts")
+    parser.add_argument("--logins", type=int, default=40, help="logins per thread count")
+    parser.add_argument("--output", default="login_results.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    password = "bench-password"
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        pool = ConnectionPool(os.path.join(folder, "logins.db"))
+        try:
+            with pool.connection() as conn:
+                conn.executescript(SCHEMA)
+            user_manager = UserManager(pool.connection, bcrypt_rounds=args.rounds)
+            usernames = [f"bench_user_{n}" for n in range(args.users)]
+            started = time.perf_counter()
+            for username in usernames:
+                user_manager.create_user(username, password)
+            print(f"Created {args.users} users at {args.rounds} rounds in {time.perf_counter() - started:.2f}s")
+
+            for threads in (int(count) for count in args.threads.split(",")):
+                results[f"verify_user_{threads}_threads"] = run(user_manager, usernames, password, threads, args.logins)
+        finally:
+            pool.close()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print(f"{'benchmark':<28}{'logins/s':>12}{'per core':>12}{'p50 ms':>12}{'p99 ms':>12}")
+    for name, result in results.items():
+        print(f"{name:<28}{result['throughput_per_s']:>12}{result['throughput_per_core']:>12}"
+              f"{result['p50_ms']:>12}{result['p99_ms']:>12}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from bench.Benchmark import compare, summarize
+
+'''
+Cold start benchmark for Driver.py
+
+Responsibilities:
+-Measure how long "import Driver" takes with python -X importtime, in a fresh
+ interpreter every run so nothing is cached in sys.modules
+-Measure the time from interpreter start until the login window is shown
+ (offscreen), which is what the user waits for
+-Fail when either goes over its budget or when a heavy module is loaded
+ before the login window appears
+
+Run with:  python -m bench.StartupTime [--runs 10 --baseline startup_baseline.json]
+'''
+
+#modules that must not be imported before the login window shows
+HEAVY_MODULES = ("pandas", "numpy", "matplotlib", "yfinance")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#runs in the child, prints the seconds since the parent launched it once the login
+#window is shown, then the top level modules that got imported
+LOGIN_SCRIPT = """
+import sys, time
+import Driver
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv[:1])
+main_app = Driver.MainApplication()
+main_app.show_login()
+app.processEvents()
+print(time.time() - float(sys.argv[1]))
+print(",".join(sorted(name for name in sys.modules if "." not in name)))
+"""
+
+
+def parse_importtime(stderr):
+
+    '''
+    Read the -X importtime report
+
+    Returns:
+        dict: {module : (self microseconds, cumulative microseconds)}
+    '''
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure_import(runs):
+
+    '''
+    Import Driver in fresh interpreters
+
+    Returns:
+        tuple: (seconds per run, parse_importtime of the last run)
+    '''
+    latencies = []
+    times = {}
+    for _ in range(runs):
+        child = subprocess.run([sys.executable, "-X", "importtime", "-c", "import Driver"],
+                               cwd=ROOT, capture_output=True, text=True, check=True)
+        times = parse_importtime(child.stderr)
+        latencies.append(times["Driver"][1] / 1e6)
+    return latencies, times
+
+
+def measure_login(runs):
+
+    '''
+    Start an interpreter and show the login window offscreen
+
+    Returns:
+        tuple: (seconds from interpreter start to login shown per run, top level modules loaded)
+    '''
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    latencies = []
+    modules = set()
+    for _ in range(runs):
+        child = subprocess.run([sys.executable, "-c", LOGIN_SCRIPT, repr(time.time())], cwd=ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+        elapsed, loaded = child.stdout.strip().splitlines()[-2:]
+        latencies.append(float(elapsed))
+        modules = set(loaded.split(","))
+    return latencies, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure Driver.py cold start")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--import-budget-ms", type=float, default=250.0, help="allowed p50 of import Driver")
+    parser.add_argument("--login-budget-ms", type=float, default=600.0,
+                        help="allowed p50 from interpreter start to the login window")
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    import_latencies, times = measure_import(args.runs)
+    import_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    login_latencies, modules = measure_login(args.runs)
+    login_elapsed = time.perf_counter() - started
+
+    results = {
+        "import_Driver": summarize(import_latencies, import_elapsed),
+        "login_window_shown": summarize(login_latencies, login_elapsed),
+    }
+    heavy = sorted(name for name in HEAVY_MODULES if name in modules)
+    slowest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:15]
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "results": results,
+        "heavy_modules_at_login": heavy,
+        "slowest_imports_us": {name: self_us for name, (self_us, _) in slowest},
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for name, result in results.items():
+        print(f"{name:<24} p50 {result['p50_ms']:>9}ms  p99 {result['p99_ms']:>9}ms")
+    print(f"Results written to {args.output}")
+
+    failures = []
+    if results["import_Driver"]["p50_ms"] > args.import_budget_ms:
+        failures.append(f"import Driver p50 {results['import_Driver']['p50_ms']}ms > {args.import_budget_ms}ms")
+    if results["login_window_shown"]["p50_ms"] > args.login_budget_ms:
+        failures.append(f"login window p50 {results['login_window_shown']['p50_ms']}ms > {args.login_budget_ms}ms")
+    if heavy:
+        failures.append(f"loaded before the login window: {', '.join(heavy)}")
+    if args.baseline:
+        with open(args.baseline) as file:
+            failures += compare(results, json.load(file)["results"], args.tolerance)
+    for line in failures:
+        print(f"OVER BUDGET {line}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import os
+import bcrypt
+import numpy as np
+import pandas as pd
+from db.Database import Database
+from db.LotLedger import rebuild_ledger
+from db.ReplayProvider import ReplayProvider
+
+'''
+Synthetic users.db generator for the benchmarks
+
+Responsibilities:
+-Build a db at a chosen scale (users, portfolios, positions, transactions, days of history)
+-Use the offline ReplayProvider for every price so no network is touched
+-Write the rows with bulk inserts, the result looks like the app produced it
+
+The same seed always produces the same database.
+'''
+
+PASSWORD = "bench-password"
+
+
+def provider_for(days, seed=0):
+
+    '''
+    Offline price source whose random walks cover the last `days` business days
+
+    Args:
+        days (int): business days of history every ticker gets
+        seed (int): random walk seed
+
+    Returns:
+        ReplayProvider
+    '''
+    start = pd.Timestamp.now().normalize() - pd.offsets.BDay(days)
+    return ReplayProvider(seed=seed, start_date=start.strftime("%Y-%m-%d"))
+
+
+def _remove(path):
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _trades(rng, symbols, closes, transactions, days):
+
+    '''
+    Random buys and sells for one portfolio, oldest first
+    -the first trade of every symbol is a buy and sells never close a position,
+     so the portfolio ends up holding every symbol
+    -cost basis is left to rebuild_ledger, which like execute_trade takes out the
+     FIFO cost of the lots every sell closes
+
+    Returns:
+        tuple: (transactions, positions) lists of (ticker, action, shares, price, timestamp)
+            and {ticker : shares}
+    '''
+    count = max(transactions, len(symbols))
+    order = list(symbols) + list(rng.choice(symbols, count - len(symbols)))
+    day_index = np.sort(rng.integers(0, len(days), count))
+    seconds = np.sort(rng.integers(9 * 3600, 16 * 3600, count))
+
+    rows = []
+    positions = {}
+    for tic, day, second in zip(order, day_index, seconds):
+        price = float(closes[tic].iat[day])
+        timestamp = (days[day] + pd.Timedelta(seconds=int(second))).strftime("%Y-%m-%d %H:%M:%S")
+        held = positions.get(tic, 0)
+        if held > 1 and rng.random() < 0.3:
+            shares = int(rng.integers(1, held))
+            positions[tic] = held - shares
+            rows.append((tic, "sell", shares, price, timestamp))
+        else:
+            shares = int(rng.integers(1, 50))
+            positions[tic] = held + shares
+            rows.append((tic, "buy", shares, price, timestamp))
+    return rows, positions
+
+
+def build_database(path, users=10, portfolios=2, positions=10, transactions=50, days=250,
+                   seed=0, bcrypt_rounds=4, balance=1_000_000.0):
+
+    '''
+    Create a fresh synthetic database, replacing any file at path
+
+    Args:
+        path (str): SQLite file to write
+        users (int): number of users, named bench_user_<n>
+        portfolios (int): portfolios per user
+        positions (int): distinct tickers held per portfolio
+        transactions (int): transactions per portfolio (at least one per position)
+        days (int): business days of price history for every held ticker
+        seed (int): seed for the data and the price walks
+        bcrypt_rounds (int): work factor of the stored password hashes, the app
+            uses bcrypt's default (12), low values keep the build fast
+        balance (float): starting cash of every user
+
+    Returns:
+        dict: row counts of what was written
+    '''
+    _remove(path)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    rng = np.random.default_rng(seed)
+    provider = provider_for(days, seed)
+    db = Database(path, provider=provider)
+    try:
+        symbols = [tic for tic, _ in db.get_all_tickers()]
+        traded = sorted(set(rng.choice(symbols, min(len(symbols), max(positions * 4, 50)), replace=False)))
+        closes = {tic: provider.history(tic, provider.start_date)["Close"] for tic in traded}
+        trading_days = closes[traded[0]].index
+
+        with db._connect() as conn:
+            cursor = conn.cursor()
+            user_rows = []
+            for user in range(users):
+                hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=bcrypt_rounds))
+                user_rows.append((f"bench_user_{user}", hashed, f"bench_user_{user}@example.com", balance))
+            cursor.executemany("INSERT INTO users (username, password, email, balance) VALUES (?, ?, ?, ?)", user_rows)
+
+            cursor.execute("SELECT id FROM users ORDER BY id")
+            user_ids = [row[0] for row in cursor.fetchall()]
+            cursor.executemany("INSERT INTO portfolios (user_id, portfolio_name) VALUES (?, ?)",
+                               [(user_id, f"Portfolio {n}") for user_id in user_ids for n in range(portfolios)])
+
+            cursor.execute("SELECT ticker_symbol, id FROM tickers")
+            ticker_ids = dict(cursor.fetchall())
+            cursor.execute("SELECT id FROM portfolios ORDER BY id")
+            portfolio_ids = [row[0] for row in cursor.fetchall()]
+
+            transaction_rows = []
+            position_rows = []
+            for portfolio_id in portfolio_ids:
+                chosen = list(rng.choice(traded, min(positions, len(traded)), replace=False))
+                trades, holdings = _trades(rng, chosen, closes, transactions, trading_days)
+                transaction_rows += [(portfolio_id, *trade) for trade in trades]
+                position_rows += [(portfolio_id, ticker_ids[tic], shares, 0.0)
+                                  for tic, shares in holdings.items()]
+            cursor.executemany("""INSERT INTO transactions (portfolio_id, ticker_symbol, action, quantity, price, timestamp)
+                               VALUES (?, ?, ?, ?, ?, ?)""", transaction_rows)
+            cursor.executemany("INSERT INTO positions (portfolio_id, ticker_id, quantity, cost_basis) VALUES (?, ?, ?, ?)",
+                               position_rows)
+            #tax lots, aggregates and the positions cost basis, as the trades would have left them
+            rebuild_ledger(cursor)
+
+            history_rows = []
+            for tic in traded:
+                history = provider.history(tic, provider.start_date)
+                history_rows += zip([ticker_ids[tic]] * len(history), history.index.strftime("%Y-%m-%d"),
+                                    history["Close"].tolist(), history["Volume"].tolist())
+            cursor.executemany("""INSERT OR REPLACE INTO price_history (ticker_id, date, close_price, volume)
+                               VALUES (?, ?, ?, ?)""", history_rows)
+
+        return {
+            "users": len(user_ids),
+            "portfolios": len(portfolio_ids),
+            "positions": len(position_rows),
+            "transactions": len(transaction_rows),
+            "price_history": len(history_rows),
+            "tickers": len(symbols),
+        }
+    finally:
+        db.close()
@@ -0,0 +1,64 @@
+import threading
+import time
+
+'''
+Shared rate limit backoff for concurrent provider requests
+
+Responsibilities:
+-Make every worker wait the same delay before a request
+-Double the delay when a request looks rate limited, shrink it again on success
+-Track how long requests have been failing in a row, so callers can give up
+'''
+class AdaptiveBackoff:
+    def __init__(self, initial=0.0, minimum=0.25, maximum=30.0, clock=time.monotonic, sleep=time.sleep):
+
+        '''
+        Args:
+            initial (float): starting delay in seconds between requests
+            minimum (float): smallest delay used once a failure was seen
+            maximum (float): the delay never grows past this
+            clock (callable): time source, monotonic seconds
+            sleep (callable): used to wait out the delay
+        '''
+        self.minimum = minimum
+        self.maximum = maximum
+        self.delay = initial
+        self._clock = clock
+        self._sleep = sleep
+        self._next_slot = 0.0
+        self._failing_since = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+
+        '''Block until this thread may send its next request'''
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay
+        if slot > now:
+            self._sleep(slot - now)
+
+    def success(self):
+
+        '''A request went through, halve the delay'''
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.minimum else 0.0
+            self._failing_since = None
+
+    def failure(self):
+
+        '''A request failed or came back empty, double the delay'''
+        with self._lock:
+            self.delay = min(self.maximum, max(self.minimum, self.delay * 2))
+            if self._failing_since is None:
+                self._failing_since = self._clock()
+
+    def failing_for(self):
+
+        '''
+        Returns:
+            float: seconds since the first failure with no success after it, 0 while requests go through
+        '''
+        with self._lock:
+            return 0.0 if self._failing_since is None else self._clock() - self._failing_since
@@ -0,0 +1,335 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from itertools import islice
+
+'''
+Streaming bulk export and import of the big tables
+
+Responsibilities:
+-Stream transactions, positions, price_history and technical_indicators to CSV or
+ Parquet a batch at a time (fetchmany), so memory stays bounded by the batch size
+-Load those files back with executemany, committing in large transactions
+-Write tickers as symbols instead of ids so price and indicator files move between db files
+-Keep portfolio ids as they are, so transactions and positions restore into the db
+ they were exported from (or a copy of it), rows of portfolios the db lacks are skipped
+-Report rows per second for every table moved
+
+Parquet needs pyarrow, it is only imported when a .parquet file is read or written.
+
+Run with:  python -m db.BulkIO export exports/ [--db users.db --format parquet --tables transactions]
+           python -m db.BulkIO import exports/transactions.parquet exports/price_history.csv [--db users.db]
+'''
+
+#rows read or written per batch
+BATCH_SIZE = 10_000
+
+#rows loaded per import transaction
+COMMIT_EVERY = 200_000
+
+FORMATS = ("csv", "parquet")
+
+#per table: columns with their types, the export query, the import statement,
+#(positions only) a statement clearing the rows an import replaces
+#and whether the tax lot ledger is rebuilt after an import
+#ticker_symbol columns are mapped to ticker ids on import, except in transactions which keeps the symbol
+TABLES = {
+    "transactions": {
+        "columns": (("id", "int"), ("portfolio_id", "int"), ("ticker_symbol", "str"), ("action", "str"),
+                    ("quantity", "float"), ("price", "float"), ("timestamp", "str")),
+        "select": """SELECT id, portfolio_id, ticker_symbol, action, quantity, price, timestamp
+                  FROM transactions""",
+        #ids are kept, so loading the same backup twice does not duplicate trades
+        "insert": """INSERT OR IGNORE INTO transactions (id, portfolio_id, ticker_symbol, action, quantity, price, timestamp)
+                  VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        "map_symbol": False,
+        "rebuild_ledger": True,
+    },
+    "positions": {
+        "columns": (("portfolio_id", "int"), ("ticker_symbol", "str"), ("quantity", "float"),
+                    ("purchase_date", "str"), ("cost_basis", "float")),
+        "select": """SELECT p.portfolio_id, t.ticker_symbol, p.quantity, p.purchase_date, p.cost_basis
+                  FROM positions p JOIN tickers t ON t.id = p.ticker_id""",
+        #cost_basis is part of the key, so replace the whole position instead of upserting
+        "delete": "DELETE FROM positions WHERE portfolio_id = ? AND ticker_id = ?",
+        "insert": """INSERT INTO positions (portfolio_id, ticker_id, quantity, purchase_date, cost_basis)
+                  VALUES (?, ?, ?, ?, ?)""",
+        "map_symbol": True,
+        #the ledger rebuild resets the cost basis of positions that match the transactions
+        "rebuild_ledger": True,
+    },
+    "price_history": {
+        "columns": (("ticker_symbol", "str"), ("date", "str"), ("close_price", "float"), ("volume", "int")),
+        "select": """SELECT t.ticker_symbol, h.date, h.close_price, h.volume
+                  FROM price_history h JOIN tickers t ON t.id = h.ticker_id""",
+        "insert": """INSERT INTO price_history (ticker_id, date, close_price, volume) VALUES (?, ?, ?, ?)
+                  ON CONFLICT (ticker_id, date) DO UPDATE SET
+                  close_price = excluded.close_price, volume = excluded.volume""",
+        "map_symbol": True,
+    },
+    "technical_indicators": {
+        "columns": (("ticker_symbol", "str"), ("date", "str"), ("rsi", "float"), ("macd", "float"),
+                    ("macd_signal", "float"), ("sma_20", "float"), ("ema_12", "float"), ("ema_26", "float"),
+                    ("bb_upper", "float"), ("bb_lower", "float"), ("avg_gain", "float"), ("avg_loss", "float")),
+        "select": """SELECT t.ticker_symbol, i.date, i.rsi, i.macd, i.macd_signal, i.sma_20, i.ema_12, i.ema_26,
+                  i.bb_upper, i.bb_lower, i.avg_gain, i.avg_loss
+                  FROM technical_indicators i JOIN tickers t ON t.id = i.ticker_id""",
+        "insert": """INSERT INTO technical_indicators
+                  (ticker_id, date, rsi, macd, macd_signal, sma_20, ema_12, ema_26, bb_upper, bb_lower, avg_gain, avg_loss)
+                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                  ON CONFLICT (ticker_id, date) DO UPDATE SET
+                  rsi = excluded.rsi, macd = excluded.macd, macd_signal = excluded.macd_signal,
+                  sma_20 = excluded.sma_20, ema_12 = excluded.ema_12, ema_26 = excluded.ema_26,
+                  bb_upper = excluded.bb_upper, bb_lower = excluded.bb_lower,
+                  avg_gain = excluded.avg_gain, avg_loss = excluded.avg_loss""",
+        "map_symbol": True,
+    },
+}
+
+#text from a CSV cell -> python value, empty cells are NULL
+_PARSERS = {"int": lambda text: int(float(text)), "float": float, "str": str}
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _format_of(path):
+
+    '''csv or parquet, from the file extension'''
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension not in FORMATS:
+        raise ValueError(f"{path} is not a .csv or .parquet file")
+    return extension
+
+
+def _report(table, rows, skipped, elapsed):
+    return {
+        "table": table,
+        "rows": rows,
+        "skipped": skipped,
+        "elapsed_s": round(elapsed, 4),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+class BulkIO:
+    def __init__(self, db_connection):
+
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+        '''
+        self._connect = db_connection
+
+    def export_table(self, table, path, batch_size=BATCH_SIZE):
+
+        '''
+        Stream a table to a CSV or Parquet file (picked by the extension)
+        -one SELECT, read a batch at a time, so the export is a consistent snapshot
+        -Parquet gets one row group per batch
+
+        Args:
+            table (str): a key of TABLES
+            path (str): .csv or .parquet file to write
+            batch_size (int): rows held in memory at once
+
+        Returns:
+            dict: {"table", "rows", "skipped", "elapsed_s", "rows_per_s"}
+        '''
+        spec = TABLES[table]
+        names = [name for name, _ in spec["columns"]]
+        file_format = _format_of(path)
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        started = time.perf_counter()
+        rows = 0
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(spec["select"])
+            if file_format == "csv":
+                with open(path, "w", newline="") as file:
+                    writer = csv.writer(file)
+                    writer.writerow(names)
+                    while batch := cursor.fetchmany(batch_size):
+                        writer.writerows(batch)
+                        rows += len(batch)
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                schema = _arrow_schema(spec["columns"])
+                with pq.ParquetWriter(path, schema) as writer:
+                    while batch := cursor.fetchmany(batch_size):
+                        columns = [list(column) for column in zip(*batch)]
+                        writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                        rows += len(batch)
+                    if rows == 0:
+                        writer.write_table(schema.empty_table())
+        return _report(table, rows, 0, time.perf_counter() - started)
+
+    def export_all(self, folder, file_format="csv", tables=None, batch_size=BATCH_SIZE):
+
+        '''
+        Export several tables to <folder>/<table>.<file_format>
+
+        Returns:
+            list of dict: one export_table report per table
+        '''
+        if file_format not in FORMATS:
+            raise ValueError(f"unknown format {file_format}")
+        return [self.export_table(table, os.path.join(folder, f"{table}.{file_format}"), batch_size)
+                for table in (tables or TABLES)]
+
+    def _read_batches(self, path, columns, batch_size):
+
+        '''Yield lists of row tuples (typed) from a CSV or Parquet file, in file order'''
+        names = [name for name, _ in columns]
+        if _format_of(path) == "csv":
+            parsers = [_PARSERS[kind] for _, kind in columns]
+            with open(path, newline="") as file:
+                reader = csv.reader(file)
+                header = next(reader, None)
+                if header != names:
+                    raise ValueError(f"{path} has columns {header}, expected {names}")
+                while batch := list(islice(reader, batch_size)):
+                    yield [tuple(parse(text) if text != "" else None for parse, text in zip(parsers, row))
+                           for row in batch]
+        else:
+            import pyarrow.parquet as pq
+            parquet = pq.ParquetFile(path)
+            if parquet.schema_arrow.names != names:
+                raise ValueError(f"{path} has columns {parquet.schema_arrow.names}, expected {names}")
+            for record_batch in parquet.iter_batches(batch_size=batch_size):
+                yield list(zip(*(column.to_pylist() for column in record_batch.columns)))
+
+    def import_table(self, table, path, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY):
+
+        '''
+        Load a file written by export_table
+        -executemany per batch, committing every commit_every rows
+        -rows for tickers or portfolios this db does not know are skipped,
+         as are transactions whose id is already taken
+        -importing transactions or positions rebuilds the tax lot ledger afterwards
+        -importing price_history bumps the stamp that makes the history cache rebuild
+
+        Args:
+            table (str): a key of TABLES
+            path (str): .csv or .parquet file to read
+            batch_size (int): rows held in memory at once
+            commit_every (int): rows per write transaction
+
+        Returns:
+            dict: {"table", "rows", "skipped", "elapsed_s", "rows_per_s"}, rows counts
+                only the rows the db actually took
+
+        Raises:
+            ValueError: the files columns do not match the table
+        '''
+        spec = TABLES[table]
+        names = [name for name, _ in spec["columns"]]
+        symbol_at = names.index("ticker_symbol")
+        portfolio_at = names.index("portfolio_id") if "portfolio_id" in names else None
+
+        started = time.perf_counter()
+        rows = skipped = pending = 0
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            ticker_ids = dict(cursor.execute("SELECT ticker_symbol, id FROM tickers").fetchall())
+            portfolio_ids = {row[0] for row in cursor.execute("SELECT id FROM portfolios")}
+            cursor.execute("BEGIN IMMEDIATE")
+            #upserts keep the row ids, the history cache can only notice the import from the stamp,
+            #written again at the end so a rebuild that ran mid-import is outdated too
+            if table == "price_history":
+                _bump_import_stamp(cursor)
+            for batch in self._read_batches(path, spec["columns"], batch_size):
+                if portfolio_at is not None:
+                    kept = [row for row in batch if row[portfolio_at] in portfolio_ids]
+                    skipped += len(batch) - len(kept)
+                    batch = kept
+                if spec["map_symbol"]:
+                    mapped = []
+                    for row in batch:
+                        ticker_id = ticker_ids.get(row[symbol_at])
+                        if ticker_id is None:
+                            skipped += 1
+                            continue
+                        mapped.append(row[:symbol_at] + (ticker_id,) + row[symbol_at + 1:])
+                    batch = mapped
+                if "delete" in spec:
+                    cursor.executemany(spec["delete"], {(row[0], row[1]) for row in batch})
+                #INSERT OR IGNORE drops colliding ids without an error, count what was written
+                changes = conn.total_changes
+                cursor.executemany(spec["insert"], batch)
+                written = conn.total_changes - changes
+                rows += written
+                skipped += len(batch) - written
+                pending += len(batch)
+                if pending >= commit_every:
+                    conn.commit()
+                    cursor.execute("BEGIN IMMEDIATE")
+                    pending = 0
+            if spec.get("rebuild_ledger"):
+                from db.LotLedger import rebuild_ledger
+                rebuild_ledger(cursor)
+            if table == "price_history":
+                _bump_import_stamp(cursor)
+        return _report(table, rows, skipped, time.perf_counter() - started)
+
+
+def _bump_import_stamp(cursor):
+    from db.PriceHistoryCache import IMPORT_STAMP
+    cursor.execute("INSERT OR REPLACE INTO universe_meta (key, value) VALUES (?, ?)", (IMPORT_STAMP, str(time.time_ns())))
+
+
+def _print_reports(reports):
+    print(f"{'table':<24}{'rows':>12}{'skipped':>10}{'seconds':>10}{'rows/s':>14}")
+    for report in reports:
+        print(f"{report['table']:<24}{report['rows']:>12}{report['skipped']:>10}"
+              f"{report['elapsed_s']:>10}{report['rows_per_s']:>14}")
+
+
+def main(argv=None):
+    from db.ConnectionPool import ConnectionPool
+    from db.MigrationManager import MigrationManager
+
+    parser = argparse.ArgumentParser(description="Bulk export and import of CashNinja tables")
+    parser.add_argument("--db", default="users.db")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows held in memory at once")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write tables to <folder>/<table>.<format>")
+    export.add_argument("folder")
+    export.add_argument("--format", choices=FORMATS, default="csv")
+    export.add_argument("--tables", nargs="+", choices=list(TABLES), help="defaults to every table")
+    load = commands.add_parser("import", help="load files named <table>.csv or <table>.parquet")
+    load.add_argument("files", nargs="+")
+    load.add_argument("--commit-every", type=int, default=COMMIT_EVERY, help="rows per write transaction")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db)
+    try:
+        MigrationManager(pool.connection).migrate()
+        bulk_io = BulkIO(pool.connection)
+        if args.command == "export":
+            reports = bulk_io.export_all(args.folder, args.format, args.tables, args.batch_size)
+        else:
+            reports = []
+            for path in args.files:
+                table = os.path.splitext(os.path.basename(path))[0]
+                if table not in TABLES:
+                    print(f"ERROR: {path} must be named after one of {', '.join(TABLES)}")
+                    return 1
+                reports.append(bulk_io.import_table(table, path, args.batch_size, args.commit_every))
+    finally:
+        pool.close()
+    _print_reports(reports)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
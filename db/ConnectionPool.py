@@ -0,0 +1,143 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from queue import LifoQueue, Empty, Full
+from db.Instrumentation import profiler, ProfiledConnection
+
+'''
+Thread aware pool of SQLite connections
+
+Responsibilities:
+-Reuse open connections instead of reconnecting for every query
+-Configure every connection once (WAL journaling, tuned PRAGMAs, statement cache)
+-Hand out at most one connection per thread at a time so nested borrows share it
+'''
+
+#PRAGMAs applied to every new connection
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class ConnectionPool:
+    def __init__(self, db_name, max_size=8, cached_statements=256):
+
+        '''
+        Initilize an empty pool, connections are opened lazily
+
+        Args:
+            db_name (str): SQLite database file name
+            max_size (int): maximum number of idle connections kept open
+            cached_statements (int): size of each connections prepared statement cache
+        '''
+        self.db_name = db_name
+        self.max_size = max_size
+        self.cached_statements = cached_statements
+        self._idle = LifoQueue(maxsize=max_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+        self._closed = False
+
+    def _open(self):
+
+        '''Open and configure a new connection'''
+        conn = sqlite3.connect(self.db_name,
+                               check_same_thread=False,
+                               cached_statements=self.cached_statements,
+                               factory=ProfiledConnection if profiler.enabled else sqlite3.Connection)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def _acquire(self):
+
+        '''Take an idle connection or open a new one'''
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            return self._open()
+
+    def _release(self, conn):
+
+        '''Return a connection to the pool or close it if the pool is full'''
+        if self._closed:
+            self._discard(conn)
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except Full:
+            self._discard(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            if conn in self._all:
+                self._all.remove(conn)
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+
+        '''
+        Borrow a connection for the current thread
+        -commits on success and rolls back on error when the outermost borrow exits
+        -nested borrows on the same thread get the same connection and
+         join the outer transaction
+
+        Yields:
+            sqlite3.Connection
+        '''
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+
+        '''
+        Borrow a connection inside a BEGIN IMMEDIATE transaction
+        -takes the write lock up front so read-modify-write steps cannot race
+        -joins the callers transaction if one is already open on this thread
+
+        Yields:
+            sqlite3.Connection
+        '''
+        with self.connection() as conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+
+    def close(self):
+
+        '''Close every connection owned by the pool'''
+        self._closed = True
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
@@ -1,12 +1,121 @@
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
+from db.ConnectionPool import ConnectionPool
 from db.PortfolioManager import PortfolioManager
 from db.TickerManager import TickerManager
 from db.UserManager import UserManager
 from db.TransactionManager import TransactionManager
+from db.MigrationManager import MigrationManager
+from db.PortfolioValuation import PortfolioValuation
+from db.SnapshotManager import SnapshotManager
+from db.IndicatorEngine import IndicatorEngine
+from db.Instrumentation import profiler
+from db.UserSession import UserSession
+from db.LotLedger import LotLedger
+from db.BulkIO import BulkIO
+from db.PriceHistoryCache import PriceHistoryCache
+
+
+#base tables, anything added to an existing table goes in a migration instead
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        email TEXT,
+        balance REAL default 0.0,
+        creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS portfolios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        portfolio_name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+        CONSTRAINT unique_user_portfolio UNIQUE (user_id, portfolio_name)
+    );
+
+    CREATE TABLE IF NOT EXISTS tickers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticker_symbol TEXT UNIQUE NOT NULL,
+        current_price REAL,
+        company_name TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS positions (
+        portfolio_id INTEGER,
+        ticker_id INTEGER,
+        quantity INTEGER,
+        purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        cost_basis REAL,
+        PRIMARY KEY (portfolio_id, ticker_id, cost_basis),
+        FOREIGN KEY (portfolio_id) REFERENCES portfolios(id) ON DELETE CASCADE,
+        FOREIGN KEY (ticker_id) REFERENCES tickers(id) ON DELETE CASCADE
+    );
+    
+    CREATE TABLE if NOT EXISTS transactions (
+       id INTEGER PRIMARY KEY AUTOINCREMENT,
+       portfolio_id INTEGER,
+       ticker_symbol TEXT,
+       action TEXT,
+       quantity INTEGER,
+       price REAL,
+       timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+       FOREIGN KEY (portfolio_id) REFERENCES portfolios(id),
+       FOREIGN KEY (ticker_symbol) REFERENCES tickers(ticker_symbol)
+        
+    );
+    
+    CREATE TABLE IF NOT EXISTS technical_indicators (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticker_id INTEGER,
+        date DATE,
+        rsi REAL,
+        macd REAL,
+        FOREIGN KEY (ticker_id) REFERENCES tickers(id) ON DELETE CASCADE
+    );
+    
+    CREATE TABLE IF NOT EXISTS price_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticker_id INTEGER,
+        date DATE,
+        close_price REAL,
+        volume INTEGER,
+        FOREIGN KEY (ticker_id) REFERENCES tickers(id) ON DELETE CASCADE
+    );
+    
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_price_history_ticker_date 
+        ON price_history (ticker_id, date);
+    
+    CREATE TABLE IF NOT EXISTS ticker_universe (
+        symbol TEXT PRIMARY KEY,
+        cik INTEGER,
+        title TEXT,
+        rank INTEGER
+    ) WITHOUT ROWID;
+    
+    CREATE TABLE IF NOT EXISTS universe_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    
+    CREATE TABLE IF NOT EXISTS seed_checkpoints (
+        chunk INTEGER PRIMARY KEY,
+        universe_sha256 TEXT,
+        chunk_size INTEGER,
+        tickers INTEGER,
+        completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+'''
 
 
 class Database:
-    def __init__(self, db_name="users.db", update_tickers=False):
+    def __init__(self, db_name="users.db", update_tickers=False, quote_ttl=60.0, provider=None, seed_progress=None,
+                 bcrypt_rounds=12, history_cache_dir=None, seed_cancelled=None):
         
         '''
         Initilize the main database
@@ -14,120 +123,129 @@ class Database:
         Args:
             -db_name (str): SQLite database file name
             -update_tickers(bool): whether to fetch new ticker prices or not
+            -quote_ttl (float): seconds a cached stock price stays fresh
+            -provider (MarketDataProvider): source of market data, defaults to yahoo finance
+            -seed_progress (callable): called as seed_progress(done, total) while tickers are seeded
+            -bcrypt_rounds (int): work factor for new password hashes
+            -history_cache_dir (str): folder of the memory mapped price history, <db_name>_history by default
+            -seed_cancelled (callable): returns True once the user cancelled seeding, the next launch resumes it
+
+        Raises:
+            FileNotFoundError: a new database has no ticker universe to seed from
         '''
         self.db_name = db_name
+        self.pool = ConnectionPool(db_name)
+        
+        #open UserSessions by username, kept current by the writes below
+        self.sessions = {}
         
         # Initilize subclasses that expose APIs for the table operations
         self.portfolio_manager = PortfolioManager(self._connect)
-        self.ticker_manager = TickerManager(self._connect)
-        self.user_manager = UserManager(self._connect)
+        self.history_cache = PriceHistoryCache(self._connect,
+                                               history_cache_dir or f"{os.path.splitext(db_name)[0]}_history")
+        #the indicators follow every history sync
+        self.indicator_engine = IndicatorEngine(self._connect, db_name)
+        self.ticker_manager = TickerManager(self._connect, provider=provider, quote_ttl=quote_ttl,
+                                            history_cache=self.history_cache,
+                                            history_synced=self.indicator_engine.update_indicators)
+        self.user_manager = UserManager(self._connect, bcrypt_rounds=bcrypt_rounds)
         self.transaction_manager = TransactionManager(self._connect)
+        self.migration_manager = MigrationManager(self._connect)
+        self.portfolio_valuation = PortfolioValuation(self._connect, self.ticker_manager.get_ticker_prices)
+        self.snapshot_manager = SnapshotManager(self._connect)
+        self.lot_ledger = LotLedger(self._connect, self.ticker_manager.get_ticker_prices)
+        self.bulk_io = BulkIO(self._connect)
+        
+        #time every manager and provider call when profiling is on (no-op otherwise)
+        if profiler.enabled:
+            for manager in (self.portfolio_manager, self.ticker_manager, self.user_manager,
+                            self.transaction_manager, self.migration_manager, self.portfolio_valuation,
+                            self.snapshot_manager, self.indicator_engine, self.lot_ledger, self.bulk_io,
+                            self.history_cache):
+                profiler.instrument_object(manager, skip=("_connect",))
+            profiler.instrument_object(self.ticker_manager.provider, category="provider")
+            profiler.instrument_object(self, skip=("_connect", "_timed_connection", "_delegate"))
         
-        #create schema and populate tickers if the DB is uninitilized
-        if not self.is_init():
-            self.create_schema()
-            self._add_all_tickers()
+        #create schema (or add any missing tables/indexes)
+        self.create_schema()
+        
+        #populate tickers if the DB is new or an earlier seed was interrupted
+        self.sync_thread = None
+        if not self.is_seeded():
+            try:
+                self._add_all_tickers(progress=seed_progress, cancelled=seed_cancelled)
+            except Exception:
+                #e.g. no ticker universe, nothing stays open behind the error
+                self.close()
+                raise
             
-        #If DB is initilized, update tickers if requested
+        #If DB is initilized, apply ticker universe changes 
+        #and update tickers if requested, off the startup path (both hit the network)
         else:
+            self.sync_thread = threading.Thread(target=self._sync_in_background, args=(update_tickers,),
+                                                name="universe-sync", daemon=True)
+            self.sync_thread.start()
+
+    def _sync_in_background(self, update_tickers):
+        
+        '''Runs on sync_thread: universe delta sync, then the optional price refresh'''
+        try:
+            self.sync_universe()
             if update_tickers:
                 self.update_all_tickers()
+        except Exception as e:
+            #an interrupted sync is retried on the next launch
+            print(f"Background ticker sync failed: {e}")
 
 
 
     def _connect(self):
-        '''Internal helper to securley connect to DB'''
-        return sqlite3.connect(self.db_name)
+        '''
+        Internal helper to securley borrow a pooled connection
+        
+        Returns:
+            context manager yielding a sqlite3.Connection that is committed
+            (or rolled back on error) when the block exits
+        '''
+        if profiler.enabled:
+            return self._timed_connection()
+        return self.pool.connection()
+    
+    @contextmanager
+    def _timed_connection(self):
+        
+        '''Borrow a connection and record how long it was held'''
+        with profiler.timed("pool", "connection"), self.pool.connection() as conn:
+            yield conn
+    
+    def close(self):
+        '''Close all pooled connections and the history maps'''
+        #give a running sync a moment to finish its write, it resumes next launch otherwise
+        if self.sync_thread is not None:
+            self.sync_thread.join(timeout=1.0)
+        self.history_cache.shutdown()
+        self.pool.close()
     
     def create_schema(self):
         
-        '''Creates all neccesary tables if they dont exist'''
-        schema = '''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            email TEXT,
-            balance REAL default 0.0,
-            creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS portfolios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            portfolio_name TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-            CONSTRAINT unique_user_portfolio UNIQUE (user_id, portfolio_name)
-        );
-
-        CREATE TABLE IF NOT EXISTS tickers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticker_symbol TEXT UNIQUE NOT NULL,
-            current_price REAL,
-            company_name TEXT,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS positions (
-            portfolio_id INTEGER,
-            ticker_id INTEGER,
-            quantity INTEGER,
-            purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            cost_basis REAL,
-            PRIMARY KEY (portfolio_id, ticker_id, cost_basis),
-            FOREIGN KEY (portfolio_id) REFERENCES portfolios(id) ON DELETE CASCADE,
-            FOREIGN KEY (ticker_id) REFERENCES tickers(id) ON DELETE CASCADE
-        );
-        
-        CREATE TABLE if NOT EXISTS transactions (
-           id INTEGER PRIMARY KEY AUTOINCREMENT,
-           portfolio_id INTEGER,
-           ticker_symbol TEXT,
-           action TEXT,
-           quantity INTEGER,
-           price REAL,
-           timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-           FOREIGN KEY (portfolio_id) REFERENCES portfolios(id),
-           FOREIGN KEY (ticker_symbol) REFERENCES tickers(ticker_symbol)
-            
-        );
-        
-        CREATE TABLE IF NOT EXISTS technical_indicators (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticker_id INTEGER,
-            date DATE,
-            rsi REAL,
-            macd REAL,
-            FOREIGN KEY (ticker_id) REFERENCES tickers(id) ON DELETE CASCADE
-        );
-        
-        CREATE TABLE IF NOT EXISTS price_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticker_id INTEGER,
-            date DATE,
-            close_price REAL,
-            volume INTEGER,
-            FOREIGN KEY (ticker_id) REFERENCES tickers(id) ON DELETE CASCADE
-        );
-        '''
-        
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.executescript(schema)
-        conn.commit()
-        conn.close()
+        '''
+        Creates all neccesary tables if they dont exist, then upgrades
+        the schema to the latest version with the pending migrations
+        '''
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self.migration_manager.migrate()
     
     def is_init(self):
         '''Check if all tables already exist in database'''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("""SELECT name FROM sqlite_master 
-                       WHERE type='table' AND name IN 
-                       ('users', 'portfolios', 'tickers', 
-                       'positions', 'transactions',
-                       'technical_indicators', 'price_history')""")
-        tables = cursor.fetchall()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT name FROM sqlite_master 
+                           WHERE type='table' AND name IN 
+                           ('users', 'portfolios', 'tickers', 
+                           'positions', 'transactions',
+                           'technical_indicators', 'price_history')""")
+            tables = cursor.fetchall()
         
         if not tables:
             return False
@@ -136,96 +254,223 @@ class Database:
         return {'users', 'portfolios', 'tickers', 'positions', 'transactions', 'technical_indicators', 'price_history'}.issubset(existing_tables)
         
         
+    def open_session(self, username):
+        
+        '''
+        Load the users account into a UserSession for the pages to read from
+        
+        Args:
+            username (str): the user that just logged in
+            
+        Returns:
+            UserSession: kept up to date by deposits, trades and portfolio changes
+        '''
+        session = UserSession(self._connect, username)
+        self.sessions[username] = session
+        return session
+    
+    def close_session(self, username):
+        self.sessions.pop(username, None)
+    
+    def _session_by_id(self, user_id):
+        for session in self.sessions.values():
+            if session.user_id == user_id:
+                return session
+        return None
+    
+    def deposit(self, username, amount):
+        
+        '''
+        Add money to a users balance
+        
+        Returns:
+            bool: True if the deposit went through
+        '''
+        balance = self.user_manager.deposit(username, amount)
+        if balance is None:
+            return False
+        if username in self.sessions:
+            self.sessions[username].set_balance(balance)
+        return True
+    
+    def withdrawal(self, username, amount):
+        
+        '''
+        Take money out of a users balance
+        
+        Returns:
+            bool: True if the user could afford it
+        '''
+        balance = self.user_manager.withdrawal(username, amount)
+        if balance is None:
+            return False
+        if username in self.sessions:
+            self.sessions[username].set_balance(balance)
+        return True
+    
+    def create_portfolio(self, user_id, portfolio_name):
+        
+        '''
+        Create a portfolio for a user
+        
+        Returns:
+            int: id of the new portfolio
+        '''
+        portfolio_id = self.portfolio_manager.create_portfolio(user_id, portfolio_name)
+        session = self._session_by_id(user_id)
+        if session is not None:
+            session.add_portfolio(portfolio_name, portfolio_id)
+        return portfolio_id
+    
+    def delete_portfolio(self, user_id, portfolio_name):
+        
+        '''Delete a users portfolio'''
+        self.portfolio_manager.delete_portfolio(user_id, portfolio_name)
+        session = self._session_by_id(user_id)
+        if session is not None:
+            session.remove_portfolio(portfolio_name)
+        
     def contains_user(self, username):
         '''Check if the requested user is in the database'''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM users WHERE username = ?", (username,))
-        user_exists = cursor.fetchone() is not None
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM users WHERE username = ?", (username,))
+            user_exists = cursor.fetchone() is not None
         return user_exists
     
 
-    def sell_stock(self, username, portfolio_id, tic, shares):
+    def sell_stock(self, username, portfolio_id, tic, shares, lot_method="fifo", lot_ids=None):
         '''
         Sell shares of a stock from a users portfolio
         -Update balance
         -Adjust position
+        -close tax lots (see LotLedger.record_sell)
         -logs transaction
         
+        Returns:
+            bool: True if the trade went through
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        
-        #validate sufficient shares
-        owned_shares = self.get_owned_shares(portfolio_id, tic)
-        if owned_shares < shares:
-            print("ERROR: you do not have enough shares to sell")
-            return None
-        
-        #calculate proceeds
-        sale_price = shares*self.get_ticker_price(tic)
-        new_owned_shares = owned_shares - shares
-        self.deposit(username, sale_price)
-        
-        #update position
-        if new_owned_shares == 0:
-            cursor.execute('''DELETE FROM positions 
-                           WHERE portfolio_id = ? AND ticker_id = 
-                           (SELECT id FROM tickers WHERE ticker_symbol = ?)''', (portfolio_id, tic))
-        else:
-            cursor.execute('''UPDATE positions SET quantity = ? 
-                           WHERE portfolio_id = ? AND ticker_id = 
-                           (SELECT id FROM tickers WHERE ticker_symbol = ?)''', (new_owned_shares, portfolio_id, tic))
-        
-
-        conn.commit()
-        conn.close()
-        
-        #log transaction
-        self.create_transaction(portfolio_id, tic, "sell", shares, self.get_ticker_price(tic))
+        return self.execute_trade(username, portfolio_id, tic, "sell", shares, lot_method=lot_method, lot_ids=lot_ids)
         
     
     def buy_stock(self, username, portfolio_id, tic, shares):
         '''
         Buy shares of a stock and update the users portfolio/balance
+        -open a tax lot
         -log the transaction
         
+        Returns:
+            bool: True if the trade went through
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        #ensure the user can afford the transaction
-        purchase_price = shares*self.get_ticker_price(tic)
-        balance = self.get_balance(username)
-
-        if purchase_price > balance:
-            print("error cant afford it")
-            return False
+        return self.execute_trade(username, portfolio_id, tic, "buy", shares)
+    
+    def execute_trade(self, username, portfolio_id, tic, action, shares, price=None, lot_method="fifo", lot_ids=None):
         
-        #Deduct balance and update position
-        self.withdrawal(username, purchase_price)
-        tic_id = self.get_tic_id(tic)
-        old_position = self.get_position(portfolio_id, tic)
-        
-        if old_position:
-            new_shares = shares + old_position["shares"]
-            new_cost_basis = purchase_price + old_position["cost_basis"]
-            cursor.execute("""UPDATE positions 
-                           SET quantity = ?, cost_basis = ? 
-                           WHERE portfolio_id = ? AND ticker_id = ?""", (new_shares, new_cost_basis, portfolio_id, tic_id))
-            conn.commit()
-            
-        else:
-            cursor.execute("""INSERT INTO positions 
-                           (portfolio_id, ticker_id, quantity, cost_basis) 
-                           values (?, ?, ?, ?)""", (portfolio_id, tic_id, shares, purchase_price))
-            conn.commit()
+        '''
+        Execute a buy or sell as one atomic transaction
+        -resolves the price once, before taking the write lock
+        -balance check/update, position upsert, transaction log and tax lots
+         all run inside a single BEGIN IMMEDIATE transaction on one connection
+        
+        Args:
+            username (str): user paying for / receiving the proceeds
+            portfolio_id (int): portfolio holding the position
+            tic (str): Ticker symbol
+            action (str): "buy" or "sell"
+            shares (float): number of shares to trade
+            price (float): execution price, looked up when not given
+            lot_method (str): which lots a sell closes, "fifo", "lifo" or "specific"
+            lot_ids (list of int): lots to close for "specific", see get_open_lots
             
-        conn.close()
+        Returns:
+            bool: True if the trade went through, False if it was rejected
+        '''
+        if action not in ("buy", "sell"):
+            print("ERROR: invalid action")
+            return False
+        if price is None:
+            price = self.get_ticker_price(tic)
+        #provider down and no stored price
+        if price is None:
+            print(f"ERROR: no price for {tic}")
+            return False
+        total = shares*price
+        
+        try:
+            with self.pool.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id FROM tickers WHERE ticker_symbol = ?", (tic,))
+                row = cursor.fetchone()
+                if row is None:
+                    print("ERROR: unknown ticker")
+                    return False
+                ticker_id = row[0]
+                
+                if action == "buy":
+                    #deduct balance only if the user can afford it
+                    cursor.execute("""UPDATE users SET balance = balance - ? 
+                                   WHERE username = ? AND balance >= ? RETURNING balance""", (total, username, total))
+                    row = cursor.fetchone()
+                    if row is None:
+                        print("error cant afford it")
+                        return False
+                    balance = row[0]
+                    
+                    #add to the existing position or open a new one
+                    cursor.execute("""UPDATE positions 
+                                   SET quantity = quantity + ?, cost_basis = cost_basis + ? 
+                                   WHERE portfolio_id = ? AND ticker_id = ?""", (shares, total, portfolio_id, ticker_id))
+                    if cursor.rowcount == 0:
+                        cursor.execute("""INSERT INTO positions 
+                                       (portfolio_id, ticker_id, quantity, cost_basis) 
+                                       VALUES (?, ?, ?, ?)""", (portfolio_id, ticker_id, shares, total))
+                else:
+                    #reduce the position only if enough shares are owned
+                    cursor.execute("""UPDATE positions SET quantity = quantity - ? 
+                                   WHERE portfolio_id = ? AND ticker_id = ? AND quantity >= ?""",
+                                   (shares, portfolio_id, ticker_id, shares))
+                    if cursor.rowcount == 0:
+                        print("ERROR: you do not have enough shares to sell")
+                        return False
+                    cursor.execute("UPDATE users SET balance = balance + ? WHERE username = ? RETURNING balance", (total, username))
+                    balance = cursor.fetchone()[0]
+                
+                #log the transaction, its id and time key the tax lots
+                cursor.execute("""INSERT INTO transactions 
+                               (portfolio_id, ticker_symbol, action, quantity, price) 
+                               VALUES (?, ?, ?, ?, ?) RETURNING id, timestamp""", (portfolio_id, tic, action, shares, price))
+                transaction_id, timestamp = cursor.fetchone()
+                
+                if action == "buy":
+                    self.lot_ledger.record_buy(cursor, portfolio_id, ticker_id, transaction_id, timestamp, shares, price)
+                else:
+                    closed = self.lot_ledger.record_sell(cursor, portfolio_id, ticker_id, transaction_id, timestamp,
+                                                         shares, price, lot_method, lot_ids)
+                    #the sold lots cost leaves the position, the rest stays as its basis
+                    cursor.execute("""UPDATE positions SET cost_basis = MAX(cost_basis - ?, 0) 
+                                   WHERE portfolio_id = ? AND ticker_id = ?""", (closed["cost"], portfolio_id, ticker_id))
+                    cursor.execute("""DELETE FROM positions 
+                                   WHERE portfolio_id = ? AND ticker_id = ? AND quantity <= 1e-9""", (portfolio_id, ticker_id))
+        except ValueError as e:
+            #bad lot selection, everything above was rolled back
+            print(f"ERROR: {e}")
+            return False
         
-        #log the transaction
-        self.create_transaction(portfolio_id, tic, "buy", shares, self.get_ticker_price(tic))
+        #write-through once the transaction has committed
+        if username in self.sessions:
+            self.sessions[username].set_balance(balance)
+        return True
+
+    def import_table(self, table, path, **kwargs):
+        
+        '''
+        BulkIO.import_table, then drop the history maps after a price_history import
+        so they are not served until the background rebuild picked up the new closes
+        '''
+        report = self.bulk_io.import_table(table, path, **kwargs)
+        if table == "price_history":
+            self.history_cache.close()
+        return report
 
     def __getattr__(self, name):
         
@@ -233,6 +478,13 @@ class Database:
         Delegate table specific queries to apropriate manager class
             -Unifies APIs for each table
         '''
+        attr = self._delegate(name)
+        #counts calls per delegated name, including the lookup itself
+        if profiler.enabled and callable(attr):
+            return profiler.wrap("delegation", name, attr)
+        return attr
+    
+    def _delegate(self, name):
         if hasattr(self.user_manager, name):
             return getattr(self.user_manager, name)
         if hasattr(self.portfolio_manager, name):
@@ -241,6 +493,18 @@ class Database:
             return getattr(self.ticker_manager, name)
         if hasattr(self.transaction_manager, name):
             return getattr(self.transaction_manager, name)
+        if hasattr(self.portfolio_valuation, name):
+            return getattr(self.portfolio_valuation, name)
+        if hasattr(self.snapshot_manager, name):
+            return getattr(self.snapshot_manager, name)
+        if hasattr(self.indicator_engine, name):
+            return getattr(self.indicator_engine, name)
+        if hasattr(self.lot_ledger, name):
+            return getattr(self.lot_ledger, name)
+        if hasattr(self.bulk_io, name):
+            return getattr(self.bulk_io, name)
+        if hasattr(self.history_cache, name):
+            return getattr(self.history_cache, name)
         
 if __name__ == "__main__":
     #debugging entry point
@@ -0,0 +1,285 @@
+import multiprocessing
+import os
+import pathlib
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from db.Instrumentation import profiler, ProfiledConnection
+
+'''
+Technical indicators computed from the stored price history
+
+Responsibilities:
+-Compute RSI (Wilder), MACD with its signal line, SMA/EMA and Bollinger bands
+ with pandas/numpy over whole price series at once
+-Only compute dates after the last stored indicator row of a ticker, carrying
+ the EMA and RSI averages forward from that row
+-Redo the rows from a close that was added or changed after they were computed,
+ the price_history triggers record it in indicator_dirty
+-Spread the universe over a process pool and bulk write the results into
+ technical_indicators, so the GUI only ever reads them
+
+Run for every ticker with stored history:  python -m db.IndicatorEngine [users.db]
+'''
+
+RSI_PERIOD = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+SMA_WINDOW = 20
+BOLLINGER_WIDTH = 2.0
+
+#technical_indicators columns written by the engine, after ticker_id and date
+COLUMNS = ["rsi", "macd", "macd_signal", "sma_20", "ema_12", "ema_26",
+           "bb_upper", "bb_lower", "avg_gain", "avg_loss"]
+
+
+def _ema(values, span=None, alpha=None, previous=None):
+
+    '''
+    Exponential moving average with ewm(adjust=False), continued from a previous value
+
+    Args:
+        values (pd.Series): new observations
+        span, alpha: smoothing, as in pd.Series.ewm
+        previous (float or None): the average on the day before values starts
+
+    Returns:
+        pd.Series: the average for every value
+    '''
+    if previous is None or np.isnan(previous):
+        return values.ewm(span=span, alpha=alpha, adjust=False).mean()
+    #prepending the old average makes the recursion pick up exactly where it stopped
+    seeded = pd.concat([pd.Series([previous]), values], ignore_index=True)
+    result = seeded.ewm(span=span, alpha=alpha, adjust=False).mean().iloc[1:]
+    result.index = values.index
+    return result
+
+
+def compute_indicators(closes, state=None):
+
+    '''
+    Compute the indicators for the dates after the last stored row
+
+    Args:
+        closes (pd.Series): closes indexed by date, ascending, including at least
+            SMA_WINDOW - 1 closes on or before state["date"] for the rolling windows
+        state (dict or None): last stored row (date, ema_12, ema_26, macd_signal,
+            avg_gain, avg_loss), None to compute the whole series
+
+    Returns:
+        pd.DataFrame: COLUMNS indexed by date, only dates after state["date"]
+    '''
+    new = closes.index > state["date"] if state else np.ones(len(closes), dtype=bool)
+    new_closes = closes[new]
+    if new_closes.empty:
+        return pd.DataFrame(columns=COLUMNS, index=new_closes.index)
+    state = state or {}
+
+    #rolling windows use the lookback closes too
+    rolling = closes.rolling(SMA_WINDOW, min_periods=SMA_WINDOW)
+    sma = rolling.mean()[new]
+    std = rolling.std(ddof=0)[new]
+
+    ema_fast = _ema(new_closes, span=MACD_FAST, previous=state.get("ema_12"))
+    ema_slow = _ema(new_closes, span=MACD_SLOW, previous=state.get("ema_26"))
+    macd = ema_fast - ema_slow
+    signal = _ema(macd, span=MACD_SIGNAL, previous=state.get("macd_signal"))
+
+    #Wilder smoothing is an ema with alpha = 1/period
+    values = closes.to_numpy()
+    first = len(values) - len(new_closes)
+    changes = np.diff(values)[max(first - 1, 0):]
+    if first == 0:
+        changes = np.concatenate(([np.nan], changes))
+    gains = pd.Series(np.maximum(changes, 0), index=new_closes.index)
+    losses = pd.Series(np.maximum(-changes, 0), index=new_closes.index)
+    avg_gain = _ema(gains, alpha=1 / RSI_PERIOD, previous=state.get("avg_gain"))
+    avg_loss = _ema(losses, alpha=1 / RSI_PERIOD, previous=state.get("avg_loss"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    rsi = pd.Series(rsi, index=new_closes.index)
+    if "avg_gain" not in state:
+        #the first RSI_PERIOD changes only warm the averages up
+        rsi.iloc[:RSI_PERIOD] = np.nan
+
+    return pd.DataFrame({
+        "rsi": rsi,
+        "macd": macd,
+        "macd_signal": signal,
+        "sma_20": sma,
+        "ema_12": ema_fast,
+        "ema_26": ema_slow,
+        "bb_upper": sma + BOLLINGER_WIDTH * std,
+        "bb_lower": sma - BOLLINGER_WIDTH * std,
+        "avg_gain": avg_gain,
+        "avg_loss": avg_loss,
+    }, index=new_closes.index)
+
+
+def _load_ticker(cursor, ticker_id):
+
+    '''
+    Read what compute_indicators needs for one ticker
+    -stored rows from the oldest close written since they were computed on
+     (indicator_dirty) are redone, from the row before it or from scratch
+
+    Returns:
+        tuple: (closes, state, dirty) where dirty is the (since, changes) the
+            ticker was marked with, or None
+    '''
+    cursor.execute("SELECT since, changes FROM indicator_dirty WHERE ticker_id = ?", (ticker_id,))
+    dirty = cursor.fetchone()
+    cursor.execute("""SELECT date, ema_12, ema_26, macd_signal, avg_gain, avg_loss FROM technical_indicators
+                   WHERE ticker_id = ? AND date < ? ORDER BY date DESC LIMIT 1""",
+                   (ticker_id, dirty[0] if dirty else "9999-12-31"))
+    last = cursor.fetchone()
+    if last is None:
+        state = None
+        cursor.execute("SELECT date, close_price FROM price_history WHERE ticker_id = ? ORDER BY date", (ticker_id,))
+    else:
+        state = dict(zip(["date", "ema_12", "ema_26", "macd_signal", "avg_gain", "avg_loss"], last))
+        #the rolling windows need the closes just before the new ones
+        cursor.execute("""SELECT date, close_price FROM price_history WHERE ticker_id = ? AND date >=
+                       COALESCE((SELECT date FROM price_history WHERE ticker_id = ? AND date <= ?
+                                 ORDER BY date DESC LIMIT 1 OFFSET ?), '')
+                       ORDER BY date""", (ticker_id, ticker_id, state["date"], SMA_WINDOW - 1))
+    rows = cursor.fetchall()
+    closes = pd.Series([row[1] for row in rows], index=pd.Index([row[0] for row in rows], dtype=object),
+                       dtype="float64")
+    return closes.dropna(), state, dirty
+
+
+def compute_chunk(db_name, ticker_ids):
+
+    '''
+    Compute indicator rows for a chunk of tickers, runs inside a pool process
+    -opens its own read only connection, writes happen in the parent
+
+    Returns:
+        list of tuples: (ticker_id, after, dirty, rows), the stored rows dated after
+            `after` are replaced by rows, ready for executemany
+    '''
+    results = []
+    uri = pathlib.Path(db_name).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, factory=ProfiledConnection if profiler.enabled else sqlite3.Connection)
+    try:
+        cursor = conn.cursor()
+        for ticker_id in ticker_ids:
+            closes, state, dirty = _load_ticker(cursor, ticker_id)
+            frame = compute_indicators(closes, state)
+            if frame.empty and dirty is None:
+                continue
+            #sqlite stores NaN as NULL, so the warm up rows need no cleaning
+            columns = frame[COLUMNS].to_numpy(dtype="float64").T.tolist()
+            rows = list(zip([ticker_id] * len(frame), frame.index.tolist(), *columns))
+            results.append((ticker_id, state["date"] if state else "", dirty, rows))
+    finally:
+        conn.close()
+    return results
+
+
+class IndicatorEngine:
+    def __init__(self, db_connection, db_name):
+
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+            db_name (str): SQLite file, pool processes open it themselves
+        '''
+        self._connect = db_connection
+        self.db_name = db_name
+
+    def _ticker_ids(self, tickers):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            if tickers is None:
+                cursor.execute("SELECT DISTINCT ticker_id FROM price_history")
+                return [row[0] for row in cursor.fetchall()]
+            ids = []
+            for tic in tickers:
+                cursor.execute("SELECT id FROM tickers WHERE ticker_symbol = ?", (tic,))
+                row = cursor.fetchone()
+                if row is not None:
+                    ids.append(row[0])
+            return ids
+
+    def _write(self, results):
+
+        '''Bulk write computed rows, one transaction per chunk'''
+        placeholders = ", ".join("?" * (len(COLUMNS) + 2))
+        written = 0
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for ticker_id, after, dirty, rows in results:
+                cursor.execute("DELETE FROM technical_indicators WHERE ticker_id = ? AND date > ?", (ticker_id, after))
+                cursor.executemany(f"""INSERT INTO technical_indicators
+                                   (ticker_id, date, {", ".join(COLUMNS)}) VALUES ({placeholders})""", rows)
+                written += len(rows)
+                #a close written while the chunk was computed keeps the ticker marked
+                if dirty is not None:
+                    cursor.execute("DELETE FROM indicator_dirty WHERE ticker_id = ? AND changes = ?",
+                                   (ticker_id, dirty[1]))
+        return written
+
+    def update_indicators(self, tickers=None, processes=None, chunk_size=200):
+
+        '''
+        Bring the indicators of the given tickers up to date
+        -small batches run in this process, big ones over a process pool
+
+        Args:
+            tickers (iterable of str or None): ticker symbols, None for every ticker with stored history
+            processes (int or None): pool size, None uses every core
+            chunk_size (int): tickers handed to a pool process at a time
+
+        Returns:
+            int: number of indicator rows written
+        '''
+        ticker_ids = self._ticker_ids(tickers)
+        chunks = [ticker_ids[i:i + chunk_size] for i in range(0, len(ticker_ids), chunk_size)]
+        if len(chunks) <= 1:
+            return sum(self._write(compute_chunk(self.db_name, chunk)) for chunk in chunks)
+
+        #spawn so the workers never inherit Qt or sqlite state from this process
+        written = 0
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes or os.cpu_count(), mp_context=context) as pool:
+            for results in pool.map(compute_chunk, [self.db_name] * len(chunks), chunks):
+                written += self._write(results)
+        return written
+
+    def get_indicators(self, tic, start_date=None, end_date=None):
+
+        '''
+        Read stored indicators for a ticker
+
+        Args:
+            tic (str): ticker symbol
+            start_date (str or None): 'yyyy-MM-dd', first day to include
+            end_date (str or None): 'yyyy-MM-dd', last day to include
+
+        Returns:
+            pd.DataFrame: indicator columns indexed by date (empty if none are stored)
+        '''
+        query = f"""SELECT i.date, {", ".join("i." + column for column in COLUMNS)}
+                FROM technical_indicators i JOIN tickers t ON t.id = i.ticker_id
+                WHERE t.ticker_symbol = ? AND i.date >= ? AND i.date <= ? ORDER BY i.date"""
+        params = (tic, start_date or "0000-01-01", end_date or "9999-12-31")
+        with self._connect() as conn:
+            return pd.read_sql_query(query, conn, params=params, index_col="date", parse_dates=["date"])
+
+
+if __name__ == "__main__":
+    from db.ConnectionPool import ConnectionPool
+    from db.MigrationManager import MigrationManager
+
+    db_name = sys.argv[1] if len(sys.argv) > 1 else "users.db"
+    pool = ConnectionPool(db_name)
+    try:
+        MigrationManager(pool.connection).migrate()
+        print(f"{IndicatorEngine(pool.connection, db_name).update_indicators()} indicator rows written")
+    finally:
+        pool.close()
@@ -0,0 +1,324 @@
+import atexit
+import csv
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+'''
+Opt in profiling for the db layer and the GUI pages
+
+Responsibilities:
+-Record call counts, latency histograms and percentiles per (category, name)
+-Wrap manager/provider methods, the Database delegation, every SQL statement
+ and GUI page construction when profiling is on
+-Write JSON and CSV summaries when the program exits
+
+Enable with the CASHNINJA_PROFILE environment variable or "python Driver.py --profile".
+CASHNINJA_PROFILE=1 writes profile.json/profile.csv, any other value is used as the
+output path prefix. While disabled nothing is wrapped and nothing is recorded.
+'''
+
+#histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+
+#latencies kept per stat for the percentiles
+RESERVOIR_SIZE = 1024
+
+WHITESPACE = re.compile(r"\s+")
+
+
+class _Stat:
+
+    '''Running totals, histogram and a latency sample for one instrumented name'''
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.samples = []
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+        #reservoir sampling keeps an unbiased sample of every call
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(ms)
+        else:
+            slot = random.randrange(self.count)
+            if slot < RESERVOIR_SIZE:
+                self.samples[slot] = ms
+
+    def percentile(self, q):
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 4) if self.count else 0.0,
+            "min_ms": round(self.min, 4) if self.count else 0.0,
+            "max_ms": round(self.max, 4),
+            "p50_ms": round(self.percentile(0.50), 4),
+            "p95_ms": round(self.percentile(0.95), 4),
+            "p99_ms": round(self.percentile(0.99), 4),
+        }
+
+
+class Profiler:
+    def __init__(self):
+
+        '''Starts disabled, call enable() (or set CASHNINJA_PROFILE) to record'''
+        self.enabled = False
+        self.output = "profile"
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._dump_registered = False
+        #full text of the statements run inside record_statements, None outside it
+        self.statements = None
+
+    def enable(self, output="profile"):
+
+        '''
+        Turn recording on and write the summaries at exit
+
+        Args:
+            output (str): path prefix of the .json and .csv summaries
+        '''
+        self.enabled = True
+        self.output = output
+        self._started = time.perf_counter()
+        if not self._dump_registered:
+            atexit.register(self.dump)
+            self._dump_registered = True
+
+    @contextmanager
+    def record_statements(self):
+
+        '''
+        Collect the full text of every SQL statement run inside the with block
+        -profiling is on for the block, so only connections opened inside it are seen
+        -nothing is dumped at exit for it
+
+        Yields:
+            set of str: filled with the statements while the block runs
+        '''
+        statements = set()
+        enabled = self.enabled
+        self.enabled = True
+        self.statements = statements
+        try:
+            yield statements
+        finally:
+            self.statements = None
+            self.enabled = enabled
+
+    def record(self, category, name, seconds):
+        with self._lock:
+            stat = self._stats.get((category, name))
+            if stat is None:
+                stat = self._stats[(category, name)] = _Stat()
+            stat.add(seconds * 1000)
+
+    @contextmanager
+    def timed(self, category, name):
+
+        '''Time the with block, does nothing while disabled'''
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, name, time.perf_counter() - start)
+
+    def wrap(self, category, name, fn, slot=False):
+
+        '''
+        Wrap a callable so every call is timed
+
+        Args:
+            slot (bool): drop extra positional arguments the way PyQt does when
+                a signal carries more arguments than the connected method takes
+
+        Returns:
+            callable: the wrapper (fn itself while disabled)
+        '''
+        #only skip fn if it is already timed under this category
+        if not self.enabled or getattr(fn, "__profiled__", None) == category:
+            return fn
+        positional = _positional_limit(fn) if slot else None
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if positional is not None:
+                args = args[:positional]
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(category, name, time.perf_counter() - start)
+        wrapper.__profiled__ = category
+        return wrapper
+
+    def instrument_object(self, obj, category=None, skip=()):
+
+        '''
+        Replace every method of an instance with a timed wrapper
+        -dunder methods and the names in skip are left alone
+
+        Args:
+            obj: manager, provider or any other instance
+            category (str or None): defaults to the class name
+            skip (iterable of str): method names to leave unwrapped
+        '''
+        if not self.enabled:
+            return
+        category = category or type(obj).__name__
+        for name, method in inspect.getmembers(obj, inspect.ismethod):
+            if name.startswith("__") or name in skip:
+                continue
+            setattr(obj, name, self.wrap(category, name, method))
+
+    def instrument_class(self, cls, category=None):
+
+        '''
+        Time the methods a class defines itself (not inherited Qt methods or event handlers)
+
+        Args:
+            cls (type): e.g. a GUI page
+            category (str or None): defaults to the class name
+        '''
+        if not self.enabled:
+            return
+        category = category or cls.__name__
+        for name, member in list(vars(cls).items()):
+            if name.startswith("__") or name.endswith("Event") or not inspect.isfunction(member):
+                continue
+            setattr(cls, name, self.wrap(category, name, member, slot=True))
+
+    def summary(self):
+
+        '''
+        Returns:
+            list of dict: one entry per instrumented name, most total time first
+        '''
+        with self._lock:
+            rows = []
+            for (category, name), stat in self._stats.items():
+                row = {"category": category, "name": name, **stat.summary()}
+                row["histogram"] = {f"<={bound}ms": count for bound, count in zip(BUCKETS_MS, stat.buckets) if count}
+                rows.append(row)
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def dump(self, output=None):
+
+        '''Write <output>.json and <output>.csv'''
+        output = output or self.output
+        rows = self.summary()
+        if not rows:
+            return
+        folder = os.path.dirname(output)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(f"{output}.json", "w") as file:
+            json.dump({"elapsed_s": round(time.perf_counter() - self._started, 3), "stats": rows}, file, indent=2)
+        with open(f"{output}.csv", "w", newline="") as file:
+            fields = [key for key in rows[0] if key != "histogram"]
+            writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Profile written to {output}.json and {output}.csv")
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self._started = time.perf_counter()
+
+
+def _positional_limit(fn):
+
+    '''Number of positional arguments fn accepts, None if it takes *args'''
+    params = inspect.signature(fn).parameters.values()
+    if any(param.kind == param.VAR_POSITIONAL for param in params):
+        return None
+    return sum(param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD) for param in params)
+
+
+def _statement_name(sql):
+
+    '''Collapse whitespace and shorten a statement so it works as a stat name'''
+    sql = WHITESPACE.sub(" ", sql).strip()
+    return sql if len(sql) <= 160 else sql[:157] + "..."
+
+
+class ProfiledCursor(sqlite3.Cursor):
+
+    '''Cursor that times execute, executemany and executescript per statement'''
+
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        if profiler.statements is not None:
+            profiler.statements.add(sql)
+        try:
+            return super().execute(sql, *args)
+        finally:
+            profiler.record("sql", _statement_name(sql), time.perf_counter() - start)
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        if profiler.statements is not None:
+            profiler.statements.add(sql)
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            profiler.record("sql", _statement_name(sql), time.perf_counter() - start)
+
+    def executescript(self, sql):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql)
+        finally:
+            profiler.record("sql", "executescript", time.perf_counter() - start)
+
+
+class ProfiledConnection(sqlite3.Connection):
+
+    '''Connection factory whose cursors (and execute shortcuts) are all timed'''
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    #the C shortcuts do not go through cursor(), route them through it
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+    def executescript(self, sql):
+        return self.cursor().executescript(sql)
+
+
+#the process wide profiler
+profiler = Profiler()
+
+_env = os.environ.get("CASHNINJA_PROFILE", "")
+if _env and _env != "0":
+    profiler.enable("profile" if _env == "1" else _env)
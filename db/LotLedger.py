@@ -0,0 +1,311 @@
+from collections import deque
+
+'''
+Tax lot ledger with running profit and loss
+
+Responsibilities:
+-Open one lot per buy in tax_lots, keeping the quantity that is still open
+-Close lots on every sell with FIFO, LIFO or specifically chosen lots and record
+ each closed piece (cost, proceeds) in lot_closures
+-Keep running totals per portfolio and ticker in pnl_aggregates (open quantity,
+ open cost, realized pnl) so reports never replay the transactions
+-Rebuild the whole ledger from the transactions table (used by the migration)
+
+record_buy/record_sell take the callers cursor so they run inside the trades transaction.
+'''
+
+LOT_METHODS = ("fifo", "lifo", "specific")
+
+#shares below this are rounding left overs, not an open lot
+EPSILON = 1e-9
+
+#open lots read at a time while closing a sell
+BATCH_SIZE = 16
+
+
+def _add_to_aggregate(cursor, portfolio_id, ticker_id, quantity, cost, realized):
+
+    '''Apply a change to the running totals of one portfolio and ticker'''
+    cursor.execute("""INSERT INTO pnl_aggregates (portfolio_id, ticker_id, open_quantity, open_cost, realized_pnl)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (portfolio_id, ticker_id) DO UPDATE SET
+                   open_quantity = open_quantity + excluded.open_quantity,
+                   open_cost = open_cost + excluded.open_cost,
+                   realized_pnl = realized_pnl + excluded.realized_pnl""",
+                   (portfolio_id, ticker_id, quantity, cost, realized))
+
+
+def _open_lots(cursor, portfolio_id, ticker_id, method, lot_ids):
+
+    '''Yield (id, remaining, price) of the lots a sell closes, in closing order, a batch at a time'''
+    if method == "specific":
+        #a lot chosen twice is still only closed once
+        for lot_id in dict.fromkeys(lot_ids):
+            cursor.execute("""SELECT id, remaining, price FROM tax_lots
+                           WHERE id = ? AND portfolio_id = ? AND ticker_id = ? AND remaining > 0""",
+                           (lot_id, portfolio_id, ticker_id))
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"lot {lot_id} is not an open lot of this position")
+            yield row
+        return
+
+    order = "ASC" if method == "fifo" else "DESC"
+    cursor.execute(f"""SELECT id, remaining, price FROM tax_lots
+                   WHERE portfolio_id = ? AND ticker_id = ? AND remaining > 0
+                   ORDER BY opened_at {order}, id {order}""", (portfolio_id, ticker_id))
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+
+def rebuild_ledger(cursor):
+
+    '''
+    Rebuild tax_lots, lot_closures and pnl_aggregates from the transactions with FIFO
+    -positions whose share count matches the ledger get its open cost as cost basis,
+     which removes the cost of sold shares the old trade code never took out
+
+    Args:
+        cursor (sqlite3.Cursor): cursor inside a transaction (a migration step)
+    '''
+    for table in ("tax_lots", "lot_closures", "pnl_aggregates"):
+        cursor.execute(f"DELETE FROM {table}")
+    cursor.execute("SELECT ticker_symbol, id FROM tickers")
+    ticker_ids = dict(cursor.fetchall())
+    cursor.execute("""SELECT id, portfolio_id, ticker_symbol, action, quantity, price, timestamp
+                   FROM transactions ORDER BY timestamp, id""")
+    transactions = cursor.fetchall()
+
+    #lots are numbered here so closures can point at them before they are inserted
+    lots = []
+    closures = []
+    open_lots = {}
+    totals = {}
+    for transaction_id, portfolio_id, tic, action, shares, price, timestamp in transactions:
+        ticker_id = ticker_ids.get(tic)
+        if ticker_id is None or not shares:
+            continue
+        key = (portfolio_id, ticker_id)
+        queue = open_lots.setdefault(key, deque())
+        total = totals.setdefault(key, [0.0, 0.0, 0.0])
+        if action == "buy":
+            lot = [len(lots) + 1, portfolio_id, ticker_id, transaction_id, timestamp, shares, shares, price]
+            lots.append(lot)
+            queue.append(lot)
+            total[0] += shares
+            total[1] += shares * price
+            continue
+        left = shares
+        while queue and left > EPSILON:
+            lot = queue[0]
+            taken = min(left, lot[6])
+            lot[6] -= taken
+            closures.append((portfolio_id, ticker_id, lot[0], transaction_id, timestamp,
+                             taken, taken * lot[7], taken * price))
+            total[0] -= taken
+            total[1] -= taken * lot[7]
+            total[2] += taken * (price - lot[7])
+            left -= taken
+            if lot[6] <= EPSILON:
+                lot[6] = 0.0
+                queue.popleft()
+        #shares sold without a lot (bad history) are realized at zero cost
+        total[2] += max(left, 0.0) * price
+
+    cursor.executemany("""INSERT INTO tax_lots (id, portfolio_id, ticker_id, transaction_id, opened_at, quantity, remaining, price)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", lots)
+    cursor.executemany("""INSERT INTO lot_closures
+                       (portfolio_id, ticker_id, lot_id, transaction_id, closed_at, quantity, cost, proceeds)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", closures)
+    cursor.executemany("""INSERT INTO pnl_aggregates (portfolio_id, ticker_id, open_quantity, open_cost, realized_pnl)
+                       VALUES (?, ?, ?, ?, ?)""", [(*key, *total) for key, total in totals.items()])
+    cursor.execute("""UPDATE positions SET cost_basis = a.open_cost FROM pnl_aggregates a
+                   WHERE a.portfolio_id = positions.portfolio_id AND a.ticker_id = positions.ticker_id
+                   AND ABS(a.open_quantity - positions.quantity) <= 1e-6""")
+
+
+class LotLedger:
+    def __init__(self, db_connection, get_prices):
+
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+            get_prices (callable): get_prices(symbols, fetch) -> {ticker : price},
+                normally TickerManager.get_ticker_prices
+        '''
+        self._connect = db_connection
+        self._get_prices = get_prices
+
+    def record_buy(self, cursor, portfolio_id, ticker_id, transaction_id, timestamp, shares, price):
+
+        '''
+        Open a lot for a buy
+
+        Args:
+            cursor (sqlite3.Cursor): cursor inside the trades transaction
+            transaction_id (int): the buys transactions row
+            timestamp (str): time of the buy, orders the lots for FIFO/LIFO
+        '''
+        cursor.execute("""INSERT INTO tax_lots (portfolio_id, ticker_id, transaction_id, opened_at, quantity, remaining, price)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                       (portfolio_id, ticker_id, transaction_id, timestamp, shares, shares, price))
+        _add_to_aggregate(cursor, portfolio_id, ticker_id, shares, shares * price, 0.0)
+
+    def record_sell(self, cursor, portfolio_id, ticker_id, transaction_id, timestamp, shares, price, method="fifo", lot_ids=None):
+
+        '''
+        Close lots for a sell, only the lots that are touched are read
+
+        Args:
+            cursor (sqlite3.Cursor): cursor inside the trades transaction
+            transaction_id (int): the sells transactions row
+            timestamp (str): time of the sell
+            method (str): "fifo", "lifo" or "specific"
+            lot_ids (list of int or None): lots to close in order, for "specific"
+
+        Returns:
+            dict: {"cost": cost basis removed, "proceeds": shares * price, "realized": proceeds - cost}
+
+        Raises:
+            ValueError: unknown method, or the chosen lots do not hold enough shares
+        '''
+        if method not in LOT_METHODS:
+            raise ValueError(f"unknown lot method {method}")
+        if method == "specific" and not lot_ids:
+            raise ValueError("specific lot selection needs lot_ids")
+
+        #work out the closures first, then write them once the lot read is done
+        left = shares
+        cost = 0.0
+        closures = []
+        updates = []
+        for lot_id, remaining, lot_price in _open_lots(cursor.connection.cursor(), portfolio_id, ticker_id, method, lot_ids):
+            taken = min(left, remaining)
+            remaining -= taken
+            updates.append((remaining if remaining > EPSILON else 0.0, lot_id))
+            closures.append((portfolio_id, ticker_id, lot_id, transaction_id, timestamp,
+                             taken, taken * lot_price, taken * price))
+            cost += taken * lot_price
+            left -= taken
+            if left <= EPSILON:
+                break
+
+        if left > EPSILON:
+            if method == "specific":
+                raise ValueError(f"the chosen lots are {left} shares short")
+            #shares bought before the ledger existed and missing from the backfill count at zero cost
+            print(f"WARNING: {left} shares sold without an open lot, using a zero cost basis")
+
+        cursor.executemany("UPDATE tax_lots SET remaining = ? WHERE id = ?", updates)
+        cursor.executemany("""INSERT INTO lot_closures
+                           (portfolio_id, ticker_id, lot_id, transaction_id, closed_at, quantity, cost, proceeds)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", closures)
+        proceeds = shares * price
+        _add_to_aggregate(cursor, portfolio_id, ticker_id, -(shares - max(left, 0.0)), -cost, proceeds - cost)
+        return {"cost": cost, "proceeds": proceeds, "realized": proceeds - cost}
+
+    def get_open_lots(self, portfolio_id, tic):
+
+        '''
+        Open lots of a position, oldest first (for choosing specific lots)
+
+        Returns:
+            list of dict: {"lot_id", "opened_at", "quantity", "remaining", "price"}
+        '''
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT l.id, l.opened_at, l.quantity, l.remaining, l.price
+                           FROM tax_lots l JOIN tickers t ON t.id = l.ticker_id
+                           WHERE l.portfolio_id = ? AND t.ticker_symbol = ? AND l.remaining > 0
+                           ORDER BY l.opened_at, l.id""", (portfolio_id, tic))
+            rows = cursor.fetchall()
+        return [dict(zip(("lot_id", "opened_at", "quantity", "remaining", "price"), row)) for row in rows]
+
+    def get_pnl(self, portfolio_id, prices=None, fetch=True):
+
+        '''
+        Realized and unrealized profit and loss per ticker from the running totals
+
+        Args:
+            portfolio_id (int): portfolio to report
+            prices (dict or None): {ticker : price} to value open shares with, looked up when None
+            fetch (bool): passed to get_prices when prices is None
+
+        Returns:
+            dict: {ticker : {"quantity", "cost_basis", "realized_pnl", "market_value", "unrealized_pnl"}},
+                market_value and unrealized_pnl are None when there is no price
+        '''
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT t.ticker_symbol, a.open_quantity, a.open_cost, a.realized_pnl
+                           FROM pnl_aggregates a JOIN tickers t ON t.id = a.ticker_id
+                           WHERE a.portfolio_id = ?""", (portfolio_id,))
+            rows = cursor.fetchall()
+        if prices is None:
+            held = [tic for tic, quantity, _, _ in rows if quantity > EPSILON]
+            prices = self._get_prices(held, fetch) if held else {}
+
+        pnl = {}
+        for tic, quantity, cost, realized in rows:
+            price = prices.get(tic)
+            value = quantity * price if price is not None else None
+            pnl[tic] = {
+                "quantity": quantity,
+                "cost_basis": cost,
+                "realized_pnl": realized,
+                "market_value": value,
+                "unrealized_pnl": value - cost if value is not None else None,
+            }
+        return pnl
+
+    def get_realized_pnl(self, portfolio_id, tic=None):
+
+        '''
+        Returns:
+            float: realized pnl of the portfolio, or of one ticker in it
+        '''
+        query = "SELECT COALESCE(SUM(a.realized_pnl), 0) FROM pnl_aggregates a"
+        params = [portfolio_id]
+        if tic is None:
+            query += " WHERE a.portfolio_id = ?"
+        else:
+            query += " JOIN tickers t ON t.id = a.ticker_id WHERE a.portfolio_id = ? AND t.ticker_symbol = ?"
+            params.append(tic)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchone()[0]
+
+    def get_realized_gains(self, portfolio_id, start_date=None, end_date=None):
+
+        '''
+        Every closed piece of a lot in a date range, for gain reports
+
+        Args:
+            start_date (str or None): 'yyyy-MM-dd', first day to include
+            end_date (str or None): 'yyyy-MM-dd', last day to include
+
+        Returns:
+            list of dict: {"ticker", "lot_id", "opened_at", "closed_at", "quantity", "cost", "proceeds", "gain"}
+        '''
+        query = """SELECT t.ticker_symbol, c.lot_id, l.opened_at, c.closed_at, c.quantity, c.cost, c.proceeds
+                FROM lot_closures c
+                JOIN tax_lots l ON l.id = c.lot_id
+                JOIN tickers t ON t.id = c.ticker_id
+                WHERE c.portfolio_id = ?"""
+        params = [portfolio_id]
+        if start_date:
+            query += " AND c.closed_at >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND c.closed_at < date(?, '+1 day')"
+            params.append(end_date)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query + " ORDER BY c.closed_at, c.id", params)
+            rows = cursor.fetchall()
+        keys = ("ticker", "lot_id", "opened_at", "closed_at", "quantity", "cost", "proceeds")
+        return [{**dict(zip(keys, row)), "gain": row[6] - row[5]} for row in rows]
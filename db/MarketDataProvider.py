@@ -0,0 +1,90 @@
+from abc import ABC, abstractmethod
+import threading
+import pandas as pd
+
+'''
+Market data sources used by the ticker manager
+
+Responsibilities:
+-Define the interface every price source implements (quotes and daily history)
+-Provide the default Yahoo finance implementation
+'''
+class MarketDataProvider(ABC):
+
+    @abstractmethod
+    def quote(self, symbols):
+
+        '''
+        Get the latest price for a batch of tickers
+
+        Args:
+            symbols (list of str): Ticker symbols
+
+        Returns:
+            dict: {ticker : price} for every symbol the source had data for
+        '''
+
+    @abstractmethod
+    def history(self, symbol, start, end=None):
+
+        '''
+        Get daily closing prices and volume for one ticker
+
+        Args:
+            symbol (str): Ticker symbol
+            start (pd.Timestamp): first date to include
+            end (pd.Timestamp or None): last date to include, None for today
+
+        Returns:
+            pd.DataFrame: "Close" and "Volume" columns indexed by date
+        '''
+
+
+class YahooProvider(MarketDataProvider):
+
+    '''Market data from Yahoo finance through yfinance'''
+
+    #yf.download collects results in module level state, so concurrent calls
+    #from different threads can mix up each others tickers
+    _download_lock = threading.Lock()
+
+    def quote(self, symbols):
+        import yfinance as yf
+
+        symbols = list(symbols)
+        if not symbols:
+            return {}
+        try:
+            with self._download_lock:
+                prices = yf.download(symbols, period="1d", group_by="ticker", threads=True, progress=False)
+        except Exception as e:
+            print(f"Download failed: {e}")
+            return {}
+
+        closes = {}
+        for tic in symbols:
+            try:
+                if isinstance(prices.columns, pd.MultiIndex):
+                    close = prices[tic]["Close"].dropna()
+                else:
+                    close = prices["Close"].dropna()
+            except KeyError:
+                continue
+            if not close.empty:
+                closes[tic] = float(close.iloc[-1])
+        return closes
+
+    def history(self, symbol, start, end=None):
+        import yfinance as yf
+
+        #yahoo treats end as exclusive
+        if end is not None:
+            end = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+        price_dat = yf.Ticker(symbol).history(start=start, end=end)
+        if price_dat.empty:
+            return pd.DataFrame(columns=["Close", "Volume"], index=pd.DatetimeIndex([]))
+        price_dat = price_dat[["Close", "Volume"]]
+        if price_dat.index.tz is not None:
+            price_dat.index = price_dat.index.tz_localize(None)
+        price_dat.index = price_dat.index.normalize()
+        return price_dat
@@ -0,0 +1,201 @@
+from db.LotLedger import rebuild_ledger
+
+'''
+Versioned schema migrations
+
+Responsibilities:
+-Track the schema version of a db file in PRAGMA user_version
+-Upgrade existing databases in place by applying every newer migration in order
+-Apply each migration and its version bump in one transaction
+'''
+
+#(version, description, steps), a step is a SQL statement or a callable taking a cursor
+#versions must increase, never edit a migration that already shipped, add a new one
+MIGRATIONS = [
+    (1, "hot path indexes", (
+        #portfolio history is always read by portfolio, newest/oldest first
+        "CREATE INDEX IF NOT EXISTS idx_transactions_portfolio_time ON transactions (portfolio_id, timestamp)",
+        #ticker deletes and the delisting check look up positions by ticker
+        "CREATE INDEX IF NOT EXISTS idx_positions_ticker ON positions (ticker_id)",
+        "CREATE INDEX IF NOT EXISTS idx_technical_indicators_ticker_date ON technical_indicators (ticker_id, date)",
+        #already part of the base schema, repeated so old files get it from here too
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_price_history_ticker_date ON price_history (ticker_id, date)",
+        #the universe is always read in JSON order
+        "CREATE INDEX IF NOT EXISTS idx_ticker_universe_rank ON ticker_universe (rank)",
+    )),
+    (2, "portfolio value snapshots", (
+        """CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+            portfolio_id INTEGER,
+            date DATE,
+            cash REAL,
+            market_value REAL,
+            cost_basis REAL,
+            PRIMARY KEY (portfolio_id, date)
+        ) WITHOUT ROWID""",
+        #where the incremental snapshot run left off for each portfolio
+        """CREATE TABLE IF NOT EXISTS portfolio_snapshot_state (
+            portfolio_id INTEGER PRIMARY KEY,
+            last_date DATE,
+            last_transaction_id INTEGER
+        )""",
+    )),
+    (3, "technical indicator columns", (
+        "ALTER TABLE technical_indicators ADD COLUMN macd_signal REAL",
+        "ALTER TABLE technical_indicators ADD COLUMN sma_20 REAL",
+        "ALTER TABLE technical_indicators ADD COLUMN ema_12 REAL",
+        "ALTER TABLE technical_indicators ADD COLUMN ema_26 REAL",
+        "ALTER TABLE technical_indicators ADD COLUMN bb_upper REAL",
+        "ALTER TABLE technical_indicators ADD COLUMN bb_lower REAL",
+        #Wilder averages, kept so RSI can continue without the full history
+        "ALTER TABLE technical_indicators ADD COLUMN avg_gain REAL",
+        "ALTER TABLE technical_indicators ADD COLUMN avg_loss REAL",
+        #one row per ticker and day so results can be upserted
+        "DROP INDEX IF EXISTS idx_technical_indicators_ticker_date",
+        "CREATE UNIQUE INDEX idx_technical_indicators_ticker_date ON technical_indicators (ticker_id, date)",
+    )),
+    (4, "tax lot ledger", (
+        #one row per buy, remaining is set to exactly 0 once the lot is sold off
+        """CREATE TABLE IF NOT EXISTS tax_lots (
+            id INTEGER PRIMARY KEY,
+            portfolio_id INTEGER,
+            ticker_id INTEGER,
+            transaction_id INTEGER,
+            opened_at TIMESTAMP,
+            quantity REAL,
+            remaining REAL,
+            price REAL
+        )""",
+        #sells only ever read the open lots of one position, in time order
+        """CREATE INDEX IF NOT EXISTS idx_tax_lots_open ON tax_lots (portfolio_id, ticker_id, opened_at, id)
+            WHERE remaining > 0""",
+        #one row per lot a sell (partly) closed
+        """CREATE TABLE IF NOT EXISTS lot_closures (
+            id INTEGER PRIMARY KEY,
+            portfolio_id INTEGER,
+            ticker_id INTEGER,
+            lot_id INTEGER,
+            transaction_id INTEGER,
+            closed_at TIMESTAMP,
+            quantity REAL,
+            cost REAL,
+            proceeds REAL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_lot_closures_portfolio_time ON lot_closures (portfolio_id, closed_at)",
+        #running totals, changed by every fill so reports never replay the history
+        """CREATE TABLE IF NOT EXISTS pnl_aggregates (
+            portfolio_id INTEGER,
+            ticker_id INTEGER,
+            open_quantity REAL,
+            open_cost REAL,
+            realized_pnl REAL,
+            PRIMARY KEY (portfolio_id, ticker_id)
+        ) WITHOUT ROWID""",
+        rebuild_ledger,
+    )),
+    (5, "ledger ticker index", (
+        #the universe sync keeps every ticker the ledger still reports on
+        "CREATE INDEX IF NOT EXISTS idx_pnl_aggregates_ticker ON pnl_aggregates (ticker_id)",
+    )),
+    (6, "snapshot replay state", (
+        #cash and holdings before the last snapshot day, so a run only replays the newer transactions
+        #(NULL until the next run saved them, which then replays everything once)
+        "ALTER TABLE portfolio_snapshot_state ADD COLUMN cash REAL",
+        """CREATE TABLE IF NOT EXISTS portfolio_snapshot_holdings (
+            portfolio_id INTEGER,
+            ticker_symbol TEXT,
+            quantity REAL,
+            cost REAL,
+            price REAL,
+            PRIMARY KEY (portfolio_id, ticker_symbol)
+        ) WITHOUT ROWID""",
+    )),
+    (7, "snapshot lot costs", (
+        #snapshots take their cost basis from the lots opened and closed since the saved state
+        "CREATE INDEX IF NOT EXISTS idx_tax_lots_portfolio_time ON tax_lots (portfolio_id, opened_at)",
+        #the saved holdings carry average costs, replay everything once
+        "UPDATE portfolio_snapshot_state SET cash = NULL",
+    )),
+    (8, "indicator invalidation", (
+        #the oldest close written per ticker that its stored indicators were computed without,
+        #changes counts the writes so the engine only clears what it has seen
+        """CREATE TABLE IF NOT EXISTS indicator_dirty (
+            ticker_id INTEGER PRIMARY KEY,
+            since DATE,
+            changes INTEGER
+        )""",
+        #appending closes after the last indicator row is the normal case and marks nothing
+        """CREATE TRIGGER IF NOT EXISTS price_history_insert_dirty AFTER INSERT ON price_history
+            WHEN NEW.date <= (SELECT MAX(date) FROM technical_indicators WHERE ticker_id = NEW.ticker_id)
+            BEGIN
+                INSERT INTO indicator_dirty (ticker_id, since, changes) VALUES (NEW.ticker_id, NEW.date, 1)
+                ON CONFLICT (ticker_id) DO UPDATE SET since = MIN(since, excluded.since), changes = changes + 1;
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS price_history_update_dirty AFTER UPDATE OF close_price ON price_history
+            WHEN NEW.close_price IS NOT OLD.close_price
+            AND NEW.date <= (SELECT MAX(date) FROM technical_indicators WHERE ticker_id = NEW.ticker_id)
+            BEGIN
+                INSERT INTO indicator_dirty (ticker_id, since, changes) VALUES (NEW.ticker_id, NEW.date, 1)
+                ON CONFLICT (ticker_id) DO UPDATE SET since = MIN(since, excluded.since), changes = changes + 1;
+            END""",
+        #closes changed before the triggers existed went unnoticed, recompute every ticker once
+        """INSERT OR REPLACE INTO indicator_dirty (ticker_id, since, changes)
+            SELECT ticker_id, MIN(date), 1 FROM technical_indicators GROUP BY ticker_id""",
+    )),
+]
+
+
+class MigrationManager:
+    def __init__(self, db_connection, migrations=MIGRATIONS):
+
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+            migrations (list of tuples): (version, description, steps) in version order
+        '''
+        self._connect = db_connection
+        self.migrations = migrations
+
+    @property
+    def latest_version(self):
+        return self.migrations[-1][0] if self.migrations else 0
+
+    def get_version(self):
+
+        '''
+        Returns:
+            int: schema version of the database file
+        '''
+        with self._connect() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+
+        '''
+        Apply all migrations newer than the database files version
+        -the version is re-read under the write lock, so two processes
+         opening the same file never apply a migration twice
+
+        Returns:
+            list of int: versions that were applied
+        '''
+        applied = []
+        if self.get_version() >= self.latest_version:
+            return applied
+
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for version, description, steps in self.migrations:
+                if not conn.in_transaction:
+                    cursor.execute("BEGIN IMMEDIATE")
+                if cursor.execute("PRAGMA user_version").fetchone()[0] >= version:
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                conn.commit()
+                print(f"Applied migration {version}: {description}")
+                applied.append(version)
+        return applied
@@ -1,4 +1,3 @@
-import yfinance as yf
 
 class PortfolioManager:
     '''
@@ -13,21 +12,23 @@ class PortfolioManager:
         
             
     def create_portfolio(self, user_id, portfolio_name):
-        '''create a new portfolio with the given name for the given user'''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO portfolios (user_id, portfolio_name) VALUES (?, ?)", (user_id, portfolio_name))
-        conn.commit()
-        conn.close()
+        '''
+        create a new portfolio with the given name for the given user
+        
+        Returns:
+            int: id of the new portfolio
+        '''
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO portfolios (user_id, portfolio_name) VALUES (?, ?)", (user_id, portfolio_name))
+            return cursor.lastrowid
         
 
     def delete_portfolio(self, user_id, portfolio_name):
         '''delete the portoflio with the given name for the given user'''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM portfolios WHERE user_id=? AND portfolio_name=?", user_id, portfolio_name)
-        conn.commit()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM portfolios WHERE user_id=? AND portfolio_name=?", (user_id, portfolio_name))
         
     def get_position(self, portfolio_id, tic):
         '''
@@ -36,15 +37,14 @@ class PortfolioManager:
         Returns:
             dict: {"shares" : quantitiy, "cost_basis" : cost} or None if not found
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute('''SELECT p.quantity, p.cost_basis
-                       FROM positions p JOIN tickers t ON p.ticker_id = t.id
-                       WHERE p.portfolio_id = ? AND t.ticker_symbol = ?''', (portfolio_id, tic,))
-        position = cursor.fetchone()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''SELECT p.quantity, p.cost_basis
+                           FROM positions p JOIN tickers t ON p.ticker_id = t.id
+                           WHERE p.portfolio_id = ? AND t.ticker_symbol = ?''', (portfolio_id, tic,))
+            position = cursor.fetchone()
         if position:
             position = {"shares" : position[0], "cost_basis" : position[1]}
-        conn.close()
         return position
         
     def get_all_positions(self, portfolio_id):
@@ -55,17 +55,34 @@ class PortfolioManager:
         Returns:
             dict: {ticker : {"quantity" : x, "cost_basis" : y,}...}
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute('''SELECT t.ticker_symbol, p.quantity, p.cost_basis
-                       FROM positions p 
-                       JOIN tickers t ON p.ticker_id = t.id
-                       WHERE p.portfolio_id = ?''', (portfolio_id, ))
-        positions = cursor.fetchall()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''SELECT t.ticker_symbol, p.quantity, p.cost_basis
+                           FROM positions p 
+                           JOIN tickers t ON p.ticker_id = t.id
+                           WHERE p.portfolio_id = ?''', (portfolio_id, ))
+            positions = cursor.fetchall()
         positions_dict = {ticker: {'quantity' : quantity, "cost_basis" : cost_basis} for ticker, quantity, cost_basis in positions}
         return positions_dict
     
+    def get_held_tickers(self, user_id):
+        
+        '''
+        Return every ticker symbol held in any of the given users portfolios
+        
+        Returns:
+            list of str: distinct ticker symbols
+        '''
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''SELECT DISTINCT t.ticker_symbol
+                           FROM portfolios pf
+                           JOIN positions p ON p.portfolio_id = pf.id
+                           JOIN tickers t ON p.ticker_id = t.id
+                           WHERE pf.user_id = ?''', (user_id, ))
+            tickers = cursor.fetchall()
+        return [ticker[0] for ticker in tickers]
+    
     def get_owned_shares(self, portfolio_id, ticker):
         
         '''returns the number of shares owned for a specific ticker
@@ -88,11 +105,10 @@ class PortfolioManager:
             int or None: portfolio ID if found else None
         
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("select id FROM portfolios WHERE portfolio_name=? AND user_id=?", (portfolio_name, user_id))
-        portfolio_id = cursor.fetchone()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("select id FROM portfolios WHERE portfolio_name=? AND user_id=?", (portfolio_name, user_id))
+            portfolio_id = cursor.fetchone()
         return portfolio_id[0] if portfolio_id else None
 
         
\ No newline at end of file
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+'''
+Vectorized portfolio valuation
+
+Responsibilities:
+-Load the positions of one or many portfolios into a single frame with one query
+-Join them against a price vector and compute every valuation column in one pass
+-Provide per portfolio totals, so the positions page, the totals table and
+ the summary charts all render from the same numbers
+'''
+
+#columns of a valuation frame, in display order
+COLUMNS = ["portfolio_id", "ticker", "quantity", "avg_price", "cost_basis",
+           "price", "market_value", "unrealized_pnl", "weight"]
+
+
+class PortfolioValuation:
+    def __init__(self, db_connection, get_prices):
+
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+            get_prices (callable): get_prices(symbols, fetch) -> {ticker : price},
+                normally TickerManager.get_ticker_prices
+        '''
+        self._connect = db_connection
+        self._get_prices = get_prices
+
+    def load_positions(self, portfolio_ids):
+
+        '''
+        Read the positions of the given portfolios
+
+        Args:
+            portfolio_ids (iterable of int): portfolios to load
+
+        Returns:
+            pd.DataFrame: portfolio_id, ticker, quantity, cost_basis (one row per position)
+        '''
+        portfolio_ids = list(dict.fromkeys(portfolio_ids))
+        if not portfolio_ids:
+            return pd.DataFrame({"portfolio_id": pd.Series(dtype="int64"), "ticker": pd.Series(dtype="object"),
+                                 "quantity": pd.Series(dtype="float64"), "cost_basis": pd.Series(dtype="float64")})
+        placeholders = ",".join("?" * len(portfolio_ids))
+        query = f"""SELECT p.portfolio_id, t.ticker_symbol AS ticker, p.quantity, p.cost_basis
+                FROM positions p JOIN tickers t ON p.ticker_id = t.id
+                WHERE p.portfolio_id IN ({placeholders})
+                ORDER BY p.portfolio_id, p.rowid"""
+        with self._connect() as conn:
+            frame = pd.read_sql_query(query, conn, params=portfolio_ids)
+        frame["quantity"] = frame["quantity"].astype("float64")
+        frame["cost_basis"] = frame["cost_basis"].astype("float64")
+        return frame
+
+    def value_portfolios(self, portfolio_ids, prices=None, fetch=True):
+
+        '''
+        Value every position of the given portfolios
+
+        Args:
+            portfolio_ids (iterable of int): portfolios to value
+            prices (dict or None): {ticker : price}, None looks them up with get_prices
+            fetch (bool): passed to get_prices, False skips the network
+
+        Returns:
+            pd.DataFrame: one row per position with the COLUMNS, price and the
+                columns derived from it are NaN for tickers without a price
+        '''
+        frame = self.load_positions(portfolio_ids)
+        if prices is None:
+            prices = self._get_prices(frame["ticker"].unique().tolist(), fetch=fetch) if len(frame) else {}
+        return self.reprice(frame, prices)
+
+    @staticmethod
+    def reprice(frame, prices):
+
+        '''
+        Recompute the price dependent columns with new prices
+        -tickers missing from prices keep the price already in the frame
+
+        Args:
+            frame (pd.DataFrame): positions or an earlier valuation
+            prices (dict or pd.Series): {ticker : price}
+
+        Returns:
+            pd.DataFrame: a new valuation frame
+        '''
+        frame = frame.copy()
+        new_prices = frame["ticker"].map(prices).astype("float64")
+        if "price" in frame:
+            new_prices = new_prices.fillna(frame["price"])
+        quantity = frame["quantity"].to_numpy()
+        cost_basis = frame["cost_basis"].to_numpy()
+        price = new_prices.to_numpy()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frame["avg_price"] = np.where(quantity != 0, cost_basis / quantity, np.nan)
+        frame["price"] = price
+        frame["market_value"] = quantity * price
+        frame["unrealized_pnl"] = frame["market_value"] - cost_basis
+
+        #share of each position in its portfolios market value
+        portfolio_value = frame.groupby("portfolio_id")["market_value"].transform("sum")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frame["weight"] = (frame["market_value"] / portfolio_value).where(portfolio_value != 0)
+        return frame[COLUMNS]
+
+    @staticmethod
+    def totals(frame):
+
+        '''
+        Sum a valuation frame per portfolio
+
+        Args:
+            frame (pd.DataFrame): valuation from value_portfolios or reprice
+
+        Returns:
+            pd.DataFrame: cost_basis, market_value and unrealized_pnl indexed by portfolio_id,
+                a position without a price adds to the cost basis but not the value
+        '''
+        totals = frame.groupby("portfolio_id")[["cost_basis", "market_value"]].sum()
+        totals["unrealized_pnl"] = totals["market_value"] - totals["cost_basis"]
+        return totals
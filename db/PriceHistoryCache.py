@@ -0,0 +1,286 @@
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+'''
+Memory mapped columnar cache of the daily price history
+
+Responsibilities:
+-Write price_history as three column files (dates, close, volume) with every
+ tickers rows next to each other in date order, plus a symbol -> (offset, rows) index
+-Open the columns with np.load(mmap_mode="r"), so opening costs nothing in RSS and
+ only the pages of the tickers that are read get loaded
+-Hand out zero-copy slices of a tickers history as numpy views or a pd.Series
+-Stop serving tickers whose rows changed after the build, rows added since then
+ are found from their ids and writes in this process invalidate the ticker
+-Rebuild in the background once something was invalidated, so a ticker that got
+ new rows is served from the maps again a few seconds later
+-Serve nothing after a bulk price_history import (its upserts keep the row ids,
+ so it leaves a stamp in universe_meta instead) until the rebuild finished
+
+Build with:  python -m db.PriceHistoryCache [users.db]
+'''
+
+#rows read from price_history per batch while building
+BATCH_SIZE = 50_000
+
+COLUMNS = {"dates": "datetime64[ns]", "close": "float64", "volume": "float64"}
+
+INDEX_FILE = "index.json"
+
+#universe_meta key BulkIO bumps whenever it imports price_history
+IMPORT_STAMP = "price_history_imported"
+
+
+class PriceHistoryCache:
+    def __init__(self, db_connection, folder, rebuild_delay=5.0):
+
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+            folder (str): directory holding the column files and the index
+            rebuild_delay (float): seconds to wait after an invalidation before rebuilding,
+                so a burst of history syncs leads to one rebuild
+        '''
+        self._connect = db_connection
+        self.folder = folder
+        self.rebuild_delay = rebuild_delay
+        #(columns, symbols) published together, readers take both in one read
+        self._maps = None
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_wanted = False
+        self._rebuild_thread = None
+        self._stopped = threading.Event()
+
+    def _path(self, name):
+        return os.path.join(self.folder, f"{name}.npy")
+
+    def _open(self):
+
+        '''
+        Map the column files if that has not happened yet
+
+        Returns:
+            tuple or None: (columns, symbols) of the cache, None when there is none
+        '''
+        maps = self._maps
+        if maps is not None:
+            return maps
+        with self._lock:
+            if self._maps is not None:
+                return self._maps
+            index_path = os.path.join(self.folder, INDEX_FILE)
+            if not os.path.exists(index_path):
+                return None
+            with open(index_path) as file:
+                index = json.load(file)
+            columns = {name: np.load(self._path(name), mmap_mode="r") for name in COLUMNS}
+
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                imported = _import_stamp(cursor)
+                #tickers that got rows after the build
+                cursor.execute("""SELECT DISTINCT t.ticker_symbol FROM price_history h
+                               JOIN tickers t ON t.id = h.ticker_id WHERE h.id > ?""", (index["last_id"],))
+                self._stale = {row[0] for row in cursor.fetchall()}
+
+            #an import rewrote rows in place since the build, every ticker may be outdated
+            if index.get("import_stamp") != imported:
+                self._maps = ({}, {})
+                self.schedule_rebuild()
+                return self._maps
+            maps = self._maps = (columns, {symbol: tuple(segment) for symbol, segment in index["symbols"].items()})
+        if self._stale:
+            self.schedule_rebuild()
+        return maps
+
+    def close(self):
+
+        '''Drop the maps (the files can only be replaced on Windows once nothing maps them)'''
+        with self._lock:
+            self._close()
+
+    def _close(self):
+
+        '''close() for callers already holding _lock'''
+        self._maps = None
+        self._stale = set()
+
+    def shutdown(self, timeout=1.0):
+
+        '''
+        Cancel a pending rebuild, give a running one a moment to finish and drop the maps
+
+        Args:
+            timeout (float): seconds to wait for a rebuild in progress
+        '''
+        self._stopped.set()
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout=timeout)
+        self.close()
+
+    def schedule_rebuild(self):
+
+        '''
+        Rebuild the cache on a background thread after rebuild_delay seconds,
+        does nothing if the cache was never built or a rebuild is already queued
+        '''
+        if not os.path.exists(os.path.join(self.folder, INDEX_FILE)):
+            return
+        with self._rebuild_lock:
+            self._rebuild_wanted = True
+            if self._rebuild_thread is None and not self._stopped.is_set():
+                self._rebuild_thread = threading.Thread(target=self._rebuild_in_background,
+                                                        name="history-cache-rebuild", daemon=True)
+                self._rebuild_thread.start()
+
+    def _rebuild_in_background(self):
+
+        '''Runs on _rebuild_thread: rebuild until nothing was invalidated during the last build'''
+        while not self._stopped.wait(self.rebuild_delay):
+            with self._rebuild_lock:
+                if not self._rebuild_wanted:
+                    self._rebuild_thread = None
+                    return
+                self._rebuild_wanted = False
+            try:
+                self.build_history_cache()
+            except Exception as e:
+                #the stale tickers keep being read from price_history
+                print(f"Rebuilding the price history cache failed: {e}")
+        self._rebuild_thread = None
+
+    def build_history_cache(self, batch_size=BATCH_SIZE):
+
+        '''
+        Write the whole price_history table into the cache
+        -columns are filled through np.lib.format.open_memmap a batch at a time,
+         so memory stays bounded by the batch size
+        -written under temporary names and swapped in at the end
+
+        Returns:
+            dict: {"tickers", "rows", "elapsed_s"}
+        '''
+        started = time.perf_counter()
+        os.makedirs(self.folder, exist_ok=True)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM price_history")
+            total, last_id = cursor.fetchone()
+            imported = _import_stamp(cursor)
+            columns = {name: np.lib.format.open_memmap(self._path(f"{name}.tmp"), mode="w+",
+                                                       dtype=dtype, shape=(total,))
+                       for name, dtype in COLUMNS.items()}
+            symbols = {}
+            rows = 0
+            #the unique (ticker_id, date) index hands the rows over already grouped and sorted,
+            #rows stored after the count are left for the next build
+            cursor.execute("""SELECT t.ticker_symbol, h.date, h.close_price, h.volume FROM price_history h
+                           JOIN tickers t ON t.id = h.ticker_id WHERE h.id <= ?
+                           ORDER BY h.ticker_id, h.date""", (last_id,))
+            while batch := cursor.fetchmany(batch_size):
+                tickers, dates, closes, volumes = zip(*batch)
+                end = rows + len(batch)
+                columns["dates"][rows:end] = np.array(dates, dtype="datetime64[ns]")
+                columns["close"][rows:end] = np.array(closes, dtype=float)
+                columns["volume"][rows:end] = np.array(volumes, dtype=float)
+                for offset, symbol in enumerate(tickers, start=rows):
+                    if symbol not in symbols:
+                        symbols[symbol] = [offset, 0]
+                    symbols[symbol][1] += 1
+                rows = end
+
+        #rows of deleted tickers are not joined, so trim the files to what was written
+        for name in COLUMNS:
+            column = columns.pop(name)
+            column.flush()
+            trimmed = np.array(column[:rows]) if rows < total else None
+            del column
+            if trimmed is not None:
+                np.save(self._path(f"{name}.tmp"), trimmed)
+        with open(os.path.join(self.folder, f"{INDEX_FILE}.tmp"), "w") as file:
+            json.dump({"built_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "last_id": last_id,
+                       "import_stamp": imported, "rows": rows, "symbols": symbols}, file)
+        #readers map the old files or the new ones, never a mix
+        with self._lock:
+            self._close()
+            for name in COLUMNS:
+                os.replace(self._path(f"{name}.tmp"), self._path(name))
+            os.replace(os.path.join(self.folder, f"{INDEX_FILE}.tmp"), os.path.join(self.folder, INDEX_FILE))
+        return {"tickers": len(symbols), "rows": rows, "elapsed_s": round(time.perf_counter() - started, 4)}
+
+    def invalidate_history(self, tic):
+
+        '''Stop serving a ticker from the cache until the background rebuild, e.g. after new rows were stored for it'''
+        self._stale.add(tic)
+        self.schedule_rebuild()
+
+    def get_history_columns(self, tic):
+
+        '''
+        Zero-copy views of a tickers cached columns, for analytics
+
+        Returns:
+            tuple or None: (dates, close, volume) read-only numpy arrays in date order,
+                None when the ticker is not cached or changed since the build
+        '''
+        #a rebuild may swap the maps meanwhile, keep reading the ones looked up here
+        maps = self._open()
+        if maps is None:
+            return None
+        columns, symbols = maps
+        if tic in self._stale or tic not in symbols:
+            return None
+        offset, length = symbols[tic]
+        return tuple(columns[name][offset:offset + length] for name in COLUMNS)
+
+    def get_cached_history(self, tic, start_date, end_date=None):
+
+        '''
+        Closing prices of a ticker in a date range, served from the maps
+
+        Args:
+            tic (str): ticker symbol
+            start_date (pd.Timestamp): first date to include
+            end_date (pd.Timestamp): last date to include, None for all
+
+        Returns:
+            pd.Series or None: closes named "Close" indexed by date (same shape as
+                TickerManager.get_ticker_history), None when the ticker is not cached
+        '''
+        columns = self.get_history_columns(tic)
+        if columns is None:
+            return None
+        dates, close, _ = columns
+        start = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date).normalize(), "ns"))
+        end = len(dates)
+        if end_date is not None:
+            end = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date).normalize(), "ns"), side="right")
+        return pd.Series(close[start:end], index=pd.DatetimeIndex(dates[start:end], name="date"),
+                         name="Close", copy=False)
+
+
+def _import_stamp(cursor):
+    cursor.execute("SELECT value FROM universe_meta WHERE key = ?", (IMPORT_STAMP,))
+    row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+if __name__ == "__main__":
+    from db.ConnectionPool import ConnectionPool
+
+    db_name = sys.argv[1] if len(sys.argv) > 1 else "users.db"
+    pool = ConnectionPool(db_name)
+    try:
+        cache = PriceHistoryCache(pool.connection, f"{os.path.splitext(db_name)[0]}_history")
+        report = cache.build_history_cache()
+        print(f"Cached {report['rows']} rows of {report['tickers']} tickers in {report['elapsed_s']}s to {cache.folder}")
+    finally:
+        pool.close()
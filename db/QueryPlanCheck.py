@@ -0,0 +1,285 @@
+import json
+import os
+import sys
+import tempfile
+
+#the repo root, so the check also runs as a script from any directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from db.ConnectionPool import ConnectionPool
+from db.BulkIO import TABLES
+from db.Database import SCHEMA
+from db.Instrumentation import profiler
+from db.MigrationManager import MigrationManager
+
+'''
+Query plan regression check for the statements the app really runs
+
+Responsibilities:
+-Run the benchmark workload (plus the Database calls it does not make) offline on a
+ small synthetic db, recording every statement through the profiled cursors
+-Run EXPLAIN QUERY PLAN on each recorded query against an empty db at the latest schema
+-Fail when a query scans a whole table that should be searched through an index
+
+Run with:  python -m db.QueryPlanCheck  or  python path/to/db/QueryPlanCheck.py
+Only statements the workload runs are checked, when a manager gets a new query make
+sure workload() calls it
+'''
+
+#first entries of company_tickers.json the workload db is seeded with
+UNIVERSE_SIZE = 200
+
+#statements that read whole tables on purpose: (end of the statement, tables or aliases it may scan)
+#matching the end keeps a later WHERE variant of the same query checked
+ALLOWED_SCANS = [
+    #the whole universe: search index, seeding, refreshing every quote, symbol -> id maps
+    ("SELECT ticker_symbol FROM tickers", ("tickers",)),
+    ("SELECT ticker_symbol, id FROM tickers", ("tickers",)),
+    ("SELECT ticker_symbol, current_price FROM tickers", ("tickers",)),
+    ("SELECT ticker_symbol, company_name FROM tickers", ("tickers",)),
+    ("WHERE tickers.ticker_symbol = r.ticker_symbol AND tickers.current_price IS NOT r.price", ("tickers",)),
+    ("SELECT symbol, title FROM ticker_universe ORDER BY rank", ("ticker_universe",)),
+    ("WHERE t.id IS NULL ORDER BY u.rank", ("u",)),
+    ("AND NOT EXISTS (SELECT 1 FROM pnl_aggregates a WHERE a.ticker_id = t.id)", ("t",)),
+    #seed bookkeeping, a few rows per table, EXISTS stops at the first row
+    ("SELECT EXISTS (SELECT 1 FROM tickers), EXISTS (SELECT 1 FROM seed_checkpoints)", ("tickers", "seed_checkpoints")),
+    ("SELECT chunk FROM seed_checkpoints", ("seed_checkpoints",)),
+    ("DELETE FROM seed_checkpoints WHERE universe_sha256 IS NOT ? OR chunk_size != ?", ("seed_checkpoints",)),
+    ("SELECT key, value FROM universe_meta", ("universe_meta",)),
+    #rebuilding the ledger and the history cache replays everything
+    ("FROM transactions ORDER BY timestamp, id", ("transactions",)),
+    ("AND ABS(a.open_quantity - positions.quantity) <= 1e-6", ("positions",)),
+    ("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM price_history", ("price_history",)),
+    ("UPDATE portfolio_snapshot_state SET cash = NULL", ("portfolio_snapshot_state",)),
+    ("SELECT ticker_id, MIN(date), 1 FROM technical_indicators GROUP BY ticker_id", ("technical_indicators",)),
+    ("JOIN tickers t ON t.id = h.ticker_id WHERE h.id <= ? ORDER BY h.ticker_id, h.date", ("h",)),
+    #bulk exports, and the portfolio ids an import checks rows against
+    (TABLES["transactions"]["select"], ("transactions",)),
+    (TABLES["positions"]["select"], ("p",)),
+    (TABLES["price_history"]["select"], ("h",)),
+    (TABLES["technical_indicators"]["select"], ("i",)),
+    ("SELECT id FROM portfolios", ("portfolios",)),
+    #the workloads own lookups (bench.Benchmark, bench.SyntheticData)
+    ("SELECT id FROM users ORDER BY id", ("users",)),
+    ("SELECT id FROM portfolios ORDER BY id", ("portfolios",)),
+    ("SELECT DISTINCT ticker_symbol FROM transactions ORDER BY ticker_symbol", ("transactions",)),
+    ("FROM portfolios p JOIN users u ON u.id = p.user_id ORDER BY p.id", ("p",)),
+]
+
+
+def _normalized(sql):
+    return " ".join(sql.split())
+
+
+def _is_temp_table(sql):
+    return sql.upper().startswith(("CREATE TEMP TABLE", "CREATE TEMPORARY TABLE"))
+
+
+def _is_query(sql):
+
+    '''SELECT and DML statements, schema changes, PRAGMAs and BEGIN/COMMIT have no plan worth checking'''
+    words = sql.split(None, 1)
+    return bool(words) and words[0].upper() in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def allowed_scans(sql):
+
+    '''
+    Returns:
+        tuple of str: tables or aliases sql may scan, from ALLOWED_SCANS
+    '''
+    sql = _normalized(sql)
+    allowed = ()
+    for piece, tables in ALLOWED_SCANS:
+        if sql.endswith(_normalized(piece)):
+            allowed += tables
+    return allowed
+
+
+def workload(folder):
+
+    '''
+    Drive the Database API the way the app does, on a synthetic db in folder
+    -bench.Benchmark's database workload first, then the calls it leaves out
+    -prices come from the offline ReplayProvider, nothing touches the network
+
+    Args:
+        folder (str): empty scratch directory, used as the working directory meanwhile
+    '''
+    from bench.Benchmark import bench_database
+    from bench.SyntheticData import build_database, provider_for
+    from db.Database import Database
+
+    #a short universe keeps the seed fast, the statements are the same
+    with open(os.path.join(ROOT, "company_tickers.json")) as file:
+        universe = json.load(file)
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        with open("company_tickers.json", "w") as file:
+            json.dump({rank: universe[rank] for rank in list(universe)[:UNIVERSE_SIZE]}, file)
+        db_name = os.path.join(folder, "workload.db")
+        build_database(db_name, users=2, portfolios=1, positions=3, transactions=12, days=40)
+        db = Database(db_name, provider=provider_for(40))
+        try:
+            if db.sync_thread is not None:
+                db.sync_thread.join()
+            bench_database(db, ops=4, refreshes=1)
+            _remaining_calls(db, folder)
+        finally:
+            db.close()
+    finally:
+        os.chdir(cwd)
+
+
+def _remaining_calls(db, folder):
+
+    '''The Database calls bench_database does not make, one of each'''
+    username = "bench_user_0"
+    user_id = db.get_user_id(username)
+    portfolio_id = db.get_portfolio_id(db.get_portfolio_names(user_id)[0], user_id)
+    positions = db.get_all_positions(portfolio_id)
+    tic = sorted(positions)[0]
+
+    #users, sessions and portfolios
+    db.contains_user(username)
+    db.get_balance(username)
+    db.open_session(username)
+    db.deposit(username, 100.0)
+    db.withdrawal(username, 50.0)
+    db.create_portfolio(user_id, "plan check")
+    db.delete_portfolio(user_id, "plan check")
+    db.close_session(username)
+    db.create_user("plan_check_user", "plan-check-password")
+    db.delete_user("plan_check_user")
+    db.get_position(portfolio_id, tic)
+    db.get_owned_shares(portfolio_id, tic)
+    db.get_held_tickers(user_id)
+
+    #tickers, quotes and history
+    db.search_tickers(tic[:2])
+    db.get_tic_id(tic)
+    db.get_ticker_price(tic)
+    db.get_ticker_prices(list(positions))
+    db.update_ticker(tic)
+    db.create_ticker("PLANCHK", "Plan Check Corp", 1.0)
+    db.delete_ticker("PLANCHK")
+    db.sync_universe()
+    db.get_ticker_history(tic, "2000-01-01")
+    db.build_history_cache()
+    db.get_ticker_history(tic, "2000-01-01")
+
+    #trades with every lot method, ledger reports and valuation
+    db.buy_stock(username, portfolio_id, tic, 2)
+    db.sell_stock(username, portfolio_id, tic, 1, lot_method="lifo")
+    lot = db.get_open_lots(portfolio_id, tic)[0]["lot_id"]
+    db.sell_stock(username, portfolio_id, tic, 1, lot_method="specific", lot_ids=[lot])
+    db.get_pnl(portfolio_id)
+    db.get_realized_pnl(portfolio_id, tic)
+    db.get_realized_gains(portfolio_id)
+    db.get_realized_gains(portfolio_id, "2000-01-01", "2100-01-01")
+    db.value_portfolios([portfolio_id])
+
+    #transactions, snapshots and indicators
+    page, after = db.get_transactions_page(portfolio_id, limit=2)
+    db.get_transactions_page(portfolio_id, after=after, limit=2, start_date="2000-01-01",
+                             end_date="2100-01-01", tic=tic, action="buy")
+    db.update_snapshots([portfolio_id])
+    db.update_snapshots([portfolio_id])
+    db.backfill_snapshots([portfolio_id])
+    db.get_value_history(portfolio_id, "2000-01-01", "2100-01-01")
+    db.update_indicators([tic])
+    db.update_indicators([tic])
+    db.get_indicators(tic, "2000-01-01", "2100-01-01")
+
+    #bulk export and import of every table
+    exports = os.path.join(folder, "exports")
+    db.export_all(exports)
+    for table in TABLES:
+        db.import_table(table, os.path.join(exports, f"{table}.csv"))
+
+
+def record_queries():
+
+    '''
+    Run the workload and collect what it executed
+
+    Returns:
+        tuple: (temp_tables, queries) distinct CREATE TEMP TABLE statements the queries
+            need and the queries themselves, in a stable order
+    '''
+    with tempfile.TemporaryDirectory() as folder:
+        with profiler.record_statements() as statements:
+            workload(folder)
+    statements = sorted({_normalized(sql) for sql in statements})
+    return [sql for sql in statements if _is_temp_table(sql)], [sql for sql in statements if _is_query(sql)]
+
+
+def full_scans(cursor, sql, allowed=()):
+
+    '''
+    Find the full table scans in a querys plan
+
+    Args:
+        cursor (sqlite3.Cursor): cursor on a db at the latest schema
+        sql (str): the query, parameters are bound to NULL
+        allowed (tuple of str): table names or aliases that may be scanned
+
+    Returns:
+        list of str: plan lines that walk a whole table or index
+    '''
+    params = (None,) * sql.count("?")
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    scans = []
+    for _, _, _, detail in cursor.fetchall():
+        #an automatic index is built from a full scan every time the query runs
+        if "AUTOMATIC" in detail:
+            scans.append(detail)
+        #"SCAN x USING COVERING INDEX" still walks every entry, only SEARCH is a lookup
+        #("SCAN CONSTANT ROW" is a SELECT without a table)
+        elif detail.startswith("SCAN ") and detail != "SCAN CONSTANT ROW" and detail.split()[1] not in allowed:
+            scans.append(detail)
+    return scans
+
+
+def check(queries, temp_tables=()):
+
+    '''
+    Explain every query against a fresh db
+
+    Args:
+        queries (list of str): e.g. from record_queries
+        temp_tables (iterable of str): CREATE TEMP TABLE statements run first
+
+    Returns:
+        dict: {query : list of offending plan lines}, empty when all queries use indexes
+    '''
+    with tempfile.TemporaryDirectory() as folder:
+        pool = ConnectionPool(os.path.join(folder, "plan_check.db"))
+        try:
+            with pool.connection() as conn:
+                conn.executescript(SCHEMA)
+            MigrationManager(pool.connection).migrate()
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                for sql in temp_tables:
+                    cursor.execute(sql)
+                failures = {}
+                for sql in queries:
+                    scans = full_scans(cursor, sql, allowed_scans(sql))
+                    if scans:
+                        failures[sql] = scans
+        finally:
+            pool.close()
+    return failures
+
+
+if __name__ == "__main__":
+    temp_tables, queries = record_queries()
+    failures = check(queries, temp_tables)
+    for sql, scans in failures.items():
+        print(f"FULL SCAN in {sql}\n    {'; '.join(scans)}")
+    print(f"{len(queries) - len(failures)}/{len(queries)} queries use indexes")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+'''
+In memory cache of recent stock quotes
+
+Responsibilities:
+-Serve prices that are younger than a freshness TTL without touching the network or db
+-Bound memory by evicting the least recently used symbols
+-Allow explicit invalidation of one symbol or the whole cache
+'''
+class QuoteCache:
+    def __init__(self, ttl=60.0, max_size=2048, clock=time.monotonic):
+
+        '''
+        Initilize an empty cache
+
+        Args:
+            ttl (float): seconds a cached quote stays fresh
+            max_size (int): maximum number of symbols kept before LRU eviction
+            clock (callable): time source, monotonic seconds
+        '''
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._quotes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+
+        '''
+        Look up a fresh quote
+
+        Args:
+            symbol (str): Ticker symbol
+
+        Returns:
+            float or None: the cached price, None if missing or expired
+        '''
+        with self._lock:
+            entry = self._quotes.get(symbol)
+            if entry is None:
+                return None
+            price, stored_at = entry
+            if self._clock() - stored_at > self.ttl:
+                del self._quotes[symbol]
+                return None
+            self._quotes.move_to_end(symbol)
+            return price
+
+    def get_many(self, symbols):
+
+        '''
+        Look up fresh quotes for several symbols
+
+        Returns:
+            dict: {symbol : price} for the symbols that were fresh
+        '''
+        found = {}
+        for symbol in symbols:
+            price = self.get(symbol)
+            if price is not None:
+                found[symbol] = price
+        return found
+
+    def put(self, symbol, price, age=0.0):
+
+        '''
+        Store a quote, evicting the least recently used one if full
+
+        Args:
+            symbol (str): Ticker symbol
+            price (float): latest price
+            age (float): how many seconds old the quote already is
+        '''
+        if price is None:
+            return
+        with self._lock:
+            self._quotes[symbol] = (price, self._clock() - age)
+            self._quotes.move_to_end(symbol)
+            while len(self._quotes) > self.max_size:
+                self._quotes.popitem(last=False)
+
+    def put_many(self, prices):
+        '''Store several quotes from a {symbol : price} dict'''
+        for symbol, price in prices.items():
+            self.put(symbol, price)
+
+    def invalidate(self, symbol=None):
+
+        '''
+        Drop a cached quote
+
+        Args:
+            symbol (str or None): symbol to drop, or None to clear everything
+        '''
+        with self._lock:
+            if symbol is None:
+                self._quotes.clear()
+            else:
+                self._quotes.pop(symbol, None)
+
+    def __len__(self):
+        return len(self._quotes)
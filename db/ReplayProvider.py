@@ -0,0 +1,134 @@
+import os
+import threading
+import zlib
+import numpy as np
+import pandas as pd
+from db.MarketDataProvider import MarketDataProvider
+
+'''
+Offline market data for benchmarking and development
+
+Responsibilities:
+-Replay recorded daily prices from CSV/Parquet files
+-Generate deterministic seeded random walks for symbols without recorded data
+-Serve quotes without any network access
+'''
+class ReplayProvider(MarketDataProvider):
+    def __init__(self, path=None, seed=0, start_price=100.0, volatility=0.02, start_date="2000-01-03"):
+
+        '''
+        Initilize the provider
+
+        Args:
+            path (str or None): a CSV/Parquet file with symbol, date, close, volume columns
+                                or a directory of <SYMBOL>.csv / <SYMBOL>.parquet files
+                                with date, close, volume columns
+            seed (int): seed for the random walk generator
+            start_price (float): first price of every generated walk
+            volatility (float): daily standard deviation of generated log returns
+            start_date (str): first date of every generated walk
+        '''
+        self.seed = seed
+        self.start_price = start_price
+        self.volatility = volatility
+        self.start_date = pd.Timestamp(start_date)
+        self._history = {}
+        self._cursor = {}
+        self._walks = {}
+        self._dates = None
+        self._lock = threading.RLock()
+        if path is not None:
+            self._load(path)
+
+    def _load(self, path):
+
+        '''Read recorded prices from disk into {symbol : DataFrame}'''
+        if os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                symbol, ext = os.path.splitext(file_name)
+                if ext.lower() not in (".csv", ".parquet"):
+                    continue
+                frame = self._read(os.path.join(path, file_name))
+                self._history[symbol] = self._normalize(frame)
+        else:
+            frame = self._read(path)
+            frame.columns = [col.lower() for col in frame.columns]
+            for symbol, group in frame.groupby("symbol"):
+                self._history[symbol] = self._normalize(group)
+
+    def _read(self, path):
+        if path.lower().endswith(".parquet"):
+            return pd.read_parquet(path)
+        return pd.read_csv(path)
+
+    def _normalize(self, frame):
+
+        '''Turn a raw file frame into "Close"/"Volume" columns indexed by date'''
+        frame = frame.rename(columns=str.lower)
+        index = pd.DatetimeIndex(pd.to_datetime(frame["date"])).normalize()
+        if "volume" in frame:
+            volume = frame["volume"].to_numpy(dtype=np.int64)
+        else:
+            volume = np.zeros(len(frame), dtype=np.int64)
+        history = pd.DataFrame({"Close": frame["close"].to_numpy(dtype=float), "Volume": volume},
+                               index=index)
+        return history.sort_index()
+
+    def _rng(self, symbol):
+
+        '''Random generator seeded by the provider seed and the symbol'''
+        return np.random.default_rng([self.seed, zlib.crc32(symbol.encode("utf-8"))])
+
+    def _generate(self, symbol):
+
+        '''Build a deterministic random walk from start_date up to today'''
+        rng = self._rng(symbol)
+        if self._dates is None:
+            self._dates = pd.bdate_range(self.start_date, pd.Timestamp.now().normalize())
+        dates = self._dates
+        returns = rng.normal(0.0, self.volatility, len(dates))
+        close = self.start_price * np.exp(np.cumsum(returns))
+        volume = rng.integers(100_000, 10_000_000, len(dates))
+        self._walks[symbol] = rng
+        return pd.DataFrame({"Close": close, "Volume": volume}, index=dates)
+
+    def _get_history(self, symbol):
+        with self._lock:
+            history = self._history.get(symbol)
+            if history is None:
+                history = self._generate(symbol)
+                self._history[symbol] = history
+            return history
+
+    def quote(self, symbols):
+
+        '''
+        Replay the next price for each symbol
+        -recorded symbols step through their file rows and wrap around
+        -generated symbols keep walking forward from their last close
+        '''
+        prices = {}
+        with self._lock:
+            for symbol in symbols:
+                history = self._get_history(symbol)
+                if history.empty:
+                    continue
+                if symbol in self._walks:
+                    last = self._cursor.get(symbol, history["Close"].iat[-1])
+                    price = last * np.exp(self._walks[symbol].normal(0.0, self.volatility / 20))
+                    self._cursor[symbol] = price
+                else:
+                    position = self._cursor.get(symbol, -1) + 1
+                    if position >= len(history):
+                        position = 0
+                    self._cursor[symbol] = position
+                    price = history["Close"].iat[position]
+                prices[symbol] = float(price)
+        return prices
+
+    def history(self, symbol, start, end=None):
+        history = self._get_history(symbol)
+        start = pd.Timestamp(start).normalize()
+        if end is None:
+            return history.loc[start:]
+        return history.loc[start:pd.Timestamp(end).normalize()]
@@ -0,0 +1,314 @@
+import pandas as pd
+
+'''
+Materialized end of day portfolio snapshots
+
+Responsibilities:
+-Keep one row per portfolio and business day in portfolio_snapshots
+ (cash, market_value, cost_basis), built from transactions and price_history
+-Only write the days since the last snapshot, unless older transactions
+ showed up, then start again from the oldest new transaction
+-Keep the cash and holdings before the last snapshot day next to it, so a run only
+ replays the transactions from that day on
+-Value holdings with the closes already stored in price_history, never the network
+-Serve the value history of a portfolio with a single primary key range query
+
+Definitions used for a snapshot day:
+-cash: money from sells minus money spent on buys so far (deposits are not recorded)
+-cost_basis: cost of the tax lots still open, so it agrees with positions.cost_basis
+ whatever lot method the sells used
+-market_value: shares held times that days close, forward filled over days without
+ a close, the last trade price stands in before any stored history and the stored
+ quote on the day it was refreshed
+'''
+class SnapshotManager:
+    def __init__(self, db_connection):
+
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+        '''
+        self._connect = db_connection
+
+    def _all_portfolio_ids(self):
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT portfolio_id FROM transactions")
+            return [row[0] for row in cursor.fetchall()]
+
+    def _load_state(self, portfolio_id):
+
+        '''
+        Where the last run left off and the first day that has to be (re)written
+
+        Returns:
+            tuple: (start, opening, last_id) where start is a pd.Timestamp or None if there
+                is nothing new to snapshot, opening is (day, holdings, cash) to replay from
+                or None to replay every transaction, and last_id the newest transaction seen
+        '''
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT last_date, last_transaction_id, cash FROM portfolio_snapshot_state
+                           WHERE portfolio_id = ?""", (portfolio_id,))
+            state = cursor.fetchone()
+            last_date, last_id, cash = state if state else (None, 0, None)
+            cursor.execute("""SELECT MIN(date(timestamp)) FROM transactions
+                           WHERE portfolio_id = ? AND id > ?""", (portfolio_id, last_id))
+            oldest_new = cursor.fetchone()[0]
+            cursor.execute("""SELECT ticker_symbol, quantity, cost, price FROM portfolio_snapshot_holdings
+                           WHERE portfolio_id = ?""", (portfolio_id,))
+            holdings = {tic: (shares, cost, price) for tic, shares, cost, price in cursor.fetchall()}
+
+        if last_date is None:
+            return (None if oldest_new is None else pd.Timestamp(oldest_new)), None, last_id
+        #the last snapshot is always redone, it may have been taken before the close
+        start = pd.Timestamp(last_date)
+        #the saved state is only valid while no new transaction is dated before it
+        if cash is None or (oldest_new is not None and pd.Timestamp(oldest_new) < start):
+            return (start if oldest_new is None else min(start, pd.Timestamp(oldest_new))), None, last_id
+        return start, (start - pd.Timedelta(days=1), holdings, cash), last_id
+
+    def _replay(self, transactions, opening=None):
+
+        '''
+        Walk the transactions in order and record the holdings after each one
+
+        Args:
+            transactions (list of tuples): (day 'yyyy-mm-dd', ticker, action, quantity, price) oldest first
+            opening (tuple or None): (day, {ticker: (quantity, cost, price)}, cash) held before
+                the first transaction, None to start from nothing
+
+        Returns:
+            tuple: (holdings, cash) where holdings is a DataFrame of day, ticker,
+                quantity, price after each transaction and cash is a Series of the
+                cash change per transaction indexed by day
+        '''
+        quantity = {}
+        rows = []
+        cash = []
+        if opening is not None:
+            day, held, opening_cash = opening
+            day = day.strftime("%Y-%m-%d")
+            for tic, (shares, _, price) in held.items():
+                quantity[tic] = shares
+                rows.append((day, tic, shares, price))
+            cash.append((day, opening_cash))
+        for day, tic, action, shares, price in transactions:
+            held = quantity.get(tic, 0.0)
+            if action == "buy":
+                quantity[tic] = held + shares
+                cash.append((day, -shares * price))
+            else:
+                quantity[tic] = held - min(shares, held)
+                cash.append((day, shares * price))
+            rows.append((day, tic, quantity[tic], price))
+
+        holdings = pd.DataFrame(rows, columns=["day", "ticker", "quantity", "price"])
+        holdings["day"] = pd.to_datetime(holdings["day"])
+        cash = pd.DataFrame(cash, columns=["day", "cash"])
+        cash = cash.groupby(pd.to_datetime(cash["day"]))["cash"].sum()
+        return holdings, cash
+
+    def _lot_costs(self, portfolio_id, replay_from, opening=None):
+
+        '''
+        Running cost of the open tax lots per ticker, the lots positions.cost_basis is kept from
+        -a lot adds quantity * price on the day it was opened
+        -a closure takes out the cost its sell removed on the day it was closed
+
+        Args:
+            portfolio_id (int): portfolio to read
+            replay_from (str): 'yyyy-mm-dd', first day of lot changes to read
+            opening (tuple or None): the (day, holdings, cash) the replay starts from,
+                its saved costs are the starting point
+
+        Returns:
+            pd.DataFrame: days x tickers, the open cost at the end of every day with a change
+        '''
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT date(l.opened_at), t.ticker_symbol, l.quantity * l.price FROM tax_lots l
+                           JOIN tickers t ON t.id = l.ticker_id
+                           WHERE l.portfolio_id = ? AND l.opened_at >= ?
+                           UNION ALL
+                           SELECT date(c.closed_at), t.ticker_symbol, -c.cost FROM lot_closures c
+                           JOIN tickers t ON t.id = c.ticker_id
+                           WHERE c.portfolio_id = ? AND c.closed_at >= ?""",
+                           (portfolio_id, replay_from, portfolio_id, replay_from))
+            changes = cursor.fetchall()
+        if opening is not None:
+            day, held, _ = opening
+            changes += [(day.strftime("%Y-%m-%d"), tic, spent) for tic, (_, spent, _) in held.items()]
+        if not changes:
+            return pd.DataFrame(index=pd.DatetimeIndex([]))
+        changes = pd.DataFrame(changes, columns=["day", "ticker", "cost"])
+        changes["day"] = pd.to_datetime(changes["day"])
+        return changes.pivot_table(index="day", columns="ticker", values="cost", aggfunc="sum").fillna(0.0).cumsum()
+
+    def _closes(self, tickers, history_start, days):
+
+        '''
+        Stored closes of the tickers, read straight from price_history so a snapshot
+        run never waits on the provider
+
+        Returns:
+            pd.DataFrame: dates x tickers, only the tickers with stored prices
+        '''
+        first, last = history_start.strftime("%Y-%m-%d"), days[-1].strftime("%Y-%m-%d")
+        closes = {}
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for tic in tickers:
+                cursor.execute("""SELECT h.date, h.close_price FROM price_history h
+                               JOIN tickers t ON t.id = h.ticker_id
+                               WHERE t.ticker_symbol = ? AND h.date >= ? AND h.date <= ?
+                               ORDER BY h.date""", (tic, first, last))
+                history = dict(cursor.fetchall())
+                #the quote the price refresh stored stands in on its own day
+                cursor.execute("""SELECT date(updated_at), current_price FROM tickers
+                               WHERE ticker_symbol = ?""", (tic,))
+                quote = cursor.fetchone()
+                if quote is not None and quote[1] is not None and first <= quote[0] <= last:
+                    history.setdefault(quote[0], quote[1])
+                if history:
+                    closes[tic] = pd.Series(history, dtype=float).sort_index()
+        closes = pd.DataFrame(closes)
+        closes.index = pd.to_datetime(closes.index)
+        return closes
+
+    def _prices(self, holdings, tickers, history_start, days):
+
+        '''
+        Close price of every ticker on every day, forward filled
+
+        Returns:
+            pd.DataFrame: days x tickers
+        '''
+        #trade prices stand in for days before the stored history starts
+        trade_prices = holdings.pivot_table(index="day", columns="ticker", values="price", aggfunc="last")
+        closes = self._closes(tickers, history_start, days)
+        prices = closes.combine_first(trade_prices) if not closes.empty else trade_prices
+        prices = prices.reindex(columns=tickers)
+        return prices.reindex(prices.index.union(days)).sort_index().ffill().reindex(days)
+
+    def update_snapshots(self, portfolio_ids=None, end_date=None):
+
+        '''
+        Bring the snapshots of the given portfolios up to date
+        -holdings are replayed from the state saved before the last snapshot day,
+         or from the first transaction when older transactions showed up
+        -the day values are computed as whole frames and written with executemany
+
+        Args:
+            portfolio_ids (iterable of int or None): portfolios to update, None for all
+            end_date (pd.Timestamp or None): last day to snapshot, None for today
+
+        Returns:
+            int: number of snapshot rows written
+        '''
+        if portfolio_ids is None:
+            portfolio_ids = self._all_portfolio_ids()
+        end = pd.Timestamp(end_date if end_date is not None else pd.Timestamp.now()).normalize()
+        written = 0
+
+        for portfolio_id in portfolio_ids:
+            start, opening, last_id = self._load_state(portfolio_id)
+            if start is None or start > end:
+                continue
+            days = pd.bdate_range(start, end)
+            if days.empty:
+                continue
+
+            query = """SELECT date(timestamp), ticker_symbol, action, quantity, price, id
+                    FROM transactions WHERE portfolio_id = ? AND timestamp >= ?
+                    ORDER BY timestamp, id"""
+            replay_from = "0000-01-01" if opening is None else start.strftime("%Y-%m-%d")
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (portfolio_id, replay_from))
+                rows = cursor.fetchall()
+            if not rows and opening is None:
+                continue
+            last_id = max([last_id] + [row[5] for row in rows])
+            holdings, cash = self._replay([row[:5] for row in rows], opening)
+            lot_costs = self._lot_costs(portfolio_id, replay_from, opening)
+
+            #holdings at the end of every day, carried over days without trades
+            quantity = holdings.groupby(["day", "ticker"])["quantity"].last().unstack()
+            full_index = quantity.index.union(days).union(cash.index).union(lot_costs.index)
+            quantity = quantity.reindex(full_index).ffill().fillna(0.0).reindex(days)
+            cost = lot_costs.reindex(full_index).ffill().fillna(0.0).reindex(days)
+            cash_by_day = cash.cumsum().reindex(full_index).ffill().fillna(0.0).reindex(days)
+
+            #only value tickers that are held at some point in the range
+            tickers = [tic for tic in quantity.columns if (quantity[tic] != 0).any()]
+            #a little history before the range so the first days have a close to carry forward
+            prices = self._prices(holdings, tickers, days[0] - pd.Timedelta(days=10), days)
+            market_value = (quantity[tickers] * prices).sum(axis=1, min_count=0)
+
+            #what is held going into the last day, the next run starts replaying from there
+            before_last = holdings[holdings["day"] < days[-1]].groupby("ticker")[["quantity", "price"]].last()
+            spent = lot_costs[lot_costs.index < days[-1]]
+            spent = spent.iloc[-1] if not spent.empty else pd.Series(dtype=float)
+            held_rows = [(portfolio_id, tic, shares, float(spent.get(tic, 0.0)), price)
+                         for tic, shares, price in before_last.itertuples() if shares > 1e-9]
+            opening_cash = float(cash[cash.index < days[-1]].sum())
+
+            snapshot_rows = list(zip([portfolio_id] * len(days), days.strftime("%Y-%m-%d"),
+                                     cash_by_day.tolist(), market_value.tolist(), cost.sum(axis=1).tolist()))
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM portfolio_snapshots WHERE portfolio_id = ? AND date >= ?",
+                               (portfolio_id, days[0].strftime("%Y-%m-%d")))
+                cursor.executemany("""INSERT INTO portfolio_snapshots (portfolio_id, date, cash, market_value, cost_basis)
+                                   VALUES (?, ?, ?, ?, ?)""", snapshot_rows)
+                cursor.execute("""INSERT OR REPLACE INTO portfolio_snapshot_state
+                               (portfolio_id, last_date, last_transaction_id, cash) VALUES (?, ?, ?, ?)""",
+                               (portfolio_id, days[-1].strftime("%Y-%m-%d"), last_id, opening_cash))
+                cursor.execute("DELETE FROM portfolio_snapshot_holdings WHERE portfolio_id = ?", (portfolio_id,))
+                cursor.executemany("""INSERT INTO portfolio_snapshot_holdings (portfolio_id, ticker_symbol, quantity, cost, price)
+                                   VALUES (?, ?, ?, ?, ?)""", held_rows)
+            written += len(snapshot_rows)
+        return written
+
+    def backfill_snapshots(self, portfolio_ids=None, end_date=None):
+
+        '''
+        Drop and rebuild the snapshots of the given portfolios from their first transaction
+
+        Args:
+            portfolio_ids (iterable of int or None): portfolios to rebuild, None for all
+            end_date (pd.Timestamp or None): last day to snapshot, None for today
+
+        Returns:
+            int: number of snapshot rows written
+        '''
+        if portfolio_ids is None:
+            portfolio_ids = self._all_portfolio_ids()
+        portfolio_ids = list(portfolio_ids)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            ids = [(portfolio_id,) for portfolio_id in portfolio_ids]
+            cursor.executemany("DELETE FROM portfolio_snapshots WHERE portfolio_id = ?", ids)
+            cursor.executemany("DELETE FROM portfolio_snapshot_state WHERE portfolio_id = ?", ids)
+            cursor.executemany("DELETE FROM portfolio_snapshot_holdings WHERE portfolio_id = ?", ids)
+        return self.update_snapshots(portfolio_ids, end_date)
+
+    def get_value_history(self, portfolio_id, start_date=None, end_date=None):
+
+        '''
+        Read a portfolios snapshots
+
+        Args:
+            portfolio_id (int): portfolio to read
+            start_date (str or None): 'yyyy-MM-dd', first day to include
+            end_date (str or None): 'yyyy-MM-dd', last day to include
+
+        Returns:
+            pd.DataFrame: cash, market_value, cost_basis indexed by date
+        '''
+        query = """SELECT date, cash, market_value, cost_basis FROM portfolio_snapshots
+                WHERE portfolio_id = ? AND date >= ? AND date <= ? ORDER BY date"""
+        params = (portfolio_id, start_date or "0000-01-01", end_date or "9999-12-31")
+        with self._connect() as conn:
+            return pd.read_sql_query(query, conn, params=params, index_col="date", parse_dates=["date"])
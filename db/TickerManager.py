@@ -1,25 +1,48 @@
 import sqlite3
-from db.util import get_ticker_dict
-import yfinance as yf
+from db.TickerUniverse import TickerUniverse
+from db.QuoteCache import QuoteCache
+from db.MarketDataProvider import YahooProvider
+from db.TickerSearchIndex import TickerSearchIndex
+from db.AdaptiveBackoff import AdaptiveBackoff
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import pandas as pd
 from itertools import islice
 import time
+import threading
 
 '''
 Manages the ticker data for stocks
 
 Responsibilities:
 -Insert, delete and update ticker symbols in the database
--get live price data using yahoo finance
--store/read all tickers from stored json
+-get live price data from a market data provider (yahoo finance by default)
+-cache recent quotes so repeated reads skip the network
+-store/read all tickers from the compiled ticker universe
 '''
 class TickerManager:
-    def __init__(self, db_connection):
+    def __init__(self, db_connection, provider=None, quote_ttl=60.0, cache_size=2048, history_cache=None,
+                 history_synced=None):
         
         '''
-        Store the database connection function
+        Store the database connection function and set up the quote cache
+        
+        Args:
+            db_connection (callable): borrows a pooled db connection
+            provider (MarketDataProvider): source of quotes and history, defaults to yahoo finance
+            quote_ttl (float): seconds a price is considered fresh
+            cache_size (int): maximum number of quotes kept in memory
+            history_cache (PriceHistoryCache): memory mapped price history served before price_history, optional
+            history_synced (callable): called as history_synced([ticker]) after new closes were stored, optional
         '''
         self._connect = db_connection
+        self.provider = provider if provider is not None else YahooProvider()
+        self.universe = TickerUniverse(db_connection)
+        self.quote_cache = QuoteCache(ttl=quote_ttl, max_size=cache_size)
+        self._history_checked = {}
+        self.history_cache = history_cache
+        self.history_synced = history_synced
+        self._search_index = None
+        self._search_lock = threading.Lock()
         
     def create_ticker(self, symbol, name, price):
         
@@ -34,56 +57,242 @@ class TickerManager:
         Returns:
             bool: True if succesful, False otherwise
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
         try:
-            cursor.execute("INSERT INTO tickers (ticker_symbol, company_name, current_price) VALUES (?, ?, ?)", (symbol, name, price))
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO tickers (ticker_symbol, company_name, current_price) VALUES (?, ?, ?)", (symbol, name, price))
         except sqlite3.IntegrityError:
-            conn.close()
             return False
-        conn.commit()
-        conn.close()
+        self._search_index = None
         return True
         
-    def _add_all_tickers(self, debug_limit=None, chunk_size=300):
+    def _add_all_tickers(self, debug_limit=None, chunk_size=300, max_workers=4, progress=None, retries=5,
+                         max_failed_chunks=3, give_up_after=30.0, cancelled=None):
+        
         '''
-        Bulk add tickers from json that contains all NYSE tickers to seed db
+        Bulk add tickers from the compiled universe to seed the db
+        -chunks are downloaded concurrently by a bounded thread pool that shares
+         an adaptive backoff, so a rate limit slows every worker down together
+        -each chunk is written with executemany in one transaction together with
+         its seed_checkpoints row, an interrupted seed resumes at the first
+         chunk that was not written yet
+        -a chunk that still fails after all retries is skipped, the seed stays
+         incomplete and the next launch tries it again
+        -the whole seed stops when several chunks in a row fail, when requests
+         have failed for give_up_after seconds straight (e.g. no network) or
+         when cancelled() says so, the checkpoints let the next launch resume
         
         Args:
             debug_limit(int) : limit the number of tickers loaded
             chunk_size (int) : number of tickers to process at a time
-        
+            max_workers (int) : number of chunks downloaded at the same time
+            progress (callable or None) : called as progress(done, total) with chunk
+                counts, always from the calling thread and a few times a second
+            retries (int) : attempts per chunk before it is skipped
+            max_failed_chunks (int) : failed chunks in a row that stop the seed
+            give_up_after (float) : seconds of failing requests in a row that stop the seed
+            cancelled (callable or None) : returns True once the user cancelled seeding
+            
+        Returns:
+            dict: {"chunks" : total, "done" : written chunks, "failed" : skipped chunks, "stopped" : bool}
+            
+        Raises:
+            FileNotFoundError: the ticker universe is missing or empty, there is nothing to seed from
         '''
-        ticker_dict = get_ticker_dict()
+        ticker_items = list(self.universe.get_ticker_dict().items())
+        digest = self.universe.digest()
+        if digest is None or not ticker_items:
+            raise FileNotFoundError(f"no ticker universe to seed from, {self.universe.path} is missing or empty")
         if debug_limit is not None:
-            ticker_dict = dict(list(ticker_dict.items())[:debug_limit])
+            ticker_items = ticker_items[:debug_limit]
+        chunks = list(self.chunked(ticker_items, chunk_size))
+        
+        #checkpoints from a different universe or chunk size do not line up, start over
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM seed_checkpoints WHERE universe_sha256 IS NOT ? OR chunk_size != ?",
+                           (digest, chunk_size))
+            cursor.execute("SELECT chunk FROM seed_checkpoints")
+            done = {row[0] for row in cursor.fetchall()}
+        
+        stats = {"chunks": len(chunks), "done": len(done), "failed": 0, "stopped": False}
+        if progress is not None:
+            progress(stats["done"], stats["chunks"])
+        
+        pending = [(i, chunk) for i, chunk in enumerate(chunks) if i not in done]
+        #sleeping on the stop event lets a stopped seed wake every waiting worker at once
+        stop = threading.Event()
+        backoff = AdaptiveBackoff(sleep=stop.wait)
+        failed_in_a_row = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(self._fetch_seed_chunk, [tic for tic, _ in chunk], backoff, retries,
+                                   stop, give_up_after): (i, chunk)
+                       for i, chunk in pending}
+            waiting = set(futures)
+            while waiting:
+                #wake up regularly so a cancel is seen while downloads are still running
+                finished, waiting = wait(waiting, timeout=0.25, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future.cancelled():
+                        continue
+                    i, chunk = futures[future]
+                    prices = future.result()
+                    if prices is None:
+                        stats["failed"] += 1
+                        failed_in_a_row += 1
+                        if failed_in_a_row >= max_failed_chunks:
+                            stop.set()
+                        continue
+                    failed_in_a_row = 0
+                    rows = [(tic, name, prices[tic]) for tic, name in chunk if tic in prices]
+                    with self._connect() as conn:
+                        cursor = conn.cursor()
+                        cursor.executemany("""INSERT INTO tickers (ticker_symbol, company_name, current_price) VALUES (?, ?, ?)
+                                           ON CONFLICT(ticker_symbol) DO UPDATE SET
+                                           current_price = excluded.current_price, updated_at = CURRENT_TIMESTAMP""", rows)
+                        cursor.execute("""INSERT OR REPLACE INTO seed_checkpoints (chunk, universe_sha256, chunk_size, tickers)
+                                       VALUES (?, ?, ?, ?)""", (i, digest, chunk_size, len(rows)))
+                    self.quote_cache.put_many(prices)
+                    stats["done"] += 1
+                if progress is not None:
+                    progress(stats["done"], stats["chunks"])
+                if cancelled is not None and cancelled():
+                    stop.set()
+                
+                #drop the chunks that have not started, the running ones return right away
+                if stop.is_set() and not stats["stopped"]:
+                    stats["stopped"] = True
+                    for future in waiting:
+                        future.cancel()
+        
+        if stats["stopped"]:
+            print(f"Seeding stopped after {stats['done']} of {stats['chunks']} chunks, it resumes on the next launch")
+        
+        #a debug seed is never marked complete so a normal launch fills in the rest,
+        #neither is a seed of nothing
+        if digest is not None and stats["chunks"] and stats["done"] == stats["chunks"] and debug_limit is None:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO universe_meta (key, value) VALUES ('seeded', ?)", (digest,))
+                #a full seed already holds every listing of this version
+                self.universe.mark_synced(digest, conn.cursor())
+        self._search_index = None
+        return stats
+    
+    def _fetch_seed_chunk(self, symbols, backoff, retries, stop, give_up_after):
+        
+        '''
+        Download one seed chunk, backing off while the provider returns nothing
+        -runs on a seeding worker thread, only touches the provider
+        -gives up (and stops the seed) once requests failed for give_up_after seconds in a row
         
+        Returns:
+            dict or None: {ticker : price}, None if every attempt failed or the seed was stopped
+        '''
+        for _ in range(retries):
+            backoff.wait()
+            if stop.is_set():
+                return None
+            if backoff.failing_for() > give_up_after:
+                stop.set()
+                return None
+            prices = self.provider.quote(symbols)
+            if prices:
+                backoff.success()
+                return prices
+            backoff.failure()
+        return None
+    
+    def is_seeded(self):
         
-        ticker_items = list(ticker_dict.items())
-        conn = self._connect()
-        cursor = conn.cursor()
+        '''
+        Check if the initial ticker seed ran to completion
+        -a db seeded before checkpoints existed has tickers but no checkpoints,
+         it is marked as seeded the first time it is seen
         
-        for chunk in self.chunked(ticker_items, chunk_size):
-            tickers = [tic for tic, _ in chunk]
-            try:
-                prices = yf.download(tickers, period="1d", group_by="ticker", threads=True)
+        Returns:
+            bool: True if the tickers table is fully seeded
+        '''
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM universe_meta WHERE key = 'seeded'")
+            if cursor.fetchone() is not None:
+                return True
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM tickers), EXISTS (SELECT 1 FROM seed_checkpoints)")
+            has_tickers, has_checkpoints = cursor.fetchone()
+            if has_tickers and not has_checkpoints:
+                cursor.execute("INSERT INTO universe_meta (key, value) VALUES ('seeded', NULL)")
+                return True
+        return False
+
+    def sync_universe(self, chunk_size=300):
+        
+        '''
+        Apply ticker universe changes to the tickers table
+        -runs while the compiled universe differs from the version last synced,
+         a sync that failed or was interrupted is picked up again next time
+        -new listings are priced in batches and inserted with executemany
+        -delisted tickers are removed unless a portfolio still holds them or the
+         tax lot ledger has lots or realized pnl for them (reports join tickers)
+        
+        Args:
+            chunk_size (int): number of new tickers priced per provider request
             
+        Returns:
+            dict: {"added" : n, "removed" : m, "synced" : bool}
+        '''
+        stats = {"added": 0, "removed": 0, "synced": False}
+        digest = self.universe.needs_sync()
+        if digest is None:
+            return stats
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT u.symbol, u.title FROM ticker_universe u
+                           LEFT JOIN tickers t ON t.ticker_symbol = u.symbol
+                           WHERE t.id IS NULL ORDER BY u.rank""")
+            listings = cursor.fetchall()
+            cursor.execute("""SELECT t.id, t.ticker_symbol FROM tickers t
+                           WHERE NOT EXISTS (SELECT 1 FROM ticker_universe u WHERE u.symbol = t.ticker_symbol)
+                           AND NOT EXISTS (SELECT 1 FROM positions p WHERE p.ticker_id = t.id)
+                           AND NOT EXISTS (SELECT 1 FROM pnl_aggregates a WHERE a.ticker_id = t.id)""")
+            delistings = cursor.fetchall()
+        
+        #price and insert new listings, a chunk the provider could not price keeps the sync pending
+        complete = True
+        for chunk in self.chunked(listings, chunk_size):
+            try:
+                prices = self.provider.quote([tic for tic, _ in chunk])
             except Exception as e:
-                print(f"Download failed for chunk: {e}")
-                return
-
-            for tic, name in chunk:
-                try:
-                    price = prices[tic]["Close"].iloc[-1]
-                    cursor.execute("INSERT INTO tickers (ticker_symbol, company_name, current_price) VALUES (?,?,?)",
-                               (tic, name, price))
-
-                except Exception as e:
-                    print(f"failed to insert {tic}: {e}")
-            time.sleep(0.5) #avoid rate limiting
-        conn.commit()
-        conn.close()
-
+                print(f"Could not price new listings: {e}")
+                prices = None
+            if not prices:
+                complete = False
+                continue
+            rows = [(tic, name, prices[tic]) for tic, name in chunk if tic in prices]
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany("""INSERT OR IGNORE INTO tickers (ticker_symbol, company_name, current_price) 
+                                   VALUES (?, ?, ?)""", rows)
+            stats["added"] += len(rows)
+        
+        #drop delisted tickers and their stored history
+        if delistings:
+            ids = [(tic_id,) for tic_id, _ in delistings]
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany("DELETE FROM price_history WHERE ticker_id = ?", ids)
+                cursor.executemany("DELETE FROM technical_indicators WHERE ticker_id = ?", ids)
+                cursor.executemany("DELETE FROM tickers WHERE id = ?", ids)
+            for _, tic in delistings:
+                self.quote_cache.invalidate(tic)
+            stats["removed"] = len(delistings)
+        
+        if complete:
+            self.universe.mark_synced(digest)
+            stats["synced"] = True
+        if stats["added"] or stats["removed"]:
+            self._search_index = None
+        return stats
     
     def get_tic_id(self, tic_name):
         
@@ -97,12 +306,10 @@ class TickerManager:
             int: Primary key ID of the ticker
         
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM tickers where ticker_symbol=?", (tic_name,))
-        t_id = cursor.fetchone()[0]
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM tickers where ticker_symbol=?", (tic_name,))
+            t_id = cursor.fetchone()[0]
         return t_id
     
     def get_all_tickers(self):
@@ -114,58 +321,79 @@ class TickerManager:
             list of (ticker, price): all ticker data
         
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT ticker_symbol, current_price FROM tickers")
-        all_stocks = cursor.fetchall()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT ticker_symbol, current_price FROM tickers")
+            all_stocks = cursor.fetchall()
         return all_stocks
         
         
     def update_ticker(self, symbol):
         
         '''
-        Refresh the price of a single ticker using Yahoo finance
+        Refresh the price of a single ticker from the market data provider
         
         Args:
             symbol(str): Ticker symbol to updates
+            
+        Returns:
+            float or None: the fetched price, None if the provider had no data
         
         '''
-        stock = yf.Ticker(symbol)
-        price_dat = stock.history('1d')
-        current_price = price_dat["Close"].iloc[0]
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE tickers SET current_price=? WHERE ticker_symbol=?", (current_price, symbol))
-        conn.commit()
-        conn.close()
-        
-    def update_all_tickers(self):
-        '''
-        Refresh prices for all tickers in the database using batched yahoo finance requests
+        current_price = self.provider.quote([symbol]).get(symbol)
+        if current_price is None:
+            return None
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""UPDATE tickers SET current_price=?, updated_at=CURRENT_TIMESTAMP 
+                           WHERE ticker_symbol=?""", (current_price, symbol))
+        self.quote_cache.put(symbol, current_price)
+        return current_price
+        
+    def update_all_tickers(self, chunk_size=300):
         '''
-        ticker_dict = get_ticker_dict()
-        tickers = list(ticker_dict.keys())
+        Refresh prices for all tickers in the database
+        -quotes are requested chunk by chunk and staged into a temp table with executemany
+        -one set based UPDATE then writes only the prices that actually changed
+        -every fetched quote goes into the quote cache, changed or not
         
-        try:
-            prices = yf.download(tickers, period="1d", group_by="ticker", threads=True)
-        except Exception as e:
-            print("Download failed {e}")
-            return
-        
-        conn = self._connect()
-        cursor = conn.cursor()
-        for tic in tickers:
-            try:
-                price = prices[tic]["close"].iloc[-1]
-                cursor.execute("UPDATE tickers SET current_price=? WHERE ticker_symbol = ?", (price, tic))
-            except Exception as e:
-                print("failed to update {tic}: {e}")
-                
-                
-        conn.commit()
-        conn.close()
+        Args:
+            chunk_size (int): number of tickers per provider request
+            
+        Returns:
+            dict: {"fetched" : n, "changed" : n, "failed" : n, "elapsed" : seconds}
+        '''
+        started = time.perf_counter()
+        stats = {"fetched": 0, "changed": 0, "failed": 0, "elapsed": 0.0}
+        
+        #the temp table lives on this connection, so stage and apply in one borrow
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT ticker_symbol FROM tickers")
+            tickers = [row[0] for row in cursor.fetchall()]
+            cursor.execute("""CREATE TEMP TABLE IF NOT EXISTS ticker_refresh (
+                           ticker_symbol TEXT PRIMARY KEY, price REAL) WITHOUT ROWID""")
+            cursor.execute("DELETE FROM ticker_refresh")
+            
+            for chunk in self.chunked(tickers, chunk_size):
+                prices = self.provider.quote(chunk)
+                stats["fetched"] += len(prices)
+                stats["failed"] += len(chunk) - len(prices)
+                cursor.executemany("INSERT OR REPLACE INTO ticker_refresh (ticker_symbol, price) VALUES (?, ?)",
+                                   prices.items())
+                self.quote_cache.put_many(prices)
+            
+            cursor.execute("""UPDATE tickers SET current_price = r.price, updated_at = CURRENT_TIMESTAMP
+                           FROM ticker_refresh r
+                           WHERE tickers.ticker_symbol = r.ticker_symbol
+                           AND tickers.current_price IS NOT r.price""")
+            stats["changed"] = cursor.rowcount
+            cursor.execute("DELETE FROM ticker_refresh")
+        
+        if tickers and not stats["fetched"]:
+            print("Download failed")
+        stats["elapsed"] = time.perf_counter() - started
+        return stats
         
     def delete_ticker(self, tic):
         
@@ -175,45 +403,266 @@ class TickerManager:
         Args:
             tic(str): ticker to be deleted
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM tickers WHERE ticker_symbol=?", (tic,))
-        conn.commit()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM tickers WHERE ticker_symbol=?", (tic,))
+        self.quote_cache.invalidate(tic)
+        self._search_index = None
+    
+    def search_tickers(self, query, limit=None):
+        
+        '''
+        Search tickers by symbol prefix or company name
+        -the index is built from the tickers table on first use and
+         rebuilt after tickers are added or removed
+        
+        Args:
+            query (str): search text, e.g. "msf" or "micro"
+            limit (int or None): maximum number of results
+            
+        Returns:
+            list of str: ranked ticker symbols
+        '''
+        with self._search_lock:
+            if self._search_index is None:
+                with self._connect() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT ticker_symbol, company_name FROM tickers")
+                    self._search_index = TickerSearchIndex(cursor.fetchall())
+            index = self._search_index
+        return index.search(query, limit)
     
-    def get_ticker_history(self, tic:str, start_date:pd.Timestamp):
+    def get_ticker_history(self, tic:str, start_date:pd.Timestamp, end_date:pd.Timestamp=None):
         
         '''
         Retrieve historical closing prices for the requested ticker
+        -reads from the memory mapped history cache when it has the ticker,
+         otherwise from the local price_history table
+        -a cached history that already covers the range up to the last trading day
+         is served without asking the provider
+        -only the dates missing before the first or after the last stored row
+         are fetched from the provider and bulk inserted, a last row from the
+         previous trading day on is fetched again as it may not be final
+        
         Args:
             tic (str): ticker symbol
             start_date (pd.Timestamp): start date for historical data
+            end_date (pd.Timestamp): last date to include, None for today
             
         Returns:
             pd.Series: Historical closing prices
         '''
-        stock = yf.Ticker(tic)
-        price_dat = stock.history(start=start_date)["Close"]
-        return price_dat
+        start = pd.Timestamp(start_date).normalize()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM tickers WHERE ticker_symbol=?", (tic,))
+            row = cursor.fetchone()
+        
+        #unknown tickers cannot be stored, go straight to the provider
+        if row is None:
+            return self.provider.history(tic, start, end_date)["Close"]
+        tic_id = row[0]
+        
+        if self.history_cache is not None:
+            columns = self.history_cache.get_history_columns(tic)
+            if columns is not None and self._cache_is_current(columns[0], start, end_date):
+                return self.history_cache.get_cached_history(tic, start, end_date)
+        
+        self._sync_history(tic, tic_id, start)
+        
+        if self.history_cache is not None:
+            cached = self.history_cache.get_cached_history(tic, start, end_date)
+            if cached is not None:
+                return cached
+        
+        query = "SELECT date, close_price FROM price_history WHERE ticker_id = ? AND date >= ?"
+        params = [tic_id, start.strftime("%Y-%m-%d")]
+        if end_date is not None:
+            query += " AND date <= ?"
+            params.append(pd.Timestamp(end_date).strftime("%Y-%m-%d"))
+        query += " ORDER BY date"
+        with self._connect() as conn:
+            frame = pd.read_sql_query(query, conn, params=params, index_col="date", parse_dates=["date"])
+        return frame["close_price"].rename("Close")
+    
+    def _cache_is_current(self, dates, start, end_date):
+        
+        '''
+        Whether cached dates cover a request without a provider round trip
+        
+        Args:
+            dates (np.ndarray): the tickers cached dates, in order
+            start (pd.Timestamp): first date requested
+            end_date (pd.Timestamp): last date requested, None for today
+        '''
+        if len(dates) == 0 or pd.Timestamp(dates[0]) > start:
+            return False
+        #todays close is not final yet, the previous trading day is the newest complete one
+        newest = pd.Timestamp.now().normalize() - pd.offsets.BDay(1)
+        if end_date is not None:
+            newest = min(newest, pd.Timestamp(end_date).normalize())
+        return pd.Timestamp(dates[-1]) >= newest
+    
+    def _sync_history(self, tic, tic_id, start):
+        
+        '''
+        Fetch and store the price history rows missing for a ticker
+        
+        Args:
+            tic (str): ticker symbol
+            tic_id (int): ticker primary key
+            start (pd.Timestamp): earliest date the caller needs
+        '''
+        #skip the network if this range was synced recently
+        checked = self._history_checked.get(tic)
+        if checked is not None:
+            covered_from, checked_at = checked
+            if start >= covered_from and time.monotonic() - checked_at <= self.quote_cache.ttl:
+                return
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MIN(date), MAX(date) FROM price_history WHERE ticker_id = ?", (tic_id,))
+            first, last = cursor.fetchone()
+        
+        #work out which date ranges are missing
+        gaps = []
+        if first is None:
+            gaps.append((start, None))
+        else:
+            first, last = pd.Timestamp(first), pd.Timestamp(last)
+            if start < first:
+                gaps.append((start, first - pd.Timedelta(days=1)))
+            #a bar from the previous trading day on may have been stored before its close,
+            #fetch it again and let the upsert replace it
+            if last >= pd.Timestamp.now().normalize() - pd.offsets.BDay(1):
+                gaps.append((last, None))
+            else:
+                gaps.append((last + pd.Timedelta(days=1), None))
+        
+        rows = []
+        for gap_start, gap_end in gaps:
+            history = self.provider.history(tic, gap_start, gap_end)
+            for date, close, volume in zip(history.index, history["Close"], history["Volume"]):
+                if pd.isna(close):
+                    continue
+                rows.append((tic_id, date.strftime("%Y-%m-%d"), float(close),
+                             None if pd.isna(volume) else int(volume)))
+        
+        if rows:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany("""INSERT INTO price_history (ticker_id, date, close_price, volume) 
+                                   VALUES (?, ?, ?, ?) 
+                                   ON CONFLICT (ticker_id, date) DO UPDATE SET 
+                                   close_price = excluded.close_price, volume = excluded.volume""", rows)
+            if self.history_cache is not None:
+                self.history_cache.invalidate_history(tic)
+            if self.history_synced is not None:
+                self.history_synced([tic])
+        self._history_checked[tic] = (start, time.monotonic())
         
     def get_ticker_price(self, tic:str):
         
         '''
         Get the most recent price for a single ticker
+        -served from the quote cache or the stored price while still fresh
+        -only goes to Yahoo finance once the quote has expired
+        
         Args:
             tic (str) : Ticker symbol
             
         Returns:
             float: Latest stock price
         '''
-        self.update_ticker(tic)
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("SELECT current_price FROM tickers WHERE ticker_symbol=?", (tic,))
-        price = cursor.fetchone()[0]
-        conn.close()
+        price = self.quote_cache.get(tic)
+        if price is not None:
+            return price
+        
+        #fall back to the stored price if it was refreshed within the ttl
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT current_price, (julianday('now') - julianday(updated_at)) * 86400
+                           FROM tickers WHERE ticker_symbol=?""", (tic,))
+            row = cursor.fetchone()
+        if row and row[0] is not None and row[1] is not None and row[1] <= self.quote_cache.ttl:
+            self.quote_cache.put(tic, row[0], age=max(row[1], 0.0))
+            return row[0]
+        
+        #expired, go to the provider and fall back to the stored price if it has nothing
+        price = self.update_ticker(tic)
+        if price is None and row:
+            price = row[0]
         return price
     
+    def get_ticker_prices(self, symbols, fetch=True):
+        
+        '''
+        Get the most recent price for many tickers at once
+        -fresh quotes come from the cache or the tickers table
+        -every stale symbol is fetched in a single provider batch
+        -fetched prices are written back with one executemany
+        
+        Args:
+            symbols (iterable of str): Ticker symbols
+            fetch (bool): False returns the last stored price of stale symbols
+                          instead of going to the network
+            
+        Returns:
+            dict: {ticker : price} for every symbol with a known price
+        '''
+        symbols = list(dict.fromkeys(symbols))
+        prices = self.quote_cache.get_many(symbols)
+        missing = [tic for tic in symbols if tic not in prices]
+        if not missing:
+            return prices
+        
+        #serve stored prices that were refreshed within the ttl
+        stored = {}
+        stale = []
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for chunk in self.chunked(missing, 500):
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(f"""SELECT ticker_symbol, current_price,
+                               (julianday('now') - julianday(updated_at)) * 86400
+                               FROM tickers WHERE ticker_symbol IN ({placeholders})""", chunk)
+                for tic, price, age in cursor.fetchall():
+                    if price is not None and age is not None and age <= self.quote_cache.ttl:
+                        prices[tic] = price
+                        self.quote_cache.put(tic, price, age=max(age, 0.0))
+                    else:
+                        stored[tic] = price
+                        stale.append(tic)
+        if not stale:
+            return prices
+        
+        #fetch every stale symbol in one round trip
+        fetched = self.provider.quote(stale) if fetch else {}
+        if fetched:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany("""UPDATE tickers SET current_price=?, updated_at=CURRENT_TIMESTAMP 
+                                   WHERE ticker_symbol=?""", [(price, tic) for tic, price in fetched.items()])
+            self.quote_cache.put_many(fetched)
+        
+        #fall back to the last stored price for symbols the provider did not return
+        for tic in stale:
+            price = fetched.get(tic, stored.get(tic))
+            if price is not None:
+                prices[tic] = price
+        return prices
+    
+    def invalidate_quote(self, tic=None):
+        
+        '''
+        Force the next price read to go back to the network
+        
+        Args:
+            tic (str or None): ticker to invalidate, None invalidates every quote
+        '''
+        self.quote_cache.invalidate(tic)
+    
     def chunked(self, iterable, size):
         
         '''
@@ -0,0 +1,118 @@
+import re
+from bisect import bisect_left
+
+'''
+In memory search index over the tickers table
+
+Responsibilities:
+-Find tickers by symbol prefix with a binary search over sorted symbols
+-Find tickers whose symbol contains the query with the same search over the
+ sorted symbol suffixes
+-Find tickers by any word prefix of the company name with an inverted index
+-Rank results so exact and prefix symbol matches come first
+'''
+
+#splits company names into searchable words
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+#upper bound used to turn a prefix into a bisect range
+PREFIX_END = "\uffff"
+
+
+class TickerSearchIndex:
+    def __init__(self, tickers):
+
+        '''
+        Build the index once from ticker rows
+
+        Args:
+            tickers (iterable of tuples): (ticker_symbol, company_name)
+        '''
+        self._symbols = []
+        postings = {}
+        for symbol, name in tickers:
+            self._symbols.append((symbol.lower(), symbol))
+            for position, token in enumerate(TOKEN_PATTERN.findall((name or "").lower())):
+                best = postings.setdefault(token, {})
+                if position < best.get(symbol, position + 1):
+                    best[symbol] = position
+        self._symbols.sort()
+        self._symbol_keys = [key for key, _ in self._symbols]
+        #every suffix but the whole symbol, "contains" is a prefix of one of them
+        self._suffixes = sorted((key[start:], symbol) for key, symbol in self._symbols
+                                for start in range(1, len(key)))
+        self._suffix_keys = [key for key, _ in self._suffixes]
+        self._tokens = sorted(postings)
+        self._postings = postings
+
+    def _prefix_range(self, keys, prefix):
+
+        '''Slice bounds of the sorted keys that start with prefix'''
+        return bisect_left(keys, prefix), bisect_left(keys, prefix + PREFIX_END)
+
+    def _name_matches(self, token):
+
+        '''
+        Every symbol whose company name has a word starting with token
+
+        Returns:
+            dict: {symbol : position of the first matching word}
+        '''
+        matches = {}
+        lo, hi = self._prefix_range(self._tokens, token)
+        for word in self._tokens[lo:hi]:
+            for symbol, position in self._postings[word].items():
+                if position < matches.get(symbol, position + 1):
+                    matches[symbol] = position
+        return matches
+
+    def search(self, query, limit=None):
+
+        '''
+        Find tickers matching a search query
+
+        Ranking (best first):
+            -exact symbol match
+            -symbol prefix match
+            -company name match (every query word prefixes a name word),
+             names that start with the match first
+            -symbol contains the query
+        Ties are broken by symbol length and then alphabetically
+
+        Args:
+            query (str): the search text
+            limit (int or None): maximum number of results
+
+        Returns:
+            list of str: ranked ticker symbols
+        '''
+        query = query.lower().strip()
+        if not query:
+            return []
+        scores = {}
+
+        #symbol prefix matches
+        lo, hi = self._prefix_range(self._symbol_keys, query)
+        for key, symbol in self._symbols[lo:hi]:
+            scores[symbol] = 0 if key == query else 1
+
+        #company name matches, every query word has to match
+        tokens = TOKEN_PATTERN.findall(query)
+        if tokens:
+            name_matches = self._name_matches(tokens[0])
+            for token in tokens[1:]:
+                other = self._name_matches(token)
+                name_matches = {symbol: min(position, other[symbol])
+                                for symbol, position in name_matches.items() if symbol in other}
+            for symbol, position in name_matches.items():
+                if symbol not in scores:
+                    scores[symbol] = 2 if position == 0 else 3
+
+        #symbols containing the query after their first character
+        lo, hi = self._prefix_range(self._suffix_keys, query)
+        for _, symbol in self._suffixes[lo:hi]:
+            if symbol not in scores:
+                scores[symbol] = 4
+
+        ranked = sorted(scores, key=lambda symbol: (scores[symbol], len(symbol), symbol))
+        return ranked if limit is None else ranked[:limit]
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+from db.util import resource_path
+
+'''
+Compiled copy of the company_tickers.json ticker universe
+
+Responsibilities:
+-Compile the JSON once into the ticker_universe table (symbol, cik, title)
+-Skip all parsing while the JSON file is unchanged (checked by mtime/size, then hash)
+-Serve the universe to seeding and the delta sync with a plain query
+-Remember which compiled version the tickers table was last synced to (synced_sha256),
+ so a sync that failed or was interrupted runs again on the next launch
+'''
+class TickerUniverse:
+    def __init__(self, db_connection, path="./company_tickers.json"):
+
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+            path (str): path of the ticker JSON, resolved with resource_path
+        '''
+        self._connect = db_connection
+        self.path = path
+        self._checked = False
+
+    def _read_meta(self, cursor):
+        cursor.execute("SELECT key, value FROM universe_meta")
+        return dict(cursor.fetchall())
+
+    def ensure_compiled(self):
+
+        '''
+        Make sure ticker_universe matches the JSON file on disk
+        -an unchanged mtime and size means no work at all
+        -a changed mtime with an unchanged hash only records the new mtime
+        -otherwise the JSON is parsed and the table rebuilt in one transaction
+
+        Returns:
+            bool: True if the universe was (re)compiled
+        '''
+        if self._checked:
+            return False
+        path = resource_path(self.path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            print("Could not find JSON")
+            return False
+        stamp = f"{stat.st_mtime_ns}:{stat.st_size}"
+
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            meta = self._read_meta(cursor)
+            if meta.get("stamp") == stamp:
+                self._checked = True
+                return False
+
+            with open(path, "rb") as file:
+                raw = file.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            if meta.get("sha256") == digest:
+                cursor.execute("INSERT OR REPLACE INTO universe_meta (key, value) VALUES ('stamp', ?)", (stamp,))
+                self._checked = True
+                return False
+
+            rows = [(entry["ticker"], entry.get("cik_str"), entry.get("title"), int(rank))
+                    for rank, entry in json.loads(raw).items()]
+            cursor.execute("DELETE FROM ticker_universe")
+            cursor.executemany("""INSERT OR IGNORE INTO ticker_universe (symbol, cik, title, rank)
+                               VALUES (?, ?, ?, ?)""", rows)
+            cursor.executemany("INSERT OR REPLACE INTO universe_meta (key, value) VALUES (?, ?)",
+                               [("stamp", stamp), ("sha256", digest), ("previous_sha256", meta.get("sha256"))])
+        self._checked = True
+        return True
+
+    def needs_sync(self):
+
+        '''
+        Whether the tickers table still has to catch up with the compiled universe
+
+        Returns:
+            str or None: sha256 of the compiled universe if it was not synced yet, otherwise None
+        '''
+        self.ensure_compiled()
+        with self._connect() as conn:
+            meta = self._read_meta(conn.cursor())
+        digest = meta.get("sha256")
+        return digest if digest is not None and meta.get("synced_sha256") != digest else None
+
+    def mark_synced(self, digest, cursor=None):
+
+        '''
+        Record that the tickers table matches a compiled universe, only call this
+        once every listing and delisting of that version was applied
+
+        Args:
+            digest (str): sha256 the tickers table was synced to
+            cursor (sqlite3.Cursor or None): write inside the callers transaction
+        '''
+        sql = "INSERT OR REPLACE INTO universe_meta (key, value) VALUES ('synced_sha256', ?)"
+        if cursor is not None:
+            cursor.execute(sql, (digest,))
+            return
+        with self._connect() as conn:
+            conn.execute(sql, (digest,))
+
+    def get_ticker_dict(self):
+
+        '''
+        Get the universe as a dict, in the JSON files order
+
+        Returns:
+            dict: {"tic1" : "name1",...}
+        '''
+        self.ensure_compiled()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT symbol, title FROM ticker_universe ORDER BY rank")
+            return dict(cursor.fetchall())
+
+    def digest(self):
+
+        '''
+        Hash of the compiled universe, identifies which version is loaded
+
+        Returns:
+            str or None: sha256 of the JSON, None if nothing was compiled
+        '''
+        self.ensure_compiled()
+        with self._connect() as conn:
+            meta = self._read_meta(conn.cursor())
+        return meta.get("sha256")
@@ -18,9 +18,6 @@ class TransactionManager:
         '''
         Inserts a new transaction record into the database
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        
         if action not in ["buy", "sell"]:
             print("ERROR: invalid action")
             return False
@@ -29,18 +26,16 @@ class TransactionManager:
                 (portfolio_id, ticker_symbol, action, quantity, price) 
                 VALUES (?, ?, ?, ?, ?)"""
         
-        cursor.execute(query, params)
-        conn.commit()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
         return True
         
     def delete_transaction(self, transaction_id):
         '''Deletes a transaction record from the database'''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("""DELETE FROM transactions WHERE transaction_id = ?""", (transaction_id))
-        conn.commit()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""DELETE FROM transactions WHERE id = ?""", (transaction_id,))
         
     def get_all_transactions(self, portfolio_id):
         
@@ -50,13 +45,63 @@ class TransactionManager:
             list of tuples (action, quantity, ticker_symbol, price, timestamp)
         
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
         query = """SELECT action, quantity, ticker_symbol, price, timestamp
                     FROM transactions WHERE portfolio_id = ?"""
-        cursor.execute(query, (portfolio_id, ))
-        transactions = cursor.fetchall()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (portfolio_id, ))
+            transactions = cursor.fetchall()
 
         transactions = [transaction for transaction in transactions]
         return transactions
+
+    def get_transactions_page(self, portfolio_id, after=None, limit=200, start_date=None, end_date=None,
+                              tic=None, action=None):
+        
+        '''
+        Get one page of a portfolios transactions, oldest first
+        -pages are keyset paginated on (timestamp, id), so every page is an
+         index search no matter how deep into the history it is
+        -all filters are applied in SQL
+        
+        Args:
+            portfolio_id (int): portfolio to read
+            after (tuple or None): cursor returned with the previous page, None for the first page
+            limit (int): maximum number of transactions in the page
+            start_date (str or None): 'yyyy-MM-dd', first day to include
+            end_date (str or None): 'yyyy-MM-dd', last day to include
+            tic (str or None): only this ticker
+            action (str or None): only "buy" or "sell"
+            
+        Returns:
+            tuple: (list of tuples (action, quantity, ticker_symbol, price, timestamp),
+                    cursor for the next page or None if this was the last page)
+        '''
+        query = """SELECT action, quantity, ticker_symbol, price, timestamp, id
+                FROM transactions WHERE portfolio_id = ?"""
+        params = [portfolio_id]
+        if after is not None:
+            query += " AND (timestamp, id) > (?, ?)"
+            params.extend(after)
+        if start_date is not None:
+            query += " AND timestamp >= ?"
+            params.append(start_date)
+        if end_date is not None:
+            query += " AND timestamp < date(?, '+1 day')"
+            params.append(end_date)
+        if tic:
+            query += " AND ticker_symbol = ?"
+            params.append(tic)
+        if action:
+            query += " AND action = ?"
+            params.append(action)
+        query += " ORDER BY timestamp, id LIMIT ?"
+        params.append(limit)
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        
+        next_cursor = (rows[-1][4], rows[-1][5]) if len(rows) == limit else None
+        return [row[:5] for row in rows], next_cursor
@@ -12,28 +12,36 @@ class UserManager:
     -withdrwaling money from account
     '''
 
-    def __init__(self, db_connection):
+    def __init__(self, db_connection, bcrypt_rounds=12):
+        
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+            bcrypt_rounds (int): bcrypt work factor for new password hashes, every
+                extra round doubles the cost of hashing and of checking a login
+        '''
         self._connect = db_connection
+        self.bcrypt_rounds = bcrypt_rounds
         
     def create_user(self, username, password, email=None):
         
         '''
         Create a new user and add it to the database
         -use hashing to securely store passwords
-        '''
-        conn = self._connect()
-        cursor = conn.cursor()
+        -a taken username is caught by the UNIQUE constraint, no lookup first
         
-        encrypted_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        Returns:
+            bool: True if the user was created, False if the username is taken
+        '''
+        encrypted_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.bcrypt_rounds))
         try:
-            cursor.execute("INSERT INTO users (username, password, email) VALUES (?, ?, ?)", (username, encrypted_pw, email))
-            conn.commit()
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO users (username, password, email) VALUES (?, ?, ?)", (username, encrypted_pw, email))
         except sqlite3.IntegrityError:
             print("Error: user already exists")
-            conn.close()
             return False
         
-        conn.close()
         return True
             
     def get_balance(self, username:str):
@@ -45,11 +53,10 @@ class UserManager:
                 balance (float)
         '''
         
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("SELECT balance FROM users WHERE username = ?", (username,))
-        balance = cursor.fetchone()[0]
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT balance FROM users WHERE username = ?", (username,))
+            balance = cursor.fetchone()[0]
         return balance
     
     
@@ -60,11 +67,10 @@ class UserManager:
         returns:
             a list of portfolio names for the user
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("SELECT portfolio_name from portfolios where user_id=?", (user_id,))
-        portfolios = cursor.fetchall()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT portfolio_name from portfolios where user_id=?", (user_id,))
+            portfolios = cursor.fetchall()
         return [portfolio[0] for portfolio in portfolios]
     
     
@@ -74,11 +80,10 @@ class UserManager:
         Authenticate a user for login
         -use hashing to securly check password
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, password FROM users WHERE username = ?", (username,))
-        user = cursor.fetchone()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, password FROM users WHERE username = ?", (username,))
+            user = cursor.fetchone()
         
         if user and bcrypt.checkpw(password.encode('utf-8'), user[1]):
             return True
@@ -92,11 +97,10 @@ class UserManager:
         Returns:
             string or None: the userID if it is in the database
         '''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE username=?", (username,))
-        result = cursor.fetchone()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM users WHERE username=?", (username,))
+            result = cursor.fetchone()
         if result:
             return result[0]
         else:
@@ -105,23 +109,24 @@ class UserManager:
     def delete_user(self, username):
         
         '''remove given usernames user from the database'''
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM users WHERE username=?", (username,))
-        conn.commit()
-        conn.close()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM users WHERE username=?", (username,))
         
            
     def deposit(self, username, amount):
         
-        '''add amount to the balance of the given user'''
-        old_balance = self.get_balance(username)
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET balance = ? WHERE username = ?", (old_balance+amount, username,))
-        conn.commit()
-        conn.close()
-        return True
+        '''
+        add amount to the balance of the given user
+        
+        Returns:
+            float or None: the new balance, None if there is no such user
+        '''
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE users SET balance = balance + ? WHERE username = ? RETURNING balance", (amount, username))
+            row = cursor.fetchone()
+        return None if row is None else row[0]
     
     def withdrawal(self, username, amount):
         
@@ -129,18 +134,15 @@ class UserManager:
         remove amount from given users balance
         
         Returns:
-            True if the user can afford the payment
+            float or None: the new balance, None if the user cannot afford the payment
         
         '''
-        old_balance = self.get_balance(username)
-        if old_balance - amount < 0:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""UPDATE users SET balance = balance - ? 
+                           WHERE username = ? AND balance >= ? RETURNING balance""", (amount, username, amount))
+            row = cursor.fetchone()
+        if row is None:
             print("ERROR: cannot afford it")
-            return False
-        
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET balance = ? WHERE username = ?", (old_balance-amount, username,))
-        conn.commit()
-        conn.close()
-        
-        
\ No newline at end of file
+            return None
+        return row[0]
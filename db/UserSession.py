@@ -0,0 +1,66 @@
+'''
+Per login cache of the logged in users account
+
+Responsibilities:
+-Load the user row, balance and portfolio name -> id map with one joined query
+-Serve the pages from memory instead of querying on every navigation
+-Stay current through write-through updates from the Database writes
+ (deposits, withdrawals, trades, portfolio creation and deletion)
+'''
+class UserSession:
+    def __init__(self, db_connection, username):
+
+        '''
+        Args:
+            db_connection (callable): borrows a pooled db connection
+            username (str): the logged in user
+
+        Raises:
+            KeyError: if there is no such user
+        '''
+        self._connect = db_connection
+        self.username = username
+        self.reload()
+
+    def reload(self):
+
+        '''Read the users account and portfolios again, e.g. after another process wrote to them'''
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT u.id, u.email, u.balance, p.id, p.portfolio_name
+                           FROM users u LEFT JOIN portfolios p ON p.user_id = u.id
+                           WHERE u.username = ? ORDER BY p.id""", (self.username,))
+            rows = cursor.fetchall()
+        if not rows:
+            raise KeyError(f"no user named {self.username}")
+        self.user_id, self.email, self.balance = rows[0][:3]
+        #the join gives one row with NULLs when the user has no portfolios yet
+        self.portfolios = {name: portfolio_id for _, _, _, portfolio_id, name in rows if portfolio_id is not None}
+
+    @property
+    def portfolio_names(self):
+        return list(self.portfolios)
+
+    def get_portfolio_id(self, portfolio_name):
+
+        '''
+        Returns:
+            int or None: id of the users portfolio with that name
+        '''
+        return self.portfolios.get(portfolio_name)
+
+    def set_balance(self, balance):
+
+        '''Write-through: the balance a write just stored'''
+        #RETURNING hands back the value before REAL affinity, so 100 comes back as an int
+        self.balance = float(balance)
+
+    def add_portfolio(self, portfolio_name, portfolio_id):
+
+        '''Write-through: a portfolio was created'''
+        self.portfolios[portfolio_name] = portfolio_id
+
+    def remove_portfolio(self, portfolio_name):
+
+        '''Write-through: a portfolio was deleted'''
+        self.portfolios.pop(portfolio_name, None)
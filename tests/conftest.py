@@ -0,0 +1,37 @@
+import json
+import pytest
+from db.Database import Database
+from db.ReplayProvider import ReplayProvider
+
+'''
+Fixtures shared by the test modules: a whole Database seeded offline
+'''
+
+#the universe the database fixture is seeded from
+SYMBOLS = ["AAA", "BBB", "CCC"]
+
+
+def write_universe(folder, symbols):
+
+    '''Write a company_tickers.json with the given symbols into folder'''
+    universe = {str(rank): {"cik_str": 1000 + rank, "ticker": symbol, "title": f"{symbol} Corp"}
+                for rank, symbol in enumerate(symbols)}
+    with open(folder / "company_tickers.json", "w") as file:
+        json.dump(universe, file)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+
+    '''
+    A Database in tmp_path seeded from SYMBOLS, prices come from the offline
+    ReplayProvider, with one user "trader" holding 10000 cash in portfolio 1
+    '''
+    monkeypatch.chdir(tmp_path)
+    write_universe(tmp_path, SYMBOLS)
+    db = Database(str(tmp_path / "app.db"), provider=ReplayProvider(), bcrypt_rounds=4)
+    db.create_user("trader", "trader-password")
+    db.deposit("trader", 10000.0)
+    db.create_portfolio(db.get_user_id("trader"), "main")
+    yield db
+    db.close()
@@ -0,0 +1,64 @@
+import pytest
+from db.BulkIO import BulkIO
+from db.ConnectionPool import ConnectionPool
+from db.Database import SCHEMA
+from db.LotLedger import LotLedger
+from db.MigrationManager import MigrationManager
+
+'''
+Bulk import: what it counts as written or skipped and keeping the tax lot ledger in step
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "bulk.db"))
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO tickers (id, ticker_symbol, current_price) VALUES (1, 'AAA', 100.0)")
+        conn.execute("INSERT INTO portfolios (id, user_id, portfolio_name) VALUES (1, 1, 'main')")
+    MigrationManager(pool.connection).migrate()
+    yield pool
+    pool.close()
+
+
+def write_csv(path, header, rows):
+    path.write_text("\n".join([header] + rows) + "\n")
+    return str(path)
+
+
+def test_transactions_with_taken_ids_or_foreign_portfolios_are_skipped(pool, tmp_path):
+    with pool.connection() as conn:
+        conn.execute("""INSERT INTO transactions (id, portfolio_id, ticker_symbol, action, quantity, price, timestamp)
+                     VALUES (1, 1, 'AAA', 'buy', 5, 90.0, '2024-01-02 10:00:00')""")
+    path = write_csv(tmp_path / "transactions.csv", "id,portfolio_id,ticker_symbol,action,quantity,price,timestamp", [
+        #id 1 is taken by another trade, portfolio 7 does not exist here
+        "1,1,AAA,buy,10,100.0,2024-01-03 10:00:00",
+        "2,1,AAA,buy,10,110.0,2024-01-04 10:00:00",
+        "3,7,AAA,buy,10,120.0,2024-01-05 10:00:00",
+    ])
+
+    report = BulkIO(pool.connection).import_table("transactions", path)
+    assert (report["rows"], report["skipped"]) == (1, 2)
+    with pool.connection() as conn:
+        assert conn.execute("SELECT id, price FROM transactions ORDER BY id").fetchall() == [(1, 90.0), (2, 110.0)]
+    assert [lot["price"] for lot in LotLedger(pool.connection, None).get_open_lots(1, "AAA")] == [90.0, 110.0]
+
+
+def test_positions_import_rebuilds_the_ledger(pool, tmp_path):
+    with pool.connection() as conn:
+        conn.executemany("""INSERT INTO transactions (portfolio_id, ticker_symbol, action, quantity, price, timestamp)
+                         VALUES (1, 'AAA', ?, ?, ?, ?)""", [("buy", 10, 100.0, "2024-01-02 10:00:00"),
+                                                             ("sell", 4, 120.0, "2024-02-01 10:00:00")])
+    path = write_csv(tmp_path / "positions.csv", "portfolio_id,ticker_symbol,quantity,purchase_date,cost_basis", [
+        "1,AAA,6,2024-01-02 10:00:00,1000.0",
+        "7,AAA,3,2024-01-02 10:00:00,300.0",
+    ])
+
+    report = BulkIO(pool.connection).import_table("positions", path)
+    assert (report["rows"], report["skipped"]) == (1, 1)
+    pnl = LotLedger(pool.connection, None).get_pnl(1, prices={})["AAA"]
+    assert pnl["quantity"] == pytest.approx(6)
+    assert pnl["realized_pnl"] == pytest.approx(80)
+    with pool.connection() as conn:
+        assert conn.execute("SELECT portfolio_id, quantity, cost_basis FROM positions").fetchall() == [(1, 6, 600.0)]
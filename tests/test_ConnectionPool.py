@@ -0,0 +1,73 @@
+import threading
+import pytest
+from db.ConnectionPool import ConnectionPool
+
+'''
+Connection pool: nested borrows share one transaction, the outermost borrow
+commits or rolls back, threads get their own connections
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+    yield pool
+    pool.close()
+
+
+def names(pool):
+    with pool.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT name FROM items ORDER BY name")]
+
+
+def test_nested_borrows_share_the_connection_and_commit_once(pool):
+    with pool.connection() as outer:
+        outer.execute("INSERT INTO items VALUES ('outer')")
+        with pool.connection() as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO items VALUES ('inner')")
+        #leaving the inner borrow does not commit
+        assert outer.in_transaction
+    assert not outer.in_transaction
+    assert names(pool) == ["inner", "outer"]
+
+
+def test_an_error_in_a_nested_borrow_rolls_back_the_outer_work(pool):
+    with pytest.raises(RuntimeError):
+        with pool.connection() as outer:
+            outer.execute("INSERT INTO items VALUES ('outer')")
+            with pool.connection() as inner:
+                inner.execute("INSERT INTO items VALUES ('inner')")
+                raise RuntimeError("failed half way")
+    assert names(pool) == []
+    #the connection went back to the pool in a usable state
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO items VALUES ('after')")
+    assert names(pool) == ["after"]
+
+
+def test_a_transaction_inside_a_borrow_joins_it(pool):
+    with pytest.raises(RuntimeError):
+        with pool.connection() as outer:
+            outer.execute("INSERT INTO items VALUES ('outer')")
+            with pool.transaction() as conn:
+                assert conn is outer
+                conn.execute("INSERT INTO items VALUES ('trade')")
+            raise RuntimeError("failed after the transaction block")
+    assert names(pool) == []
+
+
+def test_threads_borrow_their_own_connections(pool):
+    seen = []
+
+    def borrow():
+        with pool.connection() as conn:
+            seen.append(conn)
+
+    with pool.connection() as mine:
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        thread.join()
+        assert seen[0] is not mine
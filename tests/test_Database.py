@@ -0,0 +1,55 @@
+import sqlite3
+import pytest
+
+'''
+Database: a trade is one transaction, a statement failing half way leaves
+the balance, the position, the transaction log and the tax lots as they were
+'''
+
+
+def state(database):
+    with database.pool.connection() as conn:
+        return {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+                for table in ("positions", "transactions", "tax_lots", "lot_closures", "pnl_aggregates")}
+
+
+def fail_inserts_into(database, table):
+    with database.pool.connection() as conn:
+        conn.execute(f"""CREATE TRIGGER fail_{table} BEFORE INSERT ON {table}
+                     BEGIN SELECT RAISE(ABORT, 'disk full'); END""")
+
+
+def test_a_buy_that_fails_to_log_leaves_nothing_behind(database):
+    assert database.execute_trade("trader", 1, "AAA", "buy", 10, price=100.0)
+    database.open_session("trader")
+    before = state(database)
+
+    fail_inserts_into(database, "transactions")
+    with pytest.raises(sqlite3.IntegrityError):
+        database.execute_trade("trader", 1, "AAA", "buy", 5, price=100.0)
+
+    assert database.get_balance("trader") == pytest.approx(9000.0)
+    assert database.sessions["trader"].balance == pytest.approx(9000.0)
+    assert state(database) == before
+
+
+def test_a_sell_that_fails_to_close_its_lots_leaves_nothing_behind(database):
+    assert database.execute_trade("trader", 1, "AAA", "buy", 10, price=100.0)
+    before = state(database)
+
+    fail_inserts_into(database, "lot_closures")
+    with pytest.raises(sqlite3.IntegrityError):
+        database.execute_trade("trader", 1, "AAA", "sell", 4, price=120.0)
+
+    assert database.get_balance("trader") == pytest.approx(9000.0)
+    assert database.get_position(1, "AAA") == {"shares": 10, "cost_basis": 1000.0}
+    assert state(database) == before
+
+
+def test_a_rejected_trade_changes_nothing(database):
+    before = state(database)
+    #more than the balance, then more shares than are held
+    assert not database.execute_trade("trader", 1, "AAA", "buy", 1000, price=100.0)
+    assert not database.execute_trade("trader", 1, "AAA", "sell", 1, price=100.0)
+    assert database.get_balance("trader") == pytest.approx(10000.0)
+    assert state(database) == before
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from db.ConnectionPool import ConnectionPool
+from db.Database import SCHEMA
+from db.IndicatorEngine import COLUMNS, IndicatorEngine
+from db.MigrationManager import MigrationManager
+
+'''
+Indicator engine: incremental runs match a full recompute, also after a stored
+close was rewritten or older history was added
+'''
+
+DAYS = pd.bdate_range("2024-01-01", periods=80)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "indicators.db"))
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO tickers (id, ticker_symbol, current_price) VALUES (1, 'AAA', 10.0)")
+    MigrationManager(pool.connection).migrate()
+    yield pool
+    pool.close()
+
+
+def store(pool, days, closes):
+    with pool.connection() as conn:
+        conn.executemany("""INSERT INTO price_history (ticker_id, date, close_price, volume) VALUES (1, ?, ?, 0)
+                         ON CONFLICT (ticker_id, date) DO UPDATE SET close_price = excluded.close_price""",
+                         list(zip(days.strftime("%Y-%m-%d"), closes)))
+
+
+def from_scratch(pool, engine):
+    with pool.connection() as conn:
+        conn.execute("DELETE FROM technical_indicators")
+    engine.update_indicators(["AAA"])
+    return engine.get_indicators("AAA")
+
+
+def closes(count, seed=0):
+    return (100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.02, count)))).tolist()
+
+
+def test_appended_closes_continue_from_the_last_row(pool, tmp_path):
+    engine = IndicatorEngine(pool.connection, str(tmp_path / "indicators.db"))
+    prices = closes(len(DAYS))
+    store(pool, DAYS[:60], prices[:60])
+    engine.update_indicators(["AAA"])
+    store(pool, DAYS[60:], prices[60:])
+    assert engine.update_indicators(["AAA"]) == 20
+
+    incremental = engine.get_indicators("AAA")
+    pd.testing.assert_frame_equal(incremental[COLUMNS], from_scratch(pool, engine)[COLUMNS])
+
+
+def test_rewritten_and_older_closes_redo_the_rows_after_them(pool, tmp_path):
+    engine = IndicatorEngine(pool.connection, str(tmp_path / "indicators.db"))
+    prices = closes(len(DAYS))
+    store(pool, DAYS[5:], prices[5:])
+    engine.update_indicators(["AAA"])
+
+    #a close the indicators were computed from changed
+    store(pool, DAYS[40:41], [prices[40] * 1.5])
+    assert engine.update_indicators(["AAA"]) == len(DAYS) - 40
+    pd.testing.assert_frame_equal(engine.get_indicators("AAA")[COLUMNS], from_scratch(pool, engine)[COLUMNS])
+
+    #history from before the first indicator row
+    store(pool, DAYS[:5], prices[:5])
+    assert engine.update_indicators(["AAA"]) == len(DAYS)
+    redone = engine.get_indicators("AAA")
+    assert len(redone) == len(DAYS)
+    pd.testing.assert_frame_equal(redone[COLUMNS], from_scratch(pool, engine)[COLUMNS])
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM indicator_dirty").fetchone()[0] == 0
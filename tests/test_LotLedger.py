@@ -0,0 +1,191 @@
+import pytest
+from db.ConnectionPool import ConnectionPool
+from db.Database import SCHEMA
+from db.LotLedger import LotLedger
+from db.MigrationManager import MIGRATIONS, MigrationManager
+
+'''
+Tax lot ledger: FIFO/LIFO/specific closes, partial lots, the running aggregates
+and the migration backfill with its cost basis correction
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "ledger.db"))
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO tickers (id, ticker_symbol, current_price) VALUES (?, ?, ?)",
+                         [(1, "AAA", 100.0), (2, "BBB", 50.0)])
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def ledger(pool):
+    MigrationManager(pool.connection).migrate()
+    return LotLedger(pool.connection, lambda symbols, fetch: {"AAA": 150.0, "BBB": 40.0})
+
+
+def buy(pool, ledger, shares, price, timestamp, portfolio_id=1, ticker_id=1, tic="AAA"):
+    with pool.transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""INSERT INTO transactions (portfolio_id, ticker_symbol, action, quantity, price, timestamp)
+                       VALUES (?, ?, 'buy', ?, ?, ?) RETURNING id""", (portfolio_id, tic, shares, price, timestamp))
+        ledger.record_buy(cursor, portfolio_id, ticker_id, cursor.fetchone()[0], timestamp, shares, price)
+
+
+def sell(pool, ledger, shares, price, timestamp, method="fifo", lot_ids=None, portfolio_id=1, ticker_id=1, tic="AAA"):
+    with pool.transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""INSERT INTO transactions (portfolio_id, ticker_symbol, action, quantity, price, timestamp)
+                       VALUES (?, ?, 'sell', ?, ?, ?) RETURNING id""", (portfolio_id, tic, shares, price, timestamp))
+        return ledger.record_sell(cursor, portfolio_id, ticker_id, cursor.fetchone()[0], timestamp,
+                                  shares, price, method, lot_ids)
+
+
+def remaining(ledger):
+    return [lot["remaining"] for lot in ledger.get_open_lots(1, "AAA")]
+
+
+def two_lots(pool, ledger):
+    buy(pool, ledger, 10, 100.0, "2024-01-02 10:00:00")
+    buy(pool, ledger, 10, 120.0, "2024-02-01 10:00:00")
+
+
+def test_fifo_closes_oldest_lot_first_and_partially_closes_the_next(pool, ledger):
+    two_lots(pool, ledger)
+    closed = sell(pool, ledger, 15, 130.0, "2024-03-01 10:00:00")
+    assert closed["cost"] == pytest.approx(10 * 100 + 5 * 120)
+    assert closed["realized"] == pytest.approx(15 * 130 - 1600)
+    assert remaining(ledger) == [5.0]
+
+    pnl = ledger.get_pnl(1)["AAA"]
+    assert pnl["quantity"] == pytest.approx(5)
+    assert pnl["cost_basis"] == pytest.approx(600)
+    assert pnl["realized_pnl"] == pytest.approx(350)
+    assert pnl["unrealized_pnl"] == pytest.approx(5 * 150 - 600)
+
+
+def test_lifo_closes_newest_lot_first(pool, ledger):
+    two_lots(pool, ledger)
+    closed = sell(pool, ledger, 15, 130.0, "2024-03-01 10:00:00", method="lifo")
+    assert closed["cost"] == pytest.approx(10 * 120 + 5 * 100)
+    assert remaining(ledger) == [5.0]
+    assert ledger.get_open_lots(1, "AAA")[0]["price"] == 100.0
+
+
+def test_specific_lots_close_only_the_chosen_lot(pool, ledger):
+    two_lots(pool, ledger)
+    newer = ledger.get_open_lots(1, "AAA")[1]["lot_id"]
+    #choosing a lot twice still closes it once
+    closed = sell(pool, ledger, 4, 130.0, "2024-03-01 10:00:00", method="specific", lot_ids=[newer, newer])
+    assert closed["cost"] == pytest.approx(4 * 120)
+    assert remaining(ledger) == [10.0, 6.0]
+
+
+def test_specific_lots_that_do_not_cover_the_sale_write_nothing(pool, ledger):
+    two_lots(pool, ledger)
+    older = ledger.get_open_lots(1, "AAA")[0]["lot_id"]
+    with pytest.raises(ValueError):
+        sell(pool, ledger, 12, 130.0, "2024-03-01 10:00:00", method="specific", lot_ids=[older])
+    with pytest.raises(ValueError):
+        sell(pool, ledger, 1, 130.0, "2024-03-01 10:00:00", method="specific", lot_ids=[999])
+    with pytest.raises(ValueError):
+        sell(pool, ledger, 1, 130.0, "2024-03-01 10:00:00", method="average")
+    assert remaining(ledger) == [10.0, 10.0]
+    assert ledger.get_realized_pnl(1) == 0
+    assert ledger.get_realized_gains(1) == []
+
+
+def test_realized_gains_are_reported_per_closed_piece_in_a_date_range(pool, ledger):
+    two_lots(pool, ledger)
+    sell(pool, ledger, 12, 130.0, "2024-03-01 10:00:00")
+    sell(pool, ledger, 8, 90.0, "2024-04-01 10:00:00")
+
+    gains = ledger.get_realized_gains(1)
+    assert [(gain["quantity"], gain["cost"]) for gain in gains] == [(10, 1000), (2, 240), (8, 960)]
+    assert [gain["gain"] for gain in ledger.get_realized_gains(1, "2024-04-01", "2024-04-01")] == [8 * 90 - 960]
+    assert ledger.get_realized_pnl(1, "AAA") == pytest.approx(12 * 130 - 1240 + 8 * 90 - 960)
+    assert remaining(ledger) == []
+
+
+def test_selling_more_than_the_lots_hold_uses_a_zero_cost_basis(pool, ledger):
+    buy(pool, ledger, 2, 100.0, "2024-01-02 10:00:00")
+    closed = sell(pool, ledger, 3, 110.0, "2024-03-01 10:00:00")
+    assert closed["cost"] == pytest.approx(200)
+    assert closed["realized"] == pytest.approx(330 - 200)
+    assert ledger.get_pnl(1)["AAA"]["quantity"] == pytest.approx(0)
+
+
+def test_migration_backfills_the_ledger_fifo_and_fixes_cost_basis(pool):
+    #a db from before the ledger, its positions never had sold cost taken out
+    MigrationManager(pool.connection, MIGRATIONS[:3]).migrate()
+    with pool.connection() as conn:
+        conn.executemany("""INSERT INTO transactions (portfolio_id, ticker_symbol, action, quantity, price, timestamp)
+                         VALUES (?, ?, ?, ?, ?, ?)""", [
+            (1, "AAA", "buy", 10, 100.0, "2024-01-02 10:00:00"),
+            (1, "AAA", "buy", 10, 120.0, "2024-02-01 10:00:00"),
+            (1, "AAA", "sell", 15, 130.0, "2024-03-01 10:00:00"),
+            (1, "BBB", "buy", 4, 50.0, "2024-01-02 10:00:00"),
+            #a symbol that is not in tickers is skipped
+            (1, "ZZZ", "buy", 1, 10.0, "2024-01-02 10:00:00"),
+        ])
+        conn.executemany("INSERT INTO positions (portfolio_id, ticker_id, quantity, cost_basis) VALUES (?, ?, ?, ?)",
+                         [(1, 1, 5, 2200.0), (1, 2, 3, 200.0)])
+
+    MigrationManager(pool.connection).migrate()
+    ledger = LotLedger(pool.connection, lambda symbols, fetch: {})
+    assert remaining(ledger) == [5.0]
+    pnl = ledger.get_pnl(1)
+    assert pnl["AAA"]["cost_basis"] == pytest.approx(600)
+    assert pnl["AAA"]["realized_pnl"] == pytest.approx(350)
+    assert pnl["AAA"]["market_value"] is None
+    assert set(pnl) == {"AAA", "BBB"}
+
+    with pool.connection() as conn:
+        positions = dict(conn.execute("SELECT ticker_id, cost_basis FROM positions").fetchall())
+    #share counts match the ledger: corrected, they do not: left alone
+    assert positions == {1: pytest.approx(600), 2: 200.0}
+
+
+def test_backfill_matches_recording_the_same_trades_incrementally(pool, ledger):
+    two_lots(pool, ledger)
+    sell(pool, ledger, 15, 130.0, "2024-03-01 10:00:00")
+    buy(pool, ledger, 3, 90.0, "2024-03-05 10:00:00")
+    sell(pool, ledger, 7, 95.0, "2024-04-01 10:00:00")
+    incremental = ledger.get_pnl(1, prices={})
+
+    from db.LotLedger import rebuild_ledger
+    with pool.transaction() as conn:
+        rebuild_ledger(conn.cursor())
+    rebuilt = ledger.get_pnl(1, prices={})
+    for key in ("quantity", "cost_basis", "realized_pnl"):
+        assert rebuilt["AAA"][key] == pytest.approx(incremental["AAA"][key])
+
+
+def test_universe_sync_keeps_delisted_tickers_the_ledger_reports_on(pool, ledger, tmp_path):
+    import json
+    from db.MarketDataProvider import MarketDataProvider
+    from db.TickerManager import TickerManager
+
+    class Quotes(MarketDataProvider):
+        def quote(self, symbols):
+            return {symbol: 1.0 for symbol in symbols}
+
+        def history(self, symbol, start, end=None):
+            raise NotImplementedError
+
+    #AAA was bought and sold off, then both AAA and BBB dropped out of the universe
+    two_lots(pool, ledger)
+    sell(pool, ledger, 20, 130.0, "2024-03-01 10:00:00")
+    universe = tmp_path / "company_tickers.json"
+    universe.write_text(json.dumps({"0": {"cik_str": 1, "ticker": "CCC", "title": "C Corp"}}))
+    ticker_manager = TickerManager(pool.connection, provider=Quotes())
+    ticker_manager.universe.path = str(universe)
+
+    assert ticker_manager.sync_universe() == {"added": 1, "removed": 1, "synced": True}
+    with pool.connection() as conn:
+        assert {row[0] for row in conn.execute("SELECT ticker_symbol FROM tickers")} == {"AAA", "CCC"}
+    assert ledger.get_realized_pnl(1, "AAA") == pytest.approx(20 * 130 - 2200)
+    assert len(ledger.get_realized_gains(1)) == 2
@@ -0,0 +1,66 @@
+import pytest
+from db.ConnectionPool import ConnectionPool
+from db.Database import SCHEMA
+from db.MigrationManager import MIGRATIONS, MigrationManager
+
+'''
+Schema migrations: every version is applied once, in order, and a file that is
+already at a version skips it
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "migrations.db"))
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+    yield pool
+    pool.close()
+
+
+def schema(pool):
+    with pool.connection() as conn:
+        return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+
+
+def test_migrate_applies_every_version_once(pool):
+    manager = MigrationManager(pool.connection)
+    assert manager.migrate() == [version for version, _, _ in MIGRATIONS]
+    assert manager.get_version() == manager.latest_version
+    migrated = schema(pool)
+
+    #a second run (or a second process opening the file) changes nothing
+    assert manager.migrate() == []
+    assert MigrationManager(pool.connection).migrate() == []
+    assert schema(pool) == migrated
+
+
+def test_versions_the_file_already_has_are_skipped(pool):
+    ran = []
+    migrations = [(version, f"step {version}", (lambda cursor, version=version: ran.append(version),))
+                  for version in (1, 2, 3)]
+    with pool.connection() as conn:
+        conn.execute("PRAGMA user_version = 2")
+
+    manager = MigrationManager(pool.connection, migrations)
+    assert manager.migrate() == [3]
+    assert ran == [3]
+    assert manager.get_version() == 3
+
+
+def test_a_failing_migration_keeps_the_versions_before_it(pool):
+    def fail(cursor):
+        cursor.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("migration failed")
+
+    migrations = [(1, "works", ("CREATE TABLE first (id INTEGER)",)), (2, "fails", (fail,))]
+    manager = MigrationManager(pool.connection, migrations)
+    with pytest.raises(RuntimeError):
+        manager.migrate()
+    assert manager.get_version() == 1
+    names = [name for _, name, _ in schema(pool)]
+    assert "first" in names and "half_done" not in names
+
+    #fixed, the next launch only runs what is left
+    migrations[1] = (2, "fixed", ("CREATE TABLE second (id INTEGER)",))
+    assert manager.migrate() == [2]
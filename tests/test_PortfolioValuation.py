@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+'''
+Vectorized valuation: the same numbers the per position path computes
+(get_all_positions and get_ticker_price one ticker at a time)
+'''
+
+
+def scalar_valuation(database, portfolio_id):
+
+    '''The positions page before the valuation frame: one price lookup per position'''
+    rows = {}
+    for tic, position in database.get_all_positions(portfolio_id).items():
+        quantity, cost_basis = position["quantity"], position["cost_basis"]
+        price = database.get_ticker_price(tic)
+        rows[tic] = {"avg_price": cost_basis / quantity, "cost_basis": cost_basis, "price": price,
+                     "market_value": quantity * price, "unrealized_pnl": quantity * price - cost_basis}
+    return rows
+
+
+@pytest.fixture
+def two_portfolios(database):
+    database.create_portfolio(database.get_user_id("trader"), "second")
+    for portfolio_id, tic, shares, price in [(1, "AAA", 10, 50.0), (1, "BBB", 4, 125.0), (1, "AAA", 5, 80.0),
+                                             (2, "CCC", 3, 20.0), (2, "AAA", 2, 60.0)]:
+        assert database.execute_trade("trader", portfolio_id, tic, "buy", shares, price=price)
+    assert database.execute_trade("trader", 1, "AAA", "sell", 6, price=90.0)
+    return database
+
+
+def test_value_portfolios_matches_the_per_position_path(two_portfolios):
+    database = two_portfolios
+    #one set of prices for both paths
+    prices = {tic: database.get_ticker_price(tic) for tic in ("AAA", "BBB", "CCC")}
+    valuation = database.value_portfolios([1, 2], prices=prices)
+
+    for portfolio_id in (1, 2):
+        expected = scalar_valuation(database, portfolio_id)
+        frame = valuation[valuation["portfolio_id"] == portfolio_id].set_index("ticker")
+        assert sorted(frame.index) == sorted(expected)
+        for tic, columns in expected.items():
+            for column, value in columns.items():
+                assert frame.loc[tic, column] == pytest.approx(value), (portfolio_id, tic, column)
+        assert frame["weight"].sum() == pytest.approx(1.0)
+
+        totals = database.totals(valuation).loc[portfolio_id]
+        assert totals["market_value"] == pytest.approx(sum(row["market_value"] for row in expected.values()))
+        assert totals["cost_basis"] == pytest.approx(sum(row["cost_basis"] for row in expected.values()))
+
+
+def test_a_ticker_without_a_price_counts_at_cost_but_not_in_value(two_portfolios):
+    valuation = two_portfolios.value_portfolios([2], prices={"CCC": 25.0})
+    frame = valuation.set_index("ticker")
+    assert np.isnan(frame.loc["AAA", "market_value"])
+    assert frame.loc["CCC", "weight"] == pytest.approx(1.0)
+
+    totals = two_portfolios.totals(valuation).loc[2]
+    assert totals["market_value"] == pytest.approx(75.0)
+    assert totals["cost_basis"] == pytest.approx(60.0 + 120.0)
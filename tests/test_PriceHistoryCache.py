@@ -0,0 +1,100 @@
+import time
+import pandas as pd
+import pytest
+from db.BulkIO import BulkIO
+from db.ConnectionPool import ConnectionPool
+from db.Database import SCHEMA
+from db.MarketDataProvider import MarketDataProvider
+from db.PriceHistoryCache import PriceHistoryCache
+from db.TickerManager import TickerManager
+
+'''
+Memory mapped price history: background rebuilds after invalidation, bulk imports
+marking it stale and get_ticker_history reading it before the provider
+'''
+
+
+class NoNetwork(MarketDataProvider):
+    def quote(self, symbols):
+        raise AssertionError("quote should not be called")
+
+    def history(self, symbol, start, end=None):
+        raise AssertionError("history should not be called")
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "history.db"))
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO tickers (id, ticker_symbol, current_price) VALUES (1, 'AAA', 10.0)")
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def cache(pool, tmp_path):
+    cache = PriceHistoryCache(pool.connection, str(tmp_path / "history"), rebuild_delay=0.05)
+    yield cache
+    cache.shutdown(timeout=5.0)
+
+
+def business_days(count):
+    return pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.offsets.BDay(1), periods=count)
+
+
+def store(pool, days, close):
+    with pool.connection() as conn:
+        conn.executemany("""INSERT INTO price_history (ticker_id, date, close_price, volume) VALUES (1, ?, ?, 100)
+                         ON CONFLICT (ticker_id, date) DO UPDATE SET close_price = excluded.close_price""",
+                         [(day.strftime("%Y-%m-%d"), close) for day in days])
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_invalidated_ticker_is_served_again_after_the_background_rebuild(pool, cache):
+    days = business_days(5)
+    store(pool, days[:4], 1.0)
+    cache.build_history_cache()
+    assert len(cache.get_history_columns("AAA")[0]) == 4
+
+    store(pool, days[4:], 2.0)
+    cache.invalidate_history("AAA")
+    assert cache.get_history_columns("AAA") is None
+    wait_for(lambda: cache.get_history_columns("AAA") is not None)
+    assert list(cache.get_history_columns("AAA")[1]) == [1.0] * 4 + [2.0]
+
+
+def test_price_history_import_marks_the_cache_stale_until_rebuilt(pool, cache, tmp_path):
+    days = business_days(3)
+    store(pool, days, 1.0)
+    bulk_io = BulkIO(pool.connection)
+    bulk_io.export_table("price_history", str(tmp_path / "price_history.csv"))
+    cache.build_history_cache()
+
+    #the import overwrites the same rows in place, so no row id moves past the build
+    store(pool, days, 3.0)
+    cache.build_history_cache()
+    assert list(cache.get_history_columns("AAA")[1]) == [3.0] * 3
+    bulk_io.import_table("price_history", str(tmp_path / "price_history.csv"))
+    cache.close()
+
+    assert cache.get_history_columns("AAA") is None
+    wait_for(lambda: cache.get_history_columns("AAA") is not None)
+    assert list(cache.get_history_columns("AAA")[1]) == [1.0] * 3
+
+
+def test_history_covered_by_the_cache_skips_the_provider(pool, cache):
+    days = business_days(10)
+    store(pool, days, 5.0)
+    cache.build_history_cache()
+    ticker_manager = TickerManager(pool.connection, provider=NoNetwork(), history_cache=cache)
+
+    history = ticker_manager.get_ticker_history("AAA", days[2])
+    assert list(history.index) == list(days[2:])
+    assert (history == 5.0).all()
@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+from db.ConnectionPool import ConnectionPool
+from db.Database import SCHEMA
+from db.MigrationManager import MigrationManager
+from db.SnapshotManager import SnapshotManager
+
+'''
+Portfolio snapshots: valued from the stored price history and only replaying
+the transactions since the last snapshot day
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "snapshots.db"))
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO tickers (id, ticker_symbol, current_price) VALUES (?, ?, ?)",
+                         [(1, "AAA", 10.0), (2, "BBB", 20.0)])
+        conn.executemany("INSERT INTO price_history (ticker_id, date, close_price, volume) VALUES (1, ?, ?, 0)",
+                         [(day.strftime("%Y-%m-%d"), 11.0 + number)
+                          for number, day in enumerate(pd.bdate_range("2024-01-08", "2024-01-19"))])
+    MigrationManager(pool.connection).migrate()
+    yield pool
+    pool.close()
+
+
+def trade(pool, tic, action, shares, price, timestamp):
+    with pool.connection() as conn:
+        conn.execute("""INSERT INTO transactions (portfolio_id, ticker_symbol, action, quantity, price, timestamp)
+                     VALUES (1, ?, ?, ?, ?, ?)""", (tic, action, shares, price, timestamp))
+
+
+def test_snapshots_use_stored_closes_and_trade_prices_before_them(pool):
+    trade(pool, "AAA", "buy", 10, 10.0, "2024-01-05 10:00:00")
+    trade(pool, "BBB", "buy", 2, 20.0, "2024-01-05 11:00:00")
+    SnapshotManager(pool.connection).update_snapshots(end_date="2024-01-10")
+
+    history = SnapshotManager(pool.connection).get_value_history(1)
+    #AAA has no close on the 5th, BBB has no stored history at all
+    assert history["market_value"].tolist() == [10 * 10.0 + 40, 10 * 11.0 + 40, 10 * 12.0 + 40, 10 * 13.0 + 40]
+    assert (history["cash"] == -140.0).all()
+
+
+def test_incremental_runs_only_replay_new_transactions_and_match_a_backfill(pool, monkeypatch):
+    snapshots = SnapshotManager(pool.connection)
+    trade(pool, "AAA", "buy", 10, 10.0, "2024-01-05 10:00:00")
+    trade(pool, "BBB", "buy", 4, 20.0, "2024-01-08 10:00:00")
+    snapshots.update_snapshots(end_date="2024-01-10")
+
+    replayed = []
+    replay = snapshots._replay
+    monkeypatch.setattr(snapshots, "_replay", lambda transactions, opening=None:
+                        replayed.append(len(transactions)) or replay(transactions, opening))
+    trade(pool, "AAA", "sell", 4, 14.0, "2024-01-12 10:00:00")
+    snapshots.update_snapshots(end_date="2024-01-15")
+    trade(pool, "BBB", "sell", 1, 21.0, "2024-01-17 10:00:00")
+    snapshots.update_snapshots(end_date="2024-01-19")
+    #nothing new: only the last day is redone, from the saved holdings
+    assert snapshots.update_snapshots(end_date="2024-01-19") == 1
+    assert replayed == [1, 1, 0]
+    incremental = snapshots.get_value_history(1)
+    snapshots.backfill_snapshots(end_date="2024-01-19")
+    pd.testing.assert_frame_equal(snapshots.get_value_history(1), incremental)
+
+    #a trade dated before the last snapshot day makes the next run replay everything
+    trade(pool, "AAA", "buy", 1, 12.0, "2024-01-09 10:00:00")
+    snapshots.update_snapshots(end_date="2024-01-19")
+    assert replayed[-1] == 5
+
+    monkeypatch.undo()
+    late = snapshots.get_value_history(1)
+    snapshots.backfill_snapshots(end_date="2024-01-19")
+    pd.testing.assert_frame_equal(snapshots.get_value_history(1), late)
+    pd.testing.assert_frame_equal(late.loc[:"2024-01-08"], incremental.loc[:"2024-01-08"])
+    assert late.loc["2024-01-19", "cash"] == pytest.approx(-100 - 80 + 56 + 21 - 12)
+
+
+@pytest.mark.parametrize("lot_method", ["fifo", "lifo"])
+def test_snapshot_cost_basis_is_the_cost_of_the_open_lots(database, lot_method):
+    assert database.execute_trade("trader", 1, "AAA", "buy", 10, price=100.0)
+    assert database.execute_trade("trader", 1, "AAA", "buy", 10, price=120.0)
+    assert database.execute_trade("trader", 1, "AAA", "sell", 5, price=130.0, lot_method=lot_method)
+
+    #a few days ahead, so the range holds a business day whatever day the test runs
+    end = pd.Timestamp.now().normalize() + pd.Timedelta(days=3)
+    database.update_snapshots([1], end_date=end)
+    snapshot = database.get_value_history(1).iloc[-1]
+    cost_basis = database.get_position(1, "AAA")["cost_basis"]
+    #an average cost would leave 1650 either way
+    assert cost_basis == pytest.approx(1600.0 if lot_method == "lifo" else 1700.0)
+    assert snapshot["cost_basis"] == pytest.approx(cost_basis)
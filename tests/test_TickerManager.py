@@ -0,0 +1,143 @@
+import time
+import pandas as pd
+import pytest
+from conftest import write_universe
+from db.ConnectionPool import ConnectionPool
+from db.Database import SCHEMA, Database
+from db.MigrationManager import MigrationManager
+from db.ReplayProvider import ReplayProvider
+from db.TickerManager import TickerManager
+
+'''
+Ticker manager against the offline ReplayProvider: history syncs, the universe
+delta sync and seeding
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "tickers.db"))
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO tickers (id, ticker_symbol, current_price) VALUES (1, 'AAA', 10.0)")
+    MigrationManager(pool.connection).migrate()
+    yield pool
+    pool.close()
+
+
+def replay(tmp_path, name, closes):
+    today = pd.Timestamp.now().normalize()
+    days = [today - pd.Timedelta(days=offset) for offset in range(len(closes) - 1, -1, -1)]
+    path = tmp_path / f"{name}.csv"
+    pd.DataFrame({"symbol": "AAA", "date": days, "close": closes, "volume": 100}).to_csv(path, index=False)
+    return ReplayProvider(str(path))
+
+
+def test_history_sync_replaces_a_close_stored_before_the_bar_was_final(pool, tmp_path):
+    ticker_manager = TickerManager(pool.connection, provider=replay(tmp_path, "open", [1.0, 2.0, 3.0]), quote_ttl=0)
+    start = pd.Timestamp.now().normalize() - pd.Timedelta(days=2)
+    assert ticker_manager.get_ticker_history("AAA", start).tolist() == [1.0, 2.0, 3.0]
+
+    #the market closed since, todays bar ended higher
+    ticker_manager.provider = replay(tmp_path, "closed", [1.0, 2.0, 3.5])
+    assert ticker_manager.get_ticker_history("AAA", start).tolist() == [1.0, 2.0, 3.5]
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0] == 3
+
+
+class Unreachable:
+
+    '''A provider that never answers, like one without network'''
+    def quote(self, symbols):
+        return {}
+
+
+def resync(database, symbols, folder):
+    write_universe(folder, symbols)
+    #the universe is only compared against the JSON once per launch
+    database.ticker_manager.universe._checked = False
+    return database.sync_universe()
+
+
+def test_universe_sync_adds_listings_and_drops_delistings_nobody_holds(database, tmp_path):
+    assert database.execute_trade("trader", 1, "BBB", "buy", 1, price=10.0)
+    stats = resync(database, ["AAA", "DDD"], tmp_path)
+
+    assert stats == {"added": 1, "removed": 1, "synced": True}
+    #BBB left the universe but is still held
+    assert sorted(tic for tic, _ in database.get_all_tickers()) == ["AAA", "BBB", "DDD"]
+    assert "DDD" in database.search_tickers("DDD")
+    #the synced version is not applied again
+    assert database.sync_universe() == {"added": 0, "removed": 0, "synced": False}
+
+
+def test_universe_sync_is_retried_until_every_listing_was_priced(database, tmp_path):
+    provider = database.ticker_manager.provider
+    database.ticker_manager.provider = Unreachable()
+    assert resync(database, ["AAA", "BBB", "CCC", "DDD"], tmp_path)["synced"] is False
+
+    database.ticker_manager.provider = provider
+    assert database.sync_universe() == {"added": 1, "removed": 0, "synced": True}
+
+
+def test_seeding_without_a_universe_fails_and_is_not_marked_done(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        Database(str(tmp_path / "app.db"), provider=ReplayProvider())
+
+    write_universe(tmp_path, ["AAA", "BBB"])
+    database = Database(str(tmp_path / "app.db"), provider=ReplayProvider())
+    try:
+        assert database.is_seeded()
+        assert sorted(tic for tic, _ in database.get_all_tickers()) == ["AAA", "BBB"]
+    finally:
+        database.close()
+
+
+class SlowReplay(ReplayProvider):
+
+    '''ReplayProvider that records every quote request and takes a moment to answer'''
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def quote(self, symbols):
+        time.sleep(0.02)
+        self.requests.append(list(symbols))
+        return super().quote(symbols)
+
+
+def seed_checkpoints(pool):
+    with pool.connection() as conn:
+        return {row[0] for row in conn.execute("SELECT chunk FROM seed_checkpoints")}
+
+
+def test_a_cancelled_seed_resumes_at_the_chunks_it_did_not_write(tmp_path, monkeypatch):
+    symbols = [f"T{number:02d}" for number in range(12)]
+    monkeypatch.chdir(tmp_path)
+    write_universe(tmp_path, symbols)
+    pool = ConnectionPool(str(tmp_path / "seed.db"))
+    try:
+        with pool.connection() as conn:
+            conn.executescript(SCHEMA)
+        MigrationManager(pool.connection).migrate()
+
+        first = SlowReplay()
+        stats = TickerManager(pool.connection, provider=first)._add_all_tickers(
+            chunk_size=2, max_workers=1, cancelled=lambda: len(first.requests) >= 2)
+        assert stats["stopped"] and stats["done"] < stats["chunks"] == 6
+        written = seed_checkpoints(pool)
+        assert len(written) == stats["done"]
+        assert not TickerManager(pool.connection, provider=first).is_seeded()
+
+        second = SlowReplay()
+        ticker_manager = TickerManager(pool.connection, provider=second)
+        stats = ticker_manager._add_all_tickers(chunk_size=2, max_workers=1)
+        assert stats == {"chunks": 6, "done": 6, "failed": 0, "stopped": False}
+        #only the chunks without a checkpoint were downloaded again
+        assert sorted(map(tuple, second.requests)) == [tuple(symbols[2 * chunk:2 * chunk + 2])
+                                                        for chunk in range(6) if chunk not in written]
+        assert ticker_manager.is_seeded()
+        assert sorted(tic for tic, _ in ticker_manager.get_all_tickers()) == symbols
+    finally:
+        pool.close()
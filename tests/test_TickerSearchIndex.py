@@ -0,0 +1,40 @@
+from db.TickerSearchIndex import TickerSearchIndex
+
+'''
+Ticker search ranking: exact symbol, symbol prefix, company name, symbol contains
+'''
+
+TICKERS = [
+    ("MS", "Morgan Stanley"),
+    ("MSFT", "Microsoft Corp"),
+    ("MSCI", "MSCI Inc"),
+    ("AMS", "American Shared Hospital Services"),
+    ("SMS", "Some Micro Systems"),
+    ("GOOGL", "Alphabet Inc"),
+    ("GOOG", "Alphabet Inc"),
+    ("MSTR", None),
+]
+
+
+def test_ranks_exact_then_prefix_then_name_then_contains():
+    index = TickerSearchIndex(TICKERS)
+    #ties broken by length, then alphabetically
+    assert index.search("ms") == ["MS", "MSCI", "MSFT", "MSTR", "AMS", "SMS"]
+    #names that start with the word first
+    assert index.search("micro") == ["MSFT", "SMS"]
+    assert index.search("ms", limit=2) == ["MS", "MSCI"]
+
+
+def test_every_query_word_has_to_match_a_name_word():
+    index = TickerSearchIndex(TICKERS)
+    assert index.search("alphabet inc") == ["GOOG", "GOOGL"]
+    assert index.search("american serv") == ["AMS"]
+    assert index.search("alphabet micro") == []
+
+
+def test_contains_matches_the_middle_and_end_of_symbols_once():
+    index = TickerSearchIndex(TICKERS + [("ABAB", "Repeats")])
+    assert index.search("oog") == ["GOOG", "GOOGL"]
+    assert index.search("ba") == ["ABAB"]
+    assert index.search("  ") == []
+    assert index.search("zz") == []
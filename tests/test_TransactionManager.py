@@ -0,0 +1,64 @@
+import pytest
+from db.ConnectionPool import ConnectionPool
+from db.Database import SCHEMA
+from db.MigrationManager import MigrationManager
+from db.TransactionManager import TransactionManager
+
+'''
+Transaction history pages: keyset pagination on (timestamp, id) and the SQL filters
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "transactions.db"))
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+    MigrationManager(pool.connection).migrate()
+    yield pool
+    pool.close()
+
+
+def log(pool, rows):
+    with pool.connection() as conn:
+        conn.executemany("""INSERT INTO transactions (portfolio_id, ticker_symbol, action, quantity, price, timestamp)
+                         VALUES (?, ?, ?, ?, ?, ?)""", rows)
+
+
+def all_pages(manager, limit, **filters):
+    pages, after = [], None
+    while True:
+        page, after = manager.get_transactions_page(1, after=after, limit=limit, **filters)
+        pages.append(page)
+        if after is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 8])
+def test_equal_timestamps_are_paged_once_each_in_id_order(pool, limit):
+    #the same second for most rows, as a burst of trades gets
+    log(pool, [(1, "AAA", "buy", quantity, 10.0, "2024-01-02 10:00:00") for quantity in range(1, 6)]
+              + [(1, "BBB", "buy", 9, 10.0, "2024-01-01 09:00:00"), (1, "AAA", "sell", 6, 11.0, "2024-01-03 10:00:00")])
+    pages = all_pages(TransactionManager(pool.connection), limit)
+
+    rows = [row for page in pages for row in page]
+    assert [row[1] for row in rows] == [9, 1, 2, 3, 4, 5, 6]
+    assert all(len(page) <= limit for page in pages)
+    #a page count that divides the rows evenly ends with an empty page, never a repeat
+    if 7 % limit == 0:
+        assert pages[-1] == []
+
+
+def test_filters_apply_before_the_limit(pool):
+    log(pool, [(1, "AAA", "buy", 1, 10.0, "2024-01-02 10:00:00"),
+               (1, "BBB", "buy", 2, 10.0, "2024-01-02 10:00:00"),
+               (1, "AAA", "sell", 3, 10.0, "2024-01-02 23:59:59"),
+               (1, "AAA", "buy", 4, 10.0, "2024-01-03 00:00:00"),
+               (2, "AAA", "buy", 5, 10.0, "2024-01-02 10:00:00")])
+    manager = TransactionManager(pool.connection)
+
+    #end_date includes the whole day
+    pages = all_pages(manager, 1, tic="AAA", start_date="2024-01-02", end_date="2024-01-02")
+    assert [row[1] for page in pages for row in page] == [1, 3]
+    pages = all_pages(manager, 2, action="buy", start_date="2024-01-02")
+    assert [row[1] for page in pages for row in page] == [1, 2, 4]